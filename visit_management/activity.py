@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import frappe
+from frappe import whitelist
+from frappe.utils import cint, now_datetime
+
+ACTIVITY_DOCTYPE = "Visit Activity"
+# Largest page get_visit_timeline returns
+MAX_PAGE_LENGTH = 200
+# Page shown by the Visit form; the first one ships with the document load (vm_state.timeline)
+FORM_PAGE_LENGTH = 20
+
+
+def log_visit_activity(visit: str, activity: str, timestamp=None, user: str | None = None) -> str:
+    """Append one activity line for a Visit with a single INSERT; the Visit itself is not touched."""
+    name = frappe.generate_hash(length=12)
+    now = now_datetime()
+    user = user or frappe.session.user
+    frappe.db.bulk_insert(
+        ACTIVITY_DOCTYPE,
+        fields=["name", "creation", "modified", "owner", "modified_by", "visit", "timestamp", "activity", "user"],
+        values=[(name, now, now, user, user, visit, timestamp or now, activity, user)],
+    )
+    return name
+
+
+@whitelist()
+def get_visit_timeline(visit: str, limit: int = FORM_PAGE_LENGTH, before: str | None = None) -> dict:
+    """One page of a Visit's activity, newest first.
+
+    `before` is the `next` cursor of the previous page; `next` is None on the last page. Pages are read
+    by keyset on (visit, timestamp), so deep pages cost the same as the first.
+    """
+    frappe.has_permission("Visit", "read", doc=visit, throw=True)
+    return timeline_page(visit, limit, before)
+
+
+def timeline_page(visit: str, limit: int = FORM_PAGE_LENGTH, before: str | None = None) -> dict:
+    """get_visit_timeline without the permission check, for callers that already hold the Visit."""
+    limit = min(max(cint(limit), 1), MAX_PAGE_LENGTH)
+    condition, values = "", {"visit": visit, "limit": limit + 1}
+    if before:
+        ts, _, name = before.partition("|")
+        condition = "and (`timestamp` < %(ts)s or (`timestamp` = %(ts)s and name < %(name)s))"
+        values.update(ts=ts, name=name)
+    rows = frappe.db.sql(
+        f"""
+        select name, `timestamp`, activity, `user`
+        from `tab{ACTIVITY_DOCTYPE}`
+        where visit = %(visit)s {condition}
+        order by `timestamp` desc, name desc
+        limit %(limit)s
+        """,
+        values,
+        as_dict=True,
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    last = rows[-1] if rows else None
+    return {
+        "items": rows,
+        "next": f"{last.timestamp}|{last.name}" if has_more else None,
+    }
+
+
+def on_visit_trash(doc, method=None):
+    """Hook: on_trash. Activity is kept for the Visit's lifetime only."""
+    frappe.db.delete(ACTIVITY_DOCTYPE, {"visit": doc.name})
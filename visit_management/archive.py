@@ -0,0 +1,224 @@
+"""Archive tier for old Completed/Cancelled Visits.
+
+`archive_visits` (daily, when Visit Management Settings > Archive Visits After is set) moves Visits whose
+schedule and last change are older than that many days into Visit Archive, in chunks of one transaction
+each: key columns for queries, the full record and its Visit Activity as JSON. The Visit and its
+activity rows are then deleted, so `tabVisit` holds the working set only. Its Files, Versions and
+Comments are repointed to the Visit Archive record of the same name, and a Weekly Schedule row that
+created it keeps the name in `archived_visit` instead of its Visit link; Visits still linked from a
+Visit Report or an unprocessed Visit HR Event stay in `tabVisit`.
+
+Archived Visits stay readable through `get_archived_visit` / `get_archived_visits` (same access rule as
+Visit), and are included in the last-visit map and the Visit Daily Stat rebuild.
+"""
+
+from __future__ import annotations
+
+import frappe
+from frappe import whitelist
+from frappe.utils import add_days, cint, getdate, now_datetime
+
+from visit_management.visit_management.settings_utils import get_settings
+
+ARCHIVE_DOCTYPE = "Visit Archive"
+ARCHIVABLE_STATUSES = ("Completed", "Cancelled")
+# Visits moved per transaction
+CHUNK_SIZE = 1000
+# Chunks per run, so the daily job stays bounded; the remainder moves on the next run
+MAX_CHUNKS = 50
+# Visit columns copied into Visit Archive columns (everything is also kept in `data`)
+KEY_FIELDS = (
+    "status", "scheduled_time", "assigned_to", "client_type", "client", "subject", "visit_outcome",
+    "check_in_time", "check_out_time", "visit_duration_minutes",
+)
+# Largest page get_archived_visits returns
+MAX_PAGE_LENGTH = 500
+# (doctype, reference doctype column, reference name column) of rows following a Visit into the archive
+REPOINTED_REFERENCES = (
+    ("File", "attached_to_doctype", "attached_to_name"),
+    ("Version", "ref_doctype", "docname"),
+    ("Comment", "reference_doctype", "reference_name"),
+)
+
+
+def ensure_archive_table():
+    """Create `tabVisit Archive` if missing. Pre-model-sync patches that rebuild from Visits and
+    archived Visits (Visit Daily Stat, Visit Client Due) call this before reading it."""
+    if not frappe.db.table_exists(ARCHIVE_DOCTYPE):
+        frappe.reload_doc("visit_management", "doctype", "visit_archive")
+
+
+def _archive_chunk(names: list[str]) -> int:
+    rows = frappe.db.sql(
+        "select * from `tabVisit` where name in %(names)s for update", {"names": tuple(names)}, as_dict=True
+    )
+    activity = {}
+    for a in frappe.db.sql(
+        """
+        select visit, `timestamp`, activity, `user` from `tabVisit Activity`
+        where visit in %(names)s order by `timestamp`
+        """,
+        {"names": tuple(names)},
+        as_dict=True,
+    ):
+        activity.setdefault(a.visit, []).append({"timestamp": a.timestamp, "activity": a.activity, "user": a.user})
+
+    now, user = now_datetime(), frappe.session.user
+    frappe.db.bulk_insert(
+        ARCHIVE_DOCTYPE,
+        fields=["name", "creation", "modified", "owner", "modified_by", *KEY_FIELDS, "archived_on", "data", "activity"],
+        values=[
+            (r.name, r.creation, now, r.owner, user, *(r.get(f) for f in KEY_FIELDS), now,
+             frappe.as_json(r, indent=None), frappe.as_json(activity.get(r.name, []), indent=None))
+            for r in rows
+        ],
+    )
+    for doctype, doctype_field, name_field in REPOINTED_REFERENCES:
+        frappe.db.sql(
+            f"""
+            update `tab{doctype}` set `{doctype_field}` = %(archive)s
+            where `{doctype_field}` = 'Visit' and `{name_field}` in %(names)s
+            """,
+            {"archive": ARCHIVE_DOCTYPE, "names": tuple(names)},
+        )
+    # the row's Visit link would no longer resolve on the next schedule save; archived_visit also
+    # keeps the row from creating the Visit again
+    frappe.db.sql(
+        """
+        update `tabWeekly Schedule Detail` set archived_visit = visit, visit = null
+        where visit in %(names)s
+        """,
+        {"names": tuple(names)},
+    )
+    frappe.db.delete("Visit Activity", {"visit": ["in", names]})
+    frappe.db.delete("Visit", {"name": ["in", names]})
+    return len(rows)
+
+
+def archive_visits(days: int | None = None, chunk_size: int = CHUNK_SIZE, max_chunks: int = MAX_CHUNKS) -> dict:
+    """Move Completed/Cancelled Visits scheduled and last modified more than `days` ago (default: the
+    archive_after_days setting; 0 disables) into Visit Archive, committing after each chunk.
+
+    Visits that a Visit Report or a queued/failed Visit HR Event links to are skipped: those links are
+    validated on save (or retried) and must keep resolving in `tabVisit`. Weekly Schedule rows are
+    unlinked instead (see `_archive_chunk`).
+    """
+    days = cint(days if days is not None else get_settings().get("archive_after_days"))
+    if days <= 0:
+        return {"archived": 0, "chunks": 0, "enabled": False}
+    cutoff = add_days(now_datetime(), -days)
+    archived = chunks = 0
+    while chunks < int(max_chunks):
+        names = frappe.db.sql_list(
+            """
+            select name from `tabVisit` v
+            where status in %(statuses)s and scheduled_time < %(cutoff)s and modified < %(cutoff)s
+                and not exists (select 1 from `tabVisit Report` r where r.visit = v.name)
+                and not exists (
+                    select 1 from `tabVisit HR Event` e where e.visit = v.name and e.status != 'Done'
+                )
+            order by scheduled_time
+            limit %(limit)s
+            """,
+            {"statuses": ARCHIVABLE_STATUSES, "cutoff": cutoff, "limit": int(chunk_size)},
+        )
+        if not names:
+            break
+        archived += _archive_chunk(names)
+        chunks += 1
+        frappe.db.commit()
+        if len(names) < int(chunk_size):
+            break
+    if archived:
+        # KPI counts may have changed
+        from visit_management.utils import bump_visit_data_version
+
+        bump_visit_data_version()
+    return {"archived": archived, "chunks": chunks, "enabled": True, "cutoff": str(cutoff)}
+
+
+# Readers -------------------------------------------------------------------
+
+
+def _archive_condition(user: str) -> str:
+    """SQL condition giving `user` the same archived Visits Visit's permission rule would."""
+    from visit_management.visit_management.doctype.visit.visit import _visit_access_scope
+
+    scope = _visit_access_scope(user)
+    if scope == "all":
+        return ""
+    user_sql = frappe.db.escape(user)
+    conditions = [f"assigned_to = {user_sql}"]
+    if scope == "owner":
+        conditions.append(f"owner = {user_sql}")
+    shared = frappe.share.get_shared("Visit", user)
+    if shared:
+        conditions.append(f"name in ({', '.join(frappe.db.escape(n) for n in shared)})")
+    return f"({' or '.join(conditions)})"
+
+
+def can_read_archived_visit(name: str, user: str | None = None) -> bool:
+    condition = _archive_condition(user or frappe.session.user)
+    return bool(frappe.db.sql(
+        f"select 1 from `tab{ARCHIVE_DOCTYPE}` where name = %(name)s {'and ' + condition if condition else ''}",
+        {"name": name},
+    ))
+
+
+@whitelist()
+def get_archived_visit(name: str) -> dict:
+    """Read-only copy of an archived Visit (all its fields) with its activity, newest last."""
+    if not frappe.db.exists(ARCHIVE_DOCTYPE, name):
+        frappe.throw(f"Archived Visit {name} not found.", frappe.DoesNotExistError)
+    condition = _archive_condition(frappe.session.user)
+    row = frappe.db.sql(
+        f"select data, activity from `tab{ARCHIVE_DOCTYPE}` where name = %(name)s {'and ' + condition if condition else ''}",
+        {"name": name},
+        as_dict=True,
+    )
+    if not row:
+        frappe.throw(f"Not permitted to read archived Visit {name}.", frappe.PermissionError)
+    out = frappe.parse_json(row[0].data) or {}
+    out["activity"] = frappe.parse_json(row[0].activity) or []
+    out["archived"] = True
+    return out
+
+
+@whitelist()
+def get_archived_visits(
+    client_type: str | None = None,
+    client: str | None = None,
+    assigned_to: str | None = None,
+    status: str | None = None,
+    from_date: str | None = None,
+    to_date: str | None = None,
+    limit: int = 20,
+    start: int = 0,
+) -> list[dict]:
+    """Key columns of archived Visits the user may read, newest scheduled first."""
+    conditions, values = [], {}
+    for field, value in (("client_type", client_type), ("client", client), ("assigned_to", assigned_to), ("status", status)):
+        if value:
+            conditions.append(f"{field} = %({field})s")
+            values[field] = value
+    if from_date:
+        conditions.append("scheduled_time >= %(from_date)s")
+        values["from_date"] = getdate(from_date)
+    if to_date:
+        conditions.append("scheduled_time < %(to_date)s")
+        values["to_date"] = add_days(getdate(to_date), 1)
+    permission = _archive_condition(frappe.session.user)
+    if permission:
+        conditions.append(permission)
+    values.update(limit=min(max(cint(limit), 1), MAX_PAGE_LENGTH), start=max(cint(start), 0))
+    return frappe.db.sql(
+        f"""
+        select name, {", ".join(KEY_FIELDS)}, archived_on
+        from `tab{ARCHIVE_DOCTYPE}`
+        {"where " + " and ".join(conditions) if conditions else ""}
+        order by scheduled_time desc
+        limit %(limit)s offset %(start)s
+        """,
+        values,
+        as_dict=True,
+    )
@@ -0,0 +1,531 @@
+"""Micro-benchmarks for Visit Management hot paths.
+
+Run from a bench, e.g.:
+
+    bench --site <site> execute visit_management.benchmarks.bench_due_dates --kwargs "{'rows': 100000}"
+
+Each function returns a dict of timings so results can be compared across commits.
+"""
+
+from __future__ import annotations
+
+import random
+import time
+
+SUBJECTS = ["Sales Call", "Follow-up", "Demo", "Maintenance", "Collection", "Inspection"]
+
+
+def _timed(fn, repeat: int = 3) -> float:
+    """Return the best wall time of `repeat` runs, in seconds."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def bench_visit_analytics(
+    from_date: str | None = None, to_date: str | None = None, target_seconds: float = 1.0, repeat: int = 3
+) -> dict:
+    """Time get_visit_analytics end to end (grouped queries + aggregation) over the site's Visits.
+
+    Seed the volume first (e.g. `bench visit-management-seed --visits 5000000`); without dates the
+    whole scheduled range is used.
+    """
+    import frappe
+    from visit_management.visit_analytics import get_visit_analytics, np
+
+    first, last = frappe.db.sql("select min(scheduled_time), max(scheduled_time) from `tabVisit`")[0]
+    if not first:
+        return {"benchmark": "visit_analytics", "error": "no Visits on this site"}
+    from_date, to_date = from_date or first, to_date or last
+    result = {}
+    seconds = _timed(lambda: result.update(get_visit_analytics(from_date, to_date)), repeat=int(repeat))
+    return {
+        "benchmark": "visit_analytics",
+        "rows": result["total"],
+        "backend": "numpy" if np is not None else "python",
+        "seconds": round(seconds, 4),
+        "target_seconds": target_seconds,
+        "ok": seconds < target_seconds,
+    }
+
+
+def _synthetic_schedule(rows: int, approved_ratio: float = 0.5, seed: int = 11):
+    """An unsaved Weekly Schedule with `rows` detail rows, about `approved_ratio` of them approved."""
+    import frappe
+
+    rnd = random.Random(seed)
+    user = frappe.session.user
+    details = []
+    for i in range(rows):
+        approved = rnd.random() < approved_ratio
+        details.append({
+            "name": f"row-{i}",
+            "approved": 1 if approved else 0,
+            "approved_by": user if approved else None,
+            "approved_on": None,
+        })
+    return frappe.get_doc({"doctype": "Weekly Schedule", "status": "Draft", "details": details})
+
+
+def _legacy_approve_and_save(doc, selected: set[str]):
+    """Status handling as it was before the shared reducer: approve loop, status scan, then before_save."""
+    import frappe
+    from frappe.utils import now_datetime
+
+    # approve_rows: stamp selected rows
+    for row in doc.get("details") or []:
+        if selected and row.name not in selected:
+            continue
+        if not row.get("approved"):
+            row.approved = 1
+            row.approved_by = frappe.session.user
+            row.approved_on = now_datetime()
+    total = len(doc.get("details") or [])
+    approved = len([r for r in (doc.get("details") or []) if r.get("approved")])
+    doc.status = "Approved" if total and approved == total else ("Pending Approval" if approved else "Draft")
+    # doc.save() -> before_save: role lookups plus three more walks over details
+    is_manager = frappe.has_role("Sales Manager") or frappe.has_role("System Manager")
+    for row in doc.get("details") or []:
+        if row.get("approved") and not row.get("approved_by") and is_manager:
+            row.approved_by = frappe.session.user
+            row.approved_on = now_datetime()
+    approved = [row for row in (doc.get("details") or []) if row.get("approved")]
+    total = len(doc.get("details") or [])
+    if total:
+        if len(approved) == 0 and doc.status not in {"Draft", "Rejected"}:
+            doc.status = "Draft"
+        elif 0 < len(approved) < total:
+            doc.status = "Pending Approval"
+        elif len(approved) == total:
+            doc.status = "Approved"
+
+
+def _reduced_approve_and_save(doc, selected: set[str]):
+    from visit_management.visit_management.doctype.weekly_schedule.weekly_schedule import (
+        reduce_schedule_status,
+    )
+
+    # approve_rows reduces once and flags the save so before_save skips its own pass
+    doc.status = reduce_schedule_status(doc, approve=selected or True).status
+
+
+def bench_schedule_status(rows: int = 1000, selected: int = 100, repeat: int = 200) -> dict:
+    """Compare approve_rows + before_save status computation before/after the shared reducer."""
+    rows, selected, repeat = int(rows), int(selected), int(repeat)
+    picks = {f"row-{i}" for i in range(0, rows, max(1, rows // max(1, selected)))}
+
+    def run(fn) -> float:
+        best = None
+        for _ in range(3):
+            # fresh schedules each round (the functions mutate rows); only the status work is timed
+            docs = [_synthetic_schedule(rows) for _ in range(repeat)]
+            start = time.perf_counter()
+            for doc in docs:
+                fn(doc, picks)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    legacy = run(_legacy_approve_and_save)
+    reduced = run(_reduced_approve_and_save)
+    return {
+        "benchmark": "schedule_status",
+        "rows": rows,
+        "repeat": repeat,
+        "legacy_ms_per_save": round(legacy / repeat * 1000, 4),
+        "reduced_ms_per_save": round(reduced / repeat * 1000, 4),
+        "speedup": round(legacy / reduced, 2),
+    }
+
+
+def _synthetic_visits(users: list[str], count: int, seed: int = 31) -> list[str]:
+    """bulk_insert `count` Planned Visits with owner/assignee drawn from `users` (plus Administrator)."""
+    import frappe
+    from frappe.utils import now_datetime
+
+    rnd = random.Random(seed)
+    people = list(users) + ["Administrator"]
+    now = now_datetime()
+    names = [f"VM-BENCH-{frappe.generate_hash(length=8)}-{i}" for i in range(count)]
+    values = []
+    for name in names:
+        owner = rnd.choice(people)
+        values.append((name, now, now, owner, owner, "Planned", now, rnd.choice(people), "Customer", "bench-client"))
+    frappe.db.bulk_insert(
+        "Visit",
+        fields=["name", "creation", "modified", "owner", "modified_by", "status", "scheduled_time", "assigned_to",
+                "client_type", "client"],
+        values=values,
+    )
+    return names
+
+
+def bench_permission_batch(names: int = 500, users: list[str] | str | None = None, repeat: int = 20) -> dict:
+    """Time has_permission_batch against per-name has_permission over generated Visits (rolled back)."""
+    import frappe
+    from visit_management.visit_management.doctype.visit.visit import has_permission, has_permission_batch
+
+    users = frappe.parse_json(users) if isinstance(users, str) and users.startswith("[") else users
+    users = [users] if isinstance(users, str) else list(users or [frappe.session.user])
+    names, repeat = int(names), int(repeat)
+    try:
+        generated = _synthetic_visits(users, names)
+        user = users[0]
+        batch = _timed(lambda: has_permission_batch(generated, "read", user=user), repeat=repeat)
+        per_name = _timed(
+            lambda: [has_permission(frappe.get_doc("Visit", n), "read", user=user) for n in generated], repeat=1
+        )
+    finally:
+        frappe.db.rollback()
+    return {
+        "benchmark": "permission_batch",
+        "names": names,
+        "batch_ms": round(batch * 1000, 2),
+        "per_name_ms": round(per_name * 1000, 2),
+        "target_ms": 10,
+        "ok": batch < 0.010,
+    }
+
+
+def bench_due_dates(rows: int = 100_000, target_seconds: float = 0.1, seed: int = 5) -> dict:
+    """Time due-date computation (calendar months + working-day roll) for `rows` clients at once."""
+    import datetime
+
+    from visit_management.due_dates import DEFAULT_WEEKMASK, FREQUENCY_DAYS, FREQUENCY_MONTHS, compute_due_dates, np
+
+    rows = int(rows)
+    rnd = random.Random(seed)
+    frequencies = [*FREQUENCY_DAYS, *FREQUENCY_MONTHS]
+    start = datetime.datetime(2022, 1, 1)
+    last_visits = [
+        None if rnd.random() < 0.05 else start + datetime.timedelta(minutes=rnd.randrange(3 * 365 * 24 * 60))
+        for _ in range(rows)
+    ]
+    freqs = [rnd.choice(frequencies) for _ in range(rows)]
+    holidays = [datetime.date(year, month, day) for year in range(2022, 2027) for month, day in ((1, 1), (5, 1), (12, 25))]
+    seconds = _timed(lambda: compute_due_dates(last_visits, freqs, DEFAULT_WEEKMASK, holidays))
+    out = {
+        "benchmark": "due_dates",
+        "rows": rows,
+        "backend": "numpy" if np is not None else "python",
+        "seconds": round(seconds, 4),
+        "target_seconds": target_seconds,
+        "ok": seconds < target_seconds,
+    }
+    if np is not None:
+        # columns already converted (datetime64 / fixed-width strings), as a columnar caller would pass them
+        days = np.array(last_visits, dtype="datetime64[us]").astype("datetime64[D]")
+        codes = np.asarray(freqs, dtype="U12")
+        out["array_seconds"] = round(_timed(lambda: compute_due_dates(days, codes, DEFAULT_WEEKMASK, holidays)), 4)
+    return out
+
+
+# Seeded-site suite ----------------------------------------------------------
+#
+# seed_benchmark_data fills a (throwaway) site with synthetic volumes using bulk inserts;
+# run_benchmark_suite times the app's entry points against it and returns JSON-friendly results.
+# Every seeded record is named with SEED_PREFIX so purge_benchmark_data can remove it again.
+
+SEED_PREFIX = "VMB"
+FREQUENCIES = ["Weekly", "Biweekly", "Monthly", "Quarterly", "Semiannual", "Annual"]
+WEEKDAY_NAMES = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+SEED_BATCH = 10_000
+
+
+def _std(now, owner="Administrator"):
+    return (now, now, owner, owner)
+
+
+def _bulk(doctype: str, fields: list[str], rows) -> int:
+    import frappe
+
+    batch, total = [], 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= SEED_BATCH:
+            frappe.db.bulk_insert(doctype, fields=fields, values=batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        frappe.db.bulk_insert(doctype, fields=fields, values=batch)
+        total += len(batch)
+    return total
+
+
+def seed_benchmark_data(
+    reps: int = 50,
+    clients: int = 2000,
+    visits: int = 200_000,
+    years: int = 3,
+    schedules: int = 100,
+    rows_per_schedule: int = 40,
+    photos: int = 1000,
+    seed: int = 17,
+) -> dict:
+    """Insert synthetic reps (User + Employee), Customers with visit_frequency, Visits spread over
+    `years`, Weekly Schedules with `rows_per_schedule` rows and photo File records. Commits."""
+    import datetime
+
+    import frappe
+    from frappe.utils import add_days, getdate, now_datetime
+
+    rnd = random.Random(seed)
+    now = now_datetime()
+    std = _std(now)
+    company = frappe.db.get_single_value("Global Defaults", "default_company") or frappe.db.get_value("Company", {}, "name")
+    counts = {}
+
+    # reps: enabled Users with Sales User role and a linked Employee (check-in needs one)
+    users = [f"{SEED_PREFIX.lower()}-rep{i}@example.com" for i in range(int(reps))]
+    counts["users"] = _bulk(
+        "User",
+        ["name", "creation", "modified", "owner", "modified_by", "email", "first_name", "enabled", "user_type"],
+        ((u, *std, u, f"Rep {i}", 1, "System User") for i, u in enumerate(users)),
+    )
+    _bulk(
+        "Has Role",
+        ["name", "creation", "modified", "owner", "modified_by", "parent", "parenttype", "parentfield", "role", "idx"],
+        ((f"{SEED_PREFIX}-HR-{i}", *std, u, "User", "roles", "Sales User", 1) for i, u in enumerate(users)),
+    )
+    counts["employees"] = _bulk(
+        "Employee",
+        ["name", "creation", "modified", "owner", "modified_by", "first_name", "employee_name", "user_id",
+         "company", "status", "gender", "date_of_birth", "date_of_joining"],
+        (
+            (f"{SEED_PREFIX}-EMP-{i}", *std, f"Rep {i}", f"Rep {i}", u, company, "Active", "Male",
+             datetime.date(1990, 1, 1), datetime.date(2020, 1, 1))
+            for i, u in enumerate(users)
+        ),
+    )
+
+    # clients: Customers flagged for regular visits
+    customers = [f"{SEED_PREFIX}-CUST-{i}" for i in range(int(clients))]
+    counts["customers"] = _bulk(
+        "Customer",
+        ["name", "creation", "modified", "owner", "modified_by", "customer_name", "customer_type",
+         "requires_regular_visits", "visit_frequency"],
+        ((c, *std, c, "Company", 1, rnd.choice(FREQUENCIES)) for c in customers),
+    )
+
+    # visits: spread uniformly over the last `years` years (plus a month ahead)
+    span_minutes = int(years) * 365 * 24 * 60
+    start = now - datetime.timedelta(minutes=span_minutes)
+
+    def visit_rows():
+        for i in range(int(visits)):
+            scheduled = start + datetime.timedelta(minutes=rnd.randrange(span_minutes + 30 * 24 * 60))
+            status = "Completed" if scheduled < now and rnd.random() < 0.8 else rnd.choice(["Planned", "In Progress", "Cancelled"])
+            duration = rnd.randrange(10, 120) if status == "Completed" else None
+            check_in = scheduled if status in ("Completed", "In Progress") else None
+            check_out = scheduled + datetime.timedelta(minutes=duration) if duration else None
+            # modified = now: cleanup_old_drafts keys on modified, and an old value would have the
+            # benchmark delete (then roll back) most of the seeded Visits on every run
+            yield (
+                f"{SEED_PREFIX}-VIS-{i}", scheduled, now, "Administrator", "Administrator",
+                status, scheduled, rnd.choice(users), "Customer", rnd.choice(customers), rnd.choice(SUBJECTS),
+                "Successful" if status == "Completed" else None, "seeded" if status == "Completed" else None,
+                check_in, check_out, duration,
+            )
+
+    counts["visits"] = _bulk(
+        "Visit",
+        ["name", "creation", "modified", "owner", "modified_by", "status", "scheduled_time", "assigned_to",
+         "client_type", "client", "subject", "visit_outcome", "report_summary", "check_in_time",
+         "check_out_time", "visit_duration_minutes"],
+        visit_rows(),
+    )
+
+    # weekly schedules with unapproved rows, for approve_rows
+    monday = getdate(add_days(now, -getdate(now).weekday()))
+    schedule_rows, detail_rows = [], []
+    for s in range(int(schedules)):
+        parent = f"{SEED_PREFIX}-WS-{s}"
+        schedule_rows.append((parent, *std, rnd.choice(users), add_days(monday, 7 * (s % 8)), "Draft"))
+        for r in range(int(rows_per_schedule)):
+            detail_rows.append((
+                f"{parent}-{r}", *std, parent, "Weekly Schedule", "details", r + 1,
+                WEEKDAY_NAMES[r % 5], datetime.time(8 + r % 9, 0), "Customer", rnd.choice(customers),
+                rnd.choice(["Sales Call", "Follow-up", "Demo"]), 0,
+            ))
+    counts["schedules"] = _bulk(
+        "Weekly Schedule",
+        ["name", "creation", "modified", "owner", "modified_by", "user", "week_start", "status"],
+        schedule_rows,
+    )
+    counts["schedule_rows"] = _bulk(
+        "Weekly Schedule Detail",
+        ["name", "creation", "modified", "owner", "modified_by", "parent", "parenttype", "parentfield", "idx",
+         "day", "time", "client_type", "client", "purpose", "approved"],
+        detail_rows,
+    )
+
+    # photos: File rows attached to Visits (no bytes on disk; enough for File/attachment queries)
+    photo_visits = [f"{SEED_PREFIX}-VIS-{i}" for i in rnd.sample(range(int(visits)), min(int(photos), int(visits)))]
+    counts["photos"] = _bulk(
+        "File",
+        ["name", "creation", "modified", "owner", "modified_by", "file_name", "file_url", "is_private",
+         "attached_to_doctype", "attached_to_name", "attached_to_field", "file_size"],
+        (
+            (f"{SEED_PREFIX}-FILE-{i}", *std, f"{v}.jpg", f"/private/files/{v}.jpg", 1, "Visit", v,
+             "check_in_photo", 150_000)
+            for i, v in enumerate(photo_visits)
+        ),
+    )
+    frappe.db.commit()
+    # bulk inserts skip the hooks that keep Visit Client Due current
+    from visit_management.visit_due import rebuild_visit_client_due
+
+    rebuild_visit_client_due()
+    return counts
+
+
+def purge_benchmark_data() -> dict:
+    """Delete everything seed_benchmark_data created (matched by SEED_PREFIX). Commits."""
+    import frappe
+
+    like = f"{SEED_PREFIX}-%"
+    out = {}
+    for doctype, field in (
+        ("File", "name"),
+        ("Visit Client Due", "client"),
+        ("Weekly Schedule Detail", "parent"),
+        ("Weekly Schedule", "name"),
+        ("Visit", "name"),
+        ("Customer", "name"),
+        ("Employee", "name"),
+        ("Has Role", "name"),
+        ("User", "name"),
+    ):
+        pattern = f"{SEED_PREFIX.lower()}-%" if doctype == "User" else like
+        out[doctype] = frappe.db.count(doctype, {field: ["like", pattern]})
+        frappe.db.delete(doctype, {field: ["like", pattern]})
+    frappe.db.commit()
+    return out
+
+
+def _measure(fn, repeat: int, rollback: bool) -> dict:
+    """Run fn `repeat` times; with rollback, each run is undone via a savepoint."""
+    import frappe
+
+    runs = []
+    try:
+        for _ in range(repeat):
+            if rollback:
+                frappe.db.savepoint("vm_bench")
+            start = time.perf_counter()
+            try:
+                fn()
+            finally:
+                runs.append((time.perf_counter() - start) * 1000)
+                if rollback:
+                    frappe.db.rollback(save_point="vm_bench")
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}"[:300], "runs": len(runs)}
+    runs.sort()
+    return {
+        "runs": len(runs),
+        "best_ms": round(runs[0], 2),
+        "median_ms": round(runs[len(runs) // 2], 2),
+        "max_ms": round(runs[-1], 2),
+    }
+
+
+def run_benchmark_suite(repeat: int = 5, rep: str | None = None) -> dict:
+    """Time the app's hot entry points on a seeded site; returns a JSON-friendly dict."""
+    import subprocess
+
+    import frappe
+    from frappe.utils import add_days, now_datetime
+
+    from visit_management import tasks, utils
+    from visit_management.visit_analytics import get_visit_analytics
+    from visit_management.visit_management.doctype.weekly_schedule.weekly_schedule import approve_rows
+    from visit_management.visit_management.report.visit_frequency_due.visit_frequency_due import (
+        execute as frequency_due_report,
+    )
+
+    repeat = int(repeat)
+    rep = rep or frappe.db.get_value("User", {"name": ["like", f"{SEED_PREFIX.lower()}-%"]}, "name")
+    schedule = frappe.db.get_value("Weekly Schedule", {"name": ["like", f"{SEED_PREFIX}-%"], "status": "Draft"}, "name")
+    planned = frappe.db.get_value(
+        "Visit", {"name": ["like", f"{SEED_PREFIX}-%"], "status": "Planned", "assigned_to": rep}, "name"
+    )
+
+    def as_rep(fn):
+        def run():
+            frappe.set_user(rep)
+            try:
+                return fn()
+            finally:
+                frappe.set_user("Administrator")
+        return run
+
+    def check_in_out():
+        doc = frappe.get_doc("Visit", planned)
+        doc.check_in_photo = doc.check_out_photo = "/private/files/bench.jpg"
+        doc.check_in()
+        doc.reload()
+        doc.check_out()
+
+    cases = {
+        "get_visit_kpis.my.month": (as_rep(lambda: utils.get_visit_kpis(mode="my", period="month")), False),
+        "get_visit_kpis.team.year": (lambda: utils.get_visit_kpis(mode="team", period="year"), False),
+        "get_visit_kpi_payload.team.month": (lambda: utils.get_visit_kpi_payload(mode="team", period="month"), False),
+        "get_frequency_overdue_count": (utils.get_frequency_overdue_count, False),
+        "report.visit_frequency_due": (lambda: frequency_due_report({}), False),
+        "get_visit_analytics.year": (
+            lambda: get_visit_analytics(add_days(now_datetime(), -365), now_datetime()), False
+        ),
+        "approve_rows": (lambda: approve_rows(schedule, create_visits=True), True),
+        "check_in_out": (check_in_out, True),
+        "task.cleanup_old_drafts": (tasks.cleanup_old_drafts, True),
+        "task.send_visit_reminders": (tasks.send_visit_reminders, True),
+    }
+    results = {}
+    for name, (fn, rollback) in cases.items():
+        if (name == "approve_rows" and not schedule) or (name == "check_in_out" and not planned):
+            results[name] = {"error": "no seeded data", "runs": 0}
+            continue
+        frappe.clear_cache()
+        results[name] = _measure(fn, repeat, rollback)
+
+    try:
+        commit = subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=frappe.get_app_path("visit_management"), text=True
+        ).strip()
+    except Exception:
+        commit = None
+    return {
+        "suite": "visit_management",
+        "commit": commit,
+        "site": frappe.local.site,
+        "timestamp": str(now_datetime()),
+        "repeat": repeat,
+        "volumes": {
+            "visits": frappe.db.count("Visit"),
+            "customers_regular": frappe.db.count("Customer", {"requires_regular_visits": 1}),
+            "schedule_rows": frappe.db.count("Weekly Schedule Detail"),
+        },
+        "results": results,
+    }
+
+
+def compare_benchmark_results(baseline: dict, current: dict, threshold: float = 1.2) -> dict:
+    """Median-to-median ratios per case; cases slower than `threshold`x are flagged as regressions."""
+    out = {}
+    for name, cur in (current.get("results") or {}).items():
+        base = (baseline.get("results") or {}).get(name) or {}
+        if not base.get("median_ms") or not cur.get("median_ms"):
+            continue
+        ratio = cur["median_ms"] / base["median_ms"]
+        out[name] = {
+            "baseline_ms": base["median_ms"],
+            "current_ms": cur["median_ms"],
+            "ratio": round(ratio, 3),
+            "regression": ratio > threshold,
+        }
+    return out
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import frappe
+
+# Redis hash of "<client_type>::<client>" -> Address name ("" when the client has no address),
+# stored as plain strings so a whole batch is read with one HMGET
+CACHE_KEY = "vm_client_address"
+
+
+def _field(client_type: str, client: str) -> str:
+    return f"{client_type}::{client}"
+
+
+def _query_default_addresses(clients: list[tuple[str, str]]) -> dict:
+    """One query over Address + Dynamic Link for many clients.
+
+    Returns {(client_type, client): address} for clients that have an address, preferring a
+    primary address and otherwise the most recently modified one.
+    """
+    by_type = {}
+    for client_type, client in clients:
+        by_type.setdefault(client_type, set()).add(client)
+    conditions, values = [], []
+    for client_type, names in by_type.items():
+        conditions.append("(dl.link_doctype = %s and dl.link_name in %s)")
+        values.extend([client_type, tuple(names)])
+
+    out = {}
+    for link_doctype, link_name, address in frappe.db.sql(
+        f"""
+        select dl.link_doctype, dl.link_name, addr.name
+        from `tabDynamic Link` dl
+        inner join `tabAddress` addr on addr.name = dl.parent
+        where dl.parenttype = 'Address' and ({" or ".join(conditions)})
+        order by addr.is_primary_address desc, addr.modified desc
+        """,
+        values,
+    ):
+        out.setdefault((link_doctype, link_name), address)
+    return out
+
+
+def get_default_addresses(clients) -> dict:
+    """Resolve default Addresses for many (client_type, client) pairs.
+
+    Served from the cache with a single HMGET; the misses are resolved with a single query and
+    cached in one HSET, including "no address" so repeated lookups stay off the database.
+    """
+    clients = list(dict.fromkeys((ct, c) for ct, c in clients if ct and c))
+    if not clients:
+        return {}
+    cache = frappe.cache()
+    name = cache.make_key(CACHE_KEY)
+    result, missing = {}, []
+    for key, cached in zip(clients, cache.hmget(name, [_field(*key) for key in clients])):
+        if cached is None:
+            missing.append(key)
+        else:
+            result[key] = cached.decode() or None
+    if missing:
+        found = _query_default_addresses(missing)
+        for key in missing:
+            result[key] = found.get(key)
+        cache.pipeline().hset(name, mapping={_field(*key): found.get(key) or "" for key in missing}).execute()
+    return result
+
+
+def get_default_address(client_type: str, client: str) -> str | None:
+    """Cached default Address for one client (primary first, then most recent)."""
+    if not client_type or not client:
+        return None
+    return get_default_addresses([(client_type, client)]).get((client_type, client))
+
+
+def _linked_clients(doc) -> set[tuple[str, str]]:
+    if not doc:
+        return set()
+    return {(link.get("link_doctype"), link.get("link_name")) for link in (doc.get("links") or [])}
+
+
+def on_address_change(doc, method=None):
+    """Hook: Address on_update / on_trash. Drop cached entries for every client linked before or after."""
+    clients = _linked_clients(doc)
+    if method != "on_trash":
+        clients |= _linked_clients(doc.get_doc_before_save())
+    cache = frappe.cache()
+    for client_type, client in clients:
+        if client_type and client:
+            cache.hdel(CACHE_KEY, _field(client_type, client))
+
+
+def clear_address_cache(*args, **kwargs):
+    """Hook: Address after_rename, where the old name may be cached under any client."""
+    frappe.cache().delete_value(CACHE_KEY)
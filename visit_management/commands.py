@@ -0,0 +1,136 @@
+"""Bench commands for seeding and benchmarking a site.
+
+    bench --site <site> visit-management-seed --visits 500000 --years 3
+    bench --site <site> visit-management-bench --out before.json
+    bench --site <site> visit-management-bench --compare before.json --out after.json
+    bench --site <site> visit-management-purge-seed
+    bench --site <site> visit-management-setup --dry-run
+    bench --site <site> visit-management-tier-photos --days 90 --workers 8
+"""
+
+from __future__ import annotations
+
+import json
+
+import click
+from frappe.commands import get_site, pass_context
+
+
+def _connect(context):
+    import frappe
+
+    site = get_site(context)
+    frappe.init(site=site)
+    frappe.connect()
+    frappe.set_user("Administrator")
+
+
+@click.command("visit-management-seed")
+@click.option("--reps", default=50, help="Sales reps (User + Employee)")
+@click.option("--clients", default=2000, help="Customers requiring regular visits")
+@click.option("--visits", default=200_000, help="Visits spread over --years")
+@click.option("--years", default=3)
+@click.option("--schedules", default=100, help="Weekly Schedules")
+@click.option("--rows", "rows_per_schedule", default=40, help="Rows per Weekly Schedule")
+@click.option("--photos", default=1000, help="Photo File records attached to Visits")
+@click.option("--seed", default=17, help="Random seed, for reproducible data")
+@pass_context
+def seed(context, **kwargs):
+    """Bulk-insert synthetic benchmark data (names prefixed VMB-)."""
+    import frappe
+
+    from visit_management.benchmarks import seed_benchmark_data
+
+    _connect(context)
+    try:
+        click.echo(json.dumps(seed_benchmark_data(**kwargs), indent=1))
+    finally:
+        frappe.destroy()
+
+
+@click.command("visit-management-purge-seed")
+@pass_context
+def purge_seed(context):
+    """Delete the data created by visit-management-seed."""
+    import frappe
+
+    from visit_management.benchmarks import purge_benchmark_data
+
+    _connect(context)
+    try:
+        click.echo(json.dumps(purge_benchmark_data(), indent=1))
+    finally:
+        frappe.destroy()
+
+
+@click.command("visit-management-bench")
+@click.option("--repeat", default=5, help="Runs per entry point")
+@click.option("--rep", default=None, help="User for the 'my' views (default: first seeded rep)")
+@click.option("--out", type=click.Path(dir_okay=False), default=None, help="Write results JSON here")
+@click.option("--compare", type=click.Path(exists=True, dir_okay=False), default=None, help="Baseline results JSON")
+@click.option("--threshold", default=1.2, help="Median slowdown ratio reported as a regression")
+@pass_context
+def bench(context, repeat, rep, out, compare, threshold):
+    """Time the app's hot entry points and emit JSON results."""
+    import frappe
+
+    from visit_management.benchmarks import compare_benchmark_results, run_benchmark_suite
+
+    _connect(context)
+    try:
+        results = run_benchmark_suite(repeat=repeat, rep=rep)
+    finally:
+        frappe.destroy()
+    if compare:
+        with open(compare) as f:
+            results["comparison"] = compare_benchmark_results(json.load(f), results, threshold=threshold)
+    payload = json.dumps(results, indent=1, default=str)
+    if out:
+        with open(out, "w") as f:
+            f.write(payload)
+    click.echo(payload)
+    if any(c.get("regression") for c in (results.get("comparison") or {}).values()):
+        raise SystemExit(1)
+
+
+@click.command("visit-management-setup")
+@click.option("--dry-run", is_flag=True, help="Only report the artifacts that would be upserted")
+@click.option("--force", is_flag=True, help="Upsert every artifact, even when its fingerprint is unchanged")
+@pass_context
+def setup(context, dry_run, force):
+    """Upsert the Visits workspace, cards, chart, dashboard and KPI panel that changed since the last run."""
+    import frappe
+
+    from visit_management.utils import setup_visit_workspace_and_metrics
+
+    _connect(context)
+    try:
+        result = setup_visit_workspace_and_metrics(dry_run=dry_run, force=force)
+        if not dry_run:
+            frappe.db.commit()
+    finally:
+        frappe.destroy()
+    click.echo(json.dumps(result, indent=1))
+
+
+@click.command("visit-management-tier-photos")
+@click.option("--days", type=int, default=None, help="Move photos older than this (default: the setting)")
+@click.option("--workers", default=4, help="Parallel uploads")
+@click.option("--batch-size", default=50, help="Files per worker per batch (one transaction per batch)")
+@click.option("--max-batches", default=100, help="Stop after this many batches")
+@pass_context
+def tier_photos(context, days, workers, batch_size, max_batches):
+    """Move old Visit photos to the configured object store, verifying each copy by MD5."""
+    import frappe
+
+    from visit_management.photo_storage import tier_visit_photos
+
+    _connect(context)
+    try:
+        result = tier_visit_photos(days=days, workers=workers, batch_size=batch_size, max_batches=max_batches)
+    finally:
+        frappe.destroy()
+    click.echo(json.dumps(result, indent=1))
+
+
+commands = [seed, purge_seed, bench, setup, tier_photos]
@@ -3,7 +3,10 @@ from __future__ import annotations
 import frappe
 from frappe.utils import now_datetime
 
+from visit_management.profiling import profiled
 
+
+@profiled("visit.crm_sync")
 def _update_last_visit_on_crm(doc):
     """
     Update a conservative "last_visit_date" field on linked CRM records (Lead/Contact/Customer) if present.
@@ -0,0 +1,231 @@
+"""Visit due dates: last visit + visit frequency, optionally rolled forward to a working day.
+
+Weekly and Biweekly add days; Monthly, Quarterly, Semiannual and Annual add calendar months, clamped
+to the end of a shorter month (31 Jan + 1 month = 28/29 Feb). With Visit Management Settings > Roll
+Due Dates to Working Day, a due date falling on a holiday of the company's default Holiday List (or,
+when it has none, on a weekend) moves to the next working day.
+
+`due_dates` computes whole columns at once: NumPy datetime64 month arithmetic and busday_offset when
+NumPy is installed, a per-date loop otherwise. `due_date` is the scalar form; both give the same dates.
+"""
+
+from __future__ import annotations
+
+import calendar
+import datetime
+
+import frappe
+from frappe.utils import cint, getdate
+
+from visit_management.visit_management.settings_utils import get_settings
+
+try:
+    import numpy as np
+except ImportError:  # optional: falls back to a per-date loop
+    np = None
+
+FREQUENCY_DAYS = {"Weekly": 7, "Biweekly": 14}
+FREQUENCY_MONTHS = {"Monthly": 1, "Quarterly": 3, "Semiannual": 6, "Annual": 12}
+# Working days (Mon..Sun) without a Holiday List; a Holiday List already lists its weekly offs
+DEFAULT_WEEKMASK = "1111100"
+ALL_DAYS = "1111111"
+# Redis hash: company -> {"weekmask", "holidays"}; cleared from Holiday List / Company / settings events
+HOLIDAYS_CACHE_KEY = "vm_holiday_calendar"
+
+
+def _add_months(day: datetime.date, months: int) -> datetime.date:
+    year, month = divmod(day.month - 1 + months, 12)
+    year += day.year
+    month += 1
+    return day.replace(year=year, month=month, day=min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def _raw_due(day: datetime.date | None, frequency: str | None) -> datetime.date | None:
+    if day is None:
+        return None
+    if frequency in FREQUENCY_DAYS:
+        return day + datetime.timedelta(days=FREQUENCY_DAYS[frequency])
+    if frequency in FREQUENCY_MONTHS:
+        return _add_months(day, FREQUENCY_MONTHS[frequency])
+    return None
+
+
+def _roll_forward(day: datetime.date, weekmask: str, holidays: set) -> datetime.date:
+    while weekmask[day.weekday()] != "1" or day in holidays:
+        day += datetime.timedelta(days=1)
+    return day
+
+
+def _to_date(value) -> datetime.date | None:
+    if not value:
+        return None
+    try:
+        return getdate(value)
+    except Exception:
+        return None
+
+
+def _compute_python(last_visits, frequencies, weekmask: str | None, holidays) -> list:
+    holidays = set(holidays or ())
+    out = []
+    for last, frequency in zip(last_visits, frequencies):
+        due = _raw_due(_to_date(last), frequency)
+        out.append(_roll_forward(due, weekmask, holidays) if due and weekmask else due)
+    return out
+
+
+# datetime.date.toordinal() of 1970-01-01, the datetime64 epoch
+_EPOCH_ORDINAL = 719163
+
+
+def _ordinal(value) -> int:
+    if not value:
+        return 0
+    if not hasattr(value, "toordinal"):
+        value = _to_date(value)
+    return value.toordinal() if value else 0
+
+
+def _compute_numpy(last_visits, frequencies, weekmask: str | None, holidays):
+    days = last_visits if isinstance(last_visits, np.ndarray) and last_visits.dtype.kind == "M" else None
+    if days is None:
+        # ordinals are much cheaper to build from date/datetime objects than datetime64 conversion
+        ordinals = np.fromiter((_ordinal(v) for v in last_visits), dtype=np.int64, count=len(last_visits))
+        days = (ordinals - _EPOCH_ORDINAL).astype("datetime64[D]")
+        days[ordinals == 0] = np.datetime64("NaT")
+    days = days.astype("datetime64[D]")
+    # fixed-width strings compare in C; object arrays compare element by element in Python
+    if not isinstance(frequencies, np.ndarray):
+        frequencies = [f or "" for f in frequencies]
+    frequencies = np.asarray(frequencies, dtype="U12")
+    step_days = np.zeros(len(days), dtype=np.int64)
+    step_months = np.zeros(len(days), dtype=np.int64)
+    for frequency, n in FREQUENCY_DAYS.items():
+        step_days[frequencies == frequency] = n
+    for frequency, n in FREQUENCY_MONTHS.items():
+        step_months[frequencies == frequency] = n
+    out = np.full(len(days), np.datetime64("NaT"), dtype="datetime64[D]")
+    known = ~np.isnat(days)
+    by_days = known & (step_days > 0)
+    out[by_days] = days[by_days] + step_days[by_days].astype("timedelta64[D]")
+    by_months = known & (step_months > 0)
+    if by_months.any():
+        # month arithmetic on day numbers through a table of month starts covering the range;
+        # datetime64 unit conversions of the whole column would dominate the run time
+        d = days[by_months].view("i8")
+        steps = step_months[by_months]
+        first = np.datetime64(int(d.min()), "D").astype("datetime64[M]")
+        last = np.datetime64(int(d.max()), "D").astype("datetime64[M]") + int(steps.max()) + 1
+        starts = np.arange(first, last + 1).astype("datetime64[D]").view("i8")
+        month = np.searchsorted(starts, d, side="right") - 1
+        target = month + steps
+        # keep the day of month, clamped to the target month's last day
+        due = starts[target] + np.minimum(d - starts[month], starts[target + 1] - starts[target] - 1)
+        out[by_months] = due.astype("datetime64[D]")
+    if weekmask:
+        due = ~np.isnat(out)
+        out[due] = np.busday_offset(
+            out[due], 0, roll="forward", weekmask=weekmask, holidays=np.array(list(holidays or ()), dtype="datetime64[D]")
+        )
+    return out
+
+
+def compute_due_dates(last_visits, frequencies, weekmask: str | None = None, holidays=(), as_datetime64: bool = False):
+    """Due dates for parallel sequences of last visits and frequencies; None (NaT) where unknown.
+
+    `weekmask` ("1111100" = Mon..Fri) enables rolling forward past non-working days and `holidays`.
+    With NumPy, `as_datetime64` returns the datetime64[D] array instead of a list of dates.
+    """
+    if np is None:
+        return _compute_python(last_visits, frequencies, weekmask, holidays)
+    out = _compute_numpy(last_visits, frequencies, weekmask, holidays)
+    return out if as_datetime64 else out.astype(object).tolist()
+
+
+# Holiday calendar ----------------------------------------------------------
+
+
+def _holiday_company(company: str | None = None) -> str | None:
+    return company or get_settings().get("holiday_company") or frappe.defaults.get_global_default("company")
+
+
+def get_holiday_calendar(company: str | None = None) -> tuple[str, list[datetime.date]]:
+    """(weekmask, holidays) of the company's default Holiday List; Mon..Fri and none without one."""
+    company = _holiday_company(company)
+    cache = frappe.cache()
+    cached = cache.hget(HOLIDAYS_CACHE_KEY, company or "")
+    if cached is None:
+        holiday_list = frappe.db.get_value("Company", company, "default_holiday_list") if company else None
+        if holiday_list:
+            dates = frappe.get_all(
+                "Holiday",
+                filters={"parent": holiday_list, "parenttype": "Holiday List"},
+                pluck="holiday_date",
+                order_by="holiday_date asc",
+            )
+            cached = {"weekmask": ALL_DAYS, "holidays": [str(d) for d in dates]}
+        else:
+            cached = {"weekmask": DEFAULT_WEEKMASK, "holidays": []}
+        cache.hset(HOLIDAYS_CACHE_KEY, company or "", cached)
+    return cached["weekmask"], [getdate(d) for d in cached["holidays"]]
+
+
+def _rolling(roll: bool | None, company: str | None) -> tuple[str | None, list]:
+    if roll is None:
+        roll = cint(get_settings().get("roll_due_dates_to_working_day"))
+    if not roll:
+        return None, []
+    return get_holiday_calendar(company)
+
+
+def due_dates(last_visits, frequencies, roll: bool | None = None, company: str | None = None) -> list:
+    """Due dates (date or None) for parallel sequences of last visits and frequencies.
+
+    `roll` defaults to the Roll Due Dates to Working Day setting; `company` to the setting's Holiday
+    Company, then the default company.
+    """
+    weekmask, holidays = _rolling(roll, company)
+    return compute_due_dates(last_visits, frequencies, weekmask, holidays)
+
+
+def due_date(last_visit, frequency: str | None, roll: bool | None = None, company: str | None = None):
+    """Scalar due_dates: next due date for a client last visited at `last_visit`, or None."""
+    due = _raw_due(_to_date(last_visit), frequency)
+    if due is None:
+        return None
+    weekmask, holidays = _rolling(roll, company)
+    return _roll_forward(due, weekmask, set(holidays)) if weekmask else due
+
+
+# Hooks ---------------------------------------------------------------------
+
+
+def _rebuild_client_due():
+    frappe.enqueue(
+        "visit_management.visit_due.rebuild_visit_client_due",
+        queue="long",
+        job_id="vm_client_due_rebuild",
+        deduplicate=True,
+        enqueue_after_commit=True,
+    )
+
+
+def on_holiday_change(doc, method=None):
+    """Hook: Holiday List on_update / on_trash and Company on_update."""
+    if doc.doctype == "Company":
+        before = doc.get_doc_before_save()
+        if before and before.get("default_holiday_list") == doc.get("default_holiday_list"):
+            return
+    frappe.cache().delete_value(HOLIDAYS_CACHE_KEY)
+    if cint(get_settings().get("roll_due_dates_to_working_day")):
+        _rebuild_client_due()
+
+
+def on_settings_change(doc, method=None):
+    """Hook: Visit Management Settings on_update. Due dates change with the rolling settings."""
+    before = doc.get_doc_before_save()
+    fields = ("roll_due_dates_to_working_day", "holiday_company")
+    if before and all(before.get(f) == doc.get(f) for f in fields):
+        return
+    frappe.cache().delete_value(HOLIDAYS_CACHE_KEY)
+    _rebuild_client_due()
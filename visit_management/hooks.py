@@ -20,10 +20,63 @@ required_apps = ["crm", "hrms", "erpnext"]
 doc_events = {
     "Visit": {
         "validate": "visit_management.crm_integration.on_visit_validate",
-        "on_update": "visit_management.crm_integration.on_visit_update",
+        "on_update": [
+            "visit_management.crm_integration.on_visit_update",
+            "visit_management.visit_stats.on_visit_update",
+            "visit_management.utils.bump_visit_data_version",
+            "visit_management.realtime.on_visit_update",
+            "visit_management.utils.track_visit_assignee",
+            "visit_management.visit_due.on_visit_change",
+        ],
         "after_insert": "visit_management.crm_integration.on_visit_after_insert",
-        "on_trash": "visit_management.crm_integration.on_visit_trash",
-    }
+        "on_trash": [
+            "visit_management.crm_integration.on_visit_trash",
+            "visit_management.visit_stats.on_visit_trash",
+            "visit_management.utils.bump_visit_data_version",
+            "visit_management.realtime.on_visit_trash",
+            "visit_management.activity.on_visit_trash",
+            "visit_management.visit_due.on_visit_change",
+        ],
+    },
+    # Frequency / territory changes refresh the client's Visit Client Due row
+    "Customer": {
+        "on_update": "visit_management.visit_due.on_client_change",
+        "on_trash": "visit_management.visit_due.on_client_change",
+        "after_rename": "visit_management.visit_due.on_client_rename",
+    },
+    "CRM Organization": {
+        "on_update": "visit_management.visit_due.on_client_change",
+        "on_trash": "visit_management.visit_due.on_client_change",
+        "after_rename": "visit_management.visit_due.on_client_rename",
+    },
+    # Keep the cached client -> default Address map in sync
+    "Address": {
+        "on_update": "visit_management.client_address.on_address_change",
+        "on_trash": "visit_management.client_address.on_address_change",
+        "after_rename": "visit_management.client_address.clear_address_cache",
+    },
+    # Photos moved to the object store: delete the object with its File stub
+    "File": {
+        "on_trash": "visit_management.photo_storage.on_file_trash",
+    },
+    # Cached holiday calendars used to roll visit due dates to working days
+    "Holiday List": {
+        "on_update": "visit_management.due_dates.on_holiday_change",
+        "on_trash": "visit_management.due_dates.on_holiday_change",
+    },
+    "Company": {
+        "on_update": "visit_management.due_dates.on_holiday_change",
+    },
+    "Visit Management Settings": {
+        "on_update": "visit_management.due_dates.on_settings_change",
+    },
+    # Cached enabled users / managers used by the KPI panel
+    "User": {
+        "after_insert": "visit_management.utils.clear_user_caches",
+        "on_update": "visit_management.utils.clear_user_caches",
+        "on_trash": "visit_management.utils.clear_user_caches",
+        "after_rename": "visit_management.utils.clear_user_caches",
+    },
 }
 
 # Permissions hook pointing to the controller function
@@ -31,12 +84,30 @@ has_permission = {
     "Visit": "visit_management.visit_management.doctype.visit.visit.has_permission"
 }
 
+# Same rule pushed into SQL for list views, reports and counts
+permission_query_conditions = {
+    "Visit": "visit_management.visit_management.doctype.visit.visit.get_permission_query_conditions"
+}
+
 # Scheduler events for automation
 scheduler_events = {
+    "cron": {
+        # drains profiling samples (only produced when visit_management_profiling is set)
+        "*/5 * * * *": ["visit_management.tasks.flush_profile_samples"],
+        # retries stuck Visit HR Events and queues check-ins that never reached HRMS (Queued HR mode)
+        "*/10 * * * *": ["visit_management.tasks.reconcile_hr_events"],
+    },
     "hourly": [],
     "daily": [
         "visit_management.tasks.cleanup_old_drafts",
         "visit_management.tasks.send_visit_reminders",
+        "visit_management.tasks.repair_visit_daily_stats",
+        "visit_management.tasks.repair_visit_client_due",
+        "visit_management.tasks.prune_visit_assignees",
+    ],
+    "daily_long": [
+        "visit_management.tasks.archive_old_visits",
+        "visit_management.tasks.tier_visit_photos",
     ],
 }
 
@@ -0,0 +1,258 @@
+"""Employee Checkin / Attendance writes for Visit check-in and check-out.
+
+Visit Management Settings decide how Visit.check_in/check_out reach HRMS:
+
+- HR integration disabled: only the Visit is updated.
+- "Synchronous": Employee Checkin and Attendance are written inside the request.
+- "Queued": the request records a Visit HR Event and commits. A background job per employee applies
+  that employee's queued events in time order, in batches; `reconcile_hr_events` (scheduled) re-enqueues
+  stuck or failed events and queues events for checked-in Visits that have neither an event nor a
+  matching Employee Checkin.
+"""
+
+from __future__ import annotations
+
+import hashlib
+
+import frappe
+from frappe.utils import add_to_date, cint, getdate, now_datetime
+
+from visit_management.visit_management.settings_utils import get_settings
+
+EVENT_DOCTYPE = "Visit HR Event"
+# Employee Checkin.device_id of checkins written for Visits
+DEVICE_ID = "Visit"
+# Events applied per worker transaction
+BATCH_SIZE = 100
+# Failed events are retried until they have been attempted this many times
+MAX_ATTEMPTS = 5
+# Queued/failed events untouched for this long are re-enqueued by reconciliation
+STALE_MINUTES = 10
+# Seconds to wait for a concurrent request creating the same (employee, date) Attendance
+ATTENDANCE_LOCK_TIMEOUT = 10
+# How far back reconciliation looks for checked-in Visits without an event or checkin
+RECONCILE_DAYS = 2
+
+
+def hr_mode() -> str:
+    """"Off", "Synchronous" or "Queued"."""
+    settings = get_settings()
+    if not cint(settings.get("enable_hr_integration")):
+        return "Off"
+    return settings.get("hr_integration_mode") or "Synchronous"
+
+
+def insert_employee_checkin(employee: str, when, log_type: str) -> str:
+    ec = frappe.get_doc({
+        "doctype": "Employee Checkin",
+        "employee": employee,
+        "time": when,
+        "log_type": log_type,
+        "device_id": DEVICE_ID,
+        "skip_auto_attendance": 0,
+    })
+    ec.insert(ignore_permissions=True)
+    return ec.name
+
+
+def _duplicate_errors() -> tuple:
+    try:
+        from hrms.hr.doctype.attendance.attendance import DuplicateAttendanceError
+    except ImportError:
+        return (frappe.DuplicateEntryError,)
+    return (frappe.DuplicateEntryError, DuplicateAttendanceError)
+
+
+def _lock_attendance(employee: str, day) -> bool:
+    """Take a lock on (employee, date) held until this transaction ends; False if it timed out."""
+    key = f"vm_attendance::{employee}::{day}"
+    if frappe.db.db_type == "postgres":
+        frappe.db.sql("select pg_advisory_xact_lock(hashtext(%s))", key)
+        return True
+    # MariaDB lock names are limited to 64 characters and live until released or the connection closes
+    name = "vm_att_" + hashlib.sha1(key.encode()).hexdigest()
+    if frappe.db.sql("select get_lock(%s, %s)", (name, ATTENDANCE_LOCK_TIMEOUT))[0][0] != 1:
+        return False
+
+    def release():
+        frappe.db.sql("select release_lock(%s)", name)
+
+    frappe.db.after_commit.add(release)
+    frappe.db.after_rollback.add(release)
+    return True
+
+
+def ensure_attendance(employee: str, when=None):
+    """The employee's Attendance for the day of `when`, created as Present if missing.
+
+    Get-or-create is race-free: concurrent creators are serialised by a (employee, date) lock held until
+    their transaction ends, the lookup under the lock is a locking read (so it sees an Attendance committed
+    after this transaction started), and a duplicate raised anyway (lock timeout) is answered by reading
+    the winner's row. The result is memoised for the request, so check-in and check-out on the same day
+    resolve it once.
+    """
+    when = when or now_datetime()
+    day = getdate(when)
+    memo = frappe.flags.setdefault("vm_attendance", {})
+    if (employee, day) in memo:
+        return memo[(employee, day)]
+
+    filters = {"employee": employee, "attendance_date": day, "docstatus": ["!=", 2]}
+    locked = _lock_attendance(employee, day)
+    att_name = frappe.db.get_value("Attendance", filters, "name", for_update=locked)
+    if att_name:
+        att = frappe.get_doc("Attendance", att_name)
+    else:
+        # Create a basic attendance if not exists
+        att = frappe.get_doc({
+            "doctype": "Attendance",
+            "employee": employee,
+            "attendance_date": day,
+            "status": "Present",
+        })
+        frappe.db.savepoint("vm_attendance_insert")
+        try:
+            att.insert(ignore_permissions=True)
+        except _duplicate_errors():
+            frappe.db.rollback(save_point="vm_attendance_insert")
+            att_name = frappe.db.get_value("Attendance", filters, "name", for_update=True)
+            if not att_name:
+                raise
+            att = frappe.get_doc("Attendance", att_name)
+    memo[(employee, day)] = att
+    return att
+
+
+def forget_attendance():
+    """Drop the request memo of resolved Attendance (after rolling back work that may have created one)."""
+    frappe.flags.pop("vm_attendance", None)
+
+
+def stamp_attendance(employee: str, when, log_type: str):
+    """Set in_time (first IN of the day) or out_time (latest OUT) on the day's Attendance."""
+    att = ensure_attendance(employee, when)
+    meta = frappe.get_meta("Attendance")
+    if log_type == "IN":
+        if meta.has_field("in_time") and not att.get("in_time"):
+            att.db_set("in_time", when)
+    elif meta.has_field("out_time"):
+        att.db_set("out_time", when)
+    return att
+
+
+def queue_hr_event(visit: str, employee: str, when, log_type: str) -> str:
+    """Record a check-in/out for the employee's queue and schedule its worker after commit."""
+    name = frappe.generate_hash(length=12)
+    now, user = now_datetime(), frappe.session.user
+    frappe.db.bulk_insert(
+        EVENT_DOCTYPE,
+        fields=["name", "creation", "modified", "owner", "modified_by",
+                "visit", "employee", "log_type", "event_time", "status", "attempts"],
+        values=[(name, now, now, user, user, visit, employee, log_type, when, "Queued", 0)],
+    )
+    enqueue_employee(employee)
+    return name
+
+
+def enqueue_employee(employee: str):
+    # one job per employee at a time keeps that employee's events in order
+    frappe.enqueue(
+        "visit_management.hr_sync.process_employee_events",
+        queue="short",
+        job_id=f"vm_hr_sync::{employee}",
+        deduplicate=True,
+        enqueue_after_commit=True,
+        employee=employee,
+    )
+
+
+def _pending_events(employee: str) -> list:
+    return frappe.get_all(
+        EVENT_DOCTYPE,
+        filters={"employee": employee, "status": ["in", ["Queued", "Failed"]], "attempts": ["<", MAX_ATTEMPTS]},
+        fields=["name", "log_type", "event_time", "attempts"],
+        order_by="event_time asc, creation asc",
+        limit_page_length=BATCH_SIZE,
+    )
+
+
+def process_employee_events(employee: str) -> int:
+    """Background job: apply an employee's pending events in time order, one transaction per batch.
+
+    Stops at the first failure so a later event never overtakes an earlier one; the failed event keeps
+    its place and is retried by reconciliation until MAX_ATTEMPTS. Keeps reading until the queue is
+    empty, so events recorded while the job runs are not left behind.
+    """
+    done = 0
+    while True:
+        events = _pending_events(employee)
+        if not events:
+            return done
+        for ev in events:
+            frappe.db.savepoint("vm_hr_event")
+            try:
+                checkin = insert_employee_checkin(employee, ev.event_time, ev.log_type)
+                stamp_attendance(employee, ev.event_time, ev.log_type)
+                frappe.db.set_value(EVENT_DOCTYPE, ev.name, {"status": "Done", "employee_checkin": checkin, "error": None})
+                done += 1
+            except Exception:
+                frappe.db.rollback(save_point="vm_hr_event")
+                forget_attendance()
+                frappe.db.set_value(EVENT_DOCTYPE, ev.name, {
+                    "status": "Failed",
+                    "attempts": cint(ev.attempts) + 1,
+                    "error": frappe.get_traceback()[-2000:],
+                })
+                frappe.db.commit()
+                return done
+        frappe.db.commit()
+
+
+def _find_gaps(since) -> list[tuple]:
+    """(visit, employee, log_type, time) for Visit check-ins/outs since `since` with neither a Visit HR Event
+    nor an Employee Checkin of that employee at that time."""
+    parts = []
+    for log_type, column in (("IN", "check_in_time"), ("OUT", "check_out_time")):
+        parts.append(f"""
+            select v.name, emp.name, '{log_type}', v.{column}
+            from `tabVisit` v
+            inner join `tabEmployee` emp on emp.user_id = v.assigned_to
+            where v.{column} >= %(since)s
+                and not exists (
+                    select 1 from `tab{EVENT_DOCTYPE}` e where e.visit = v.name and e.log_type = '{log_type}'
+                )
+                and not exists (
+                    select 1 from `tabEmployee Checkin` ec
+                    where ec.employee = emp.name and ec.log_type = '{log_type}' and ec.time = v.{column}
+                )
+        """)
+    return frappe.db.sql(" union all ".join(parts), {"since": since})
+
+
+def reconcile_hr_events(days: int = RECONCILE_DAYS) -> dict:
+    """Scheduled: re-enqueue employees whose events are stuck or failed and, in Queued mode, queue events
+    for recent check-ins/outs that never reached HRMS."""
+    stale = add_to_date(now_datetime(), minutes=-STALE_MINUTES)
+    employees = set(frappe.get_all(
+        EVENT_DOCTYPE,
+        filters=[["status", "in", ["Queued", "Failed"]], ["attempts", "<", MAX_ATTEMPTS], ["modified", "<", stale]],
+        pluck="employee",
+        distinct=True,
+    ))
+    gaps = []
+    if hr_mode() == "Queued":
+        gaps = _find_gaps(add_to_date(now_datetime(), days=-int(days)))
+        if gaps:
+            now = now_datetime()
+            frappe.db.bulk_insert(
+                EVENT_DOCTYPE,
+                fields=["name", "creation", "modified", "owner", "modified_by",
+                        "visit", "employee", "log_type", "event_time", "status", "attempts"],
+                values=[(frappe.generate_hash(length=12), now, now, "Administrator", "Administrator",
+                         visit, employee, log_type, when, "Queued", 0) for visit, employee, log_type, when in gaps],
+            )
+            employees.update(g[1] for g in gaps)
+    for employee in employees:
+        enqueue_employee(employee)
+    frappe.db.commit()
+    return {"employees": len(employees), "gaps": len(gaps)}
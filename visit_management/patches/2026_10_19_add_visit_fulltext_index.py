@@ -0,0 +1,11 @@
+import frappe
+
+
+def execute():
+    """Full-text index over the Visit text fields searched by visit_search.search_visits."""
+    if not frappe.db.table_exists("Visit"):
+        return
+
+    from visit_management.visit_search import ensure_fulltext_index
+
+    ensure_fulltext_index()
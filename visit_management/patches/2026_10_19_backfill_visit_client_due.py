@@ -0,0 +1,17 @@
+import frappe
+
+
+def execute():
+    """Create the Visit Client Due table and fill it from the clients and their Visits."""
+    if not frappe.db.exists("DocType", "Visit"):
+        return
+    frappe.reload_doc("visit_management", "doctype", "visit_client_due")
+    # the rebuild also reads archived Visits; patches run before model sync creates new tables
+    from visit_management.archive import ensure_archive_table
+
+    ensure_archive_table()
+
+    from visit_management.visit_due import rebuild_visit_client_due
+
+    result = rebuild_visit_client_due()
+    frappe.logger().info(f"Visit Client Due backfill: {result}")
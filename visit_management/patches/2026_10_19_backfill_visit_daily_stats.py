@@ -0,0 +1,17 @@
+import frappe
+
+
+def execute():
+    """Create the Visit Daily Stat table and fill it from existing Visits."""
+    if not frappe.db.exists("DocType", "Visit"):
+        return
+    frappe.reload_doc("visit_management", "doctype", "visit_daily_stat")
+    # the rebuild also reads archived Visits; patches run before model sync creates new tables
+    from visit_management.archive import ensure_archive_table
+
+    ensure_archive_table()
+
+    from visit_management.visit_stats import rebuild_visit_daily_stats
+
+    result = rebuild_visit_daily_stats()
+    frappe.logger().info(f"Visit Daily Stat backfill: {result}")
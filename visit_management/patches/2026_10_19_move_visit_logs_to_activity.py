@@ -0,0 +1,31 @@
+import frappe
+
+
+def execute():
+    """Move Visit Log child rows into the append-only Visit Activity table and drop Visit Log.
+
+    Runs before model sync, which then removes the `visit_logs` table field from Visit.
+    """
+    if not frappe.db.exists("DocType", "Visit"):
+        return
+    frappe.reload_doc("visit_management", "doctype", "visit_activity")
+    if not frappe.db.table_exists("Visit Log"):
+        return
+
+    # one INSERT ... SELECT; row names are kept, so a re-run skips rows already moved
+    frappe.db.sql(
+        """
+        insert into `tabVisit Activity`
+            (name, creation, modified, owner, modified_by, visit, `timestamp`, activity, `user`)
+        select log.name, log.creation, log.modified, log.owner, log.modified_by,
+            log.parent, coalesce(log.`timestamp`, log.creation), log.activity, coalesce(log.`user`, log.owner)
+        from `tabVisit Log` log
+        where log.parenttype = 'Visit'
+            and not exists (select 1 from `tabVisit Activity` va where va.name = log.name)
+        """
+    )
+    rows = frappe.db.sql("select count(*) from `tabVisit Log` where parenttype = 'Visit'")[0][0]
+    frappe.delete_doc("DocType", "Visit Log", force=True, ignore_missing=True)
+    frappe.db.sql_ddl("drop table if exists `tabVisit Log`")
+    frappe.db.commit()
+    frappe.logger().info(f"Visit Log -> Visit Activity: {rows} rows moved")
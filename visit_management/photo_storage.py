@@ -0,0 +1,408 @@
+"""Storage tiers for Visit photos.
+
+Check-in/check-out photos (Files attached to a Visit's Attach Image fields) start in the site's files
+directory. With Visit Management Settings > Move Photos After (days) set, a daily job copies older ones
+to an object store in parallel batches, verifies each copy by MD5, records it in Visit Photo Object and
+turns the File into a stub: its file_url (and the Visit field holding it) points at `get_visit_photo`,
+which streams the bytes back from the store. The local copy is then deleted, so site backups with files
+carry recent photos only.
+
+Backends: "S3" (any S3-compatible service such as MinIO; needs boto3) and "Local", a directory laid
+out like a bucket (`<root>/<bucket>/<key>`) that stands in for one in development and tests.
+"""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import mimetypes
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+import frappe
+from frappe import whitelist
+from frappe.utils import add_days, cint, now_datetime
+
+from visit_management.visit_management.settings_utils import get_settings
+
+OBJECT_DOCTYPE = "Visit Photo Object"
+STUB_METHOD = "/api/method/visit_management.photo_storage.get_visit_photo"
+# Bytes read at a time when hashing, copying and streaming
+CHUNK_SIZE = 256 * 1024
+# Files per worker per batch; one batch is one transaction
+BATCH_SIZE = 50
+WORKERS = 4
+# Batches per run, so the daily job stays bounded; the remainder moves on the next run
+MAX_BATCHES = 100
+
+
+class ObjectStoreError(Exception):
+    pass
+
+
+def _file_md5(path: str) -> str:
+    h = hashlib.md5()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ObjectStore:
+    """The few object store operations the photo tier needs. Methods must be thread-safe."""
+
+    backend = ""
+
+    def put(self, key: str, path: str, md5: str) -> None:
+        """Store the file at `path` as `key`; a body whose MD5 is not `md5` must be rejected."""
+        raise NotImplementedError
+
+    def md5(self, key: str) -> str | None:
+        """Hex MD5 of the stored object, None if there is none."""
+        raise NotImplementedError
+
+    def iter_chunks(self, key: str):
+        """The object's bytes, CHUNK_SIZE at a time."""
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+
+class LocalObjectStore(ObjectStore):
+    """Bucket-shaped directory; objects are written to a temporary name and renamed once verified."""
+
+    backend = "Local"
+
+    def __init__(self, root: str, bucket: str):
+        self.base = os.path.abspath(os.path.join(root, bucket))
+
+    def _path(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.base, key))
+        if not path.startswith(self.base + os.sep):
+            raise ObjectStoreError(f"Invalid object key {key!r}")
+        return path
+
+    def put(self, key: str, path: str, md5: str) -> None:
+        target = self._path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        part = f"{target}.{uuid.uuid4().hex}.part"
+        h = hashlib.md5()
+        try:
+            with open(path, "rb") as src, open(part, "wb") as dst:
+                for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+                    h.update(chunk)
+                    dst.write(chunk)
+            if h.hexdigest() != md5:
+                raise ObjectStoreError(f"Content-MD5 mismatch for {key}")
+            os.replace(part, target)
+        finally:
+            if os.path.exists(part):
+                os.remove(part)
+
+    def md5(self, key: str) -> str | None:
+        path = self._path(key)
+        return _file_md5(path) if os.path.exists(path) else None
+
+    def iter_chunks(self, key: str):
+        with open(self._path(key), "rb") as fh:
+            yield from iter(lambda: fh.read(CHUNK_SIZE), b"")
+
+    def delete(self, key: str) -> None:
+        path = self._path(key)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+class S3ObjectStore(ObjectStore):
+    """S3-compatible bucket (AWS S3, MinIO, ...) through boto3."""
+
+    backend = "S3"
+
+    def __init__(self, bucket: str, endpoint_url=None, region=None, access_key=None, secret_key=None):
+        try:
+            import boto3
+        except ImportError:
+            frappe.throw("The S3 photo store needs boto3: pip install boto3 (or the app's photo-store extra).")
+        if not bucket:
+            frappe.throw("Set an Object Store Bucket in Visit Management Settings.")
+        self.bucket = bucket
+        # boto3 clients are thread-safe; one is shared by the migration workers
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url or None,
+            region_name=region or None,
+            aws_access_key_id=access_key or None,
+            aws_secret_access_key=secret_key or None,
+        )
+
+    def put(self, key: str, path: str, md5: str) -> None:
+        # the server recomputes Content-MD5 and rejects a corrupted body
+        with open(path, "rb") as fh:
+            self.client.put_object(
+                Bucket=self.bucket, Key=key, Body=fh, ContentMD5=base64.b64encode(bytes.fromhex(md5)).decode()
+            )
+
+    def md5(self, key: str) -> str | None:
+        from botocore.exceptions import ClientError
+
+        try:
+            etag = self.client.head_object(Bucket=self.bucket, Key=key)["ETag"].strip('"')
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        if "-" not in etag:
+            # single-part upload: the ETag is the MD5
+            return etag
+        h = hashlib.md5()
+        for chunk in self.iter_chunks(key):
+            h.update(chunk)
+        return h.hexdigest()
+
+    def iter_chunks(self, key: str):
+        body = self.client.get_object(Bucket=self.bucket, Key=key)["Body"]
+        try:
+            yield from body.iter_chunks(CHUNK_SIZE)
+        finally:
+            body.close()
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+
+def get_object_store() -> ObjectStore:
+    """The object store configured in Visit Management Settings."""
+    settings = get_settings()
+    bucket = settings.get("object_store_bucket") or "visit-photos"
+    if settings.get("object_store_backend") == "S3":
+        secret = frappe.get_cached_doc("Visit Management Settings").get_password(
+            "object_store_secret_key", raise_exception=False
+        )
+        return S3ObjectStore(
+            bucket,
+            endpoint_url=settings.get("object_store_endpoint"),
+            region=settings.get("object_store_region"),
+            access_key=settings.get("object_store_access_key"),
+            secret_key=secret,
+        )
+    root = settings.get("object_store_path") or "object_store"
+    # relative paths are inside the site folder but outside public/ and private/, so not in file backups
+    return LocalObjectStore(root if os.path.isabs(root) else os.path.abspath(frappe.get_site_path(root)), bucket)
+
+
+def stub_url(file_name: str) -> str:
+    return f"{STUB_METHOD}?file={quote(file_name)}"
+
+
+def _local_path(file_url: str) -> str | None:
+    for prefix, parts in (("/private/files/", ("private", "files")), ("/files/", ("public", "files"))):
+        if file_url.startswith(prefix):
+            return os.path.abspath(frappe.get_site_path(*parts, file_url[len(prefix):]))
+    return None
+
+
+def _photo_fields() -> list[str]:
+    return [df.fieldname for df in frappe.get_meta("Visit").fields if df.fieldtype == "Attach Image"]
+
+
+def _candidates(cutoff, fields: list[str], after: tuple | None, limit: int, files: list[str] | None = None) -> list:
+    """Local Files attached to Visit photo fields created before `cutoff`, in (creation, name) order."""
+    condition, values = "", {"cutoff": cutoff, "fields": tuple(fields), "limit": limit}
+    if after:
+        condition = "and (creation > %(after_creation)s or (creation = %(after_creation)s and name > %(after_name)s))"
+        values.update(after_creation=after[0], after_name=after[1])
+    if files is not None:
+        condition += " and name in %(files)s"
+        values["files"] = tuple(files) or ("",)
+    return frappe.db.sql(
+        f"""
+        select name, creation, file_name, file_url, content_hash, attached_to_name, attached_to_field
+        from `tabFile`
+        where attached_to_doctype in ('Visit', 'Visit Archive') and attached_to_field in %(fields)s and is_folder = 0
+            and creation < %(cutoff)s and (file_url like '/files/%%' or file_url like '/private/files/%%')
+            {condition}
+        order by creation, name
+        limit %(limit)s
+        """,
+        values,
+        as_dict=True,
+    )
+
+
+def _copy(store: ObjectStore, row) -> tuple:
+    """Upload one File and verify the stored copy. Runs in a worker thread, so no database access.
+
+    Returns (md5, size, None) or (None, None, error).
+    """
+    try:
+        if not row.path or not os.path.exists(row.path):
+            raise ObjectStoreError("local file is missing")
+        md5 = _file_md5(row.path)
+        if row.content_hash and row.content_hash != md5:
+            raise ObjectStoreError("local bytes do not match File.content_hash")
+        store.put(row.key, row.path, md5)
+        if store.md5(row.key) != md5:
+            raise ObjectStoreError("stored copy failed MD5 verification")
+        return md5, os.path.getsize(row.path), None
+    except Exception as e:
+        return None, None, f"{row.name}: {e}"
+
+
+def _stub(backend: str, copied: list[tuple]):
+    """Record the objects and point their Files (and the Visit fields / archived Visits using them) at the stub URL."""
+    now, user = now_datetime(), frappe.session.user
+    frappe.db.bulk_insert(
+        OBJECT_DOCTYPE,
+        fields=["name", "creation", "modified", "owner", "modified_by", "backend", "object_key", "md5", "file_size",
+                "original_url"],
+        values=[(r.name, now, now, user, user, backend, r.key, md5, size, r.file_url) for r, md5, size in copied],
+    )
+    for r, md5, _size in copied:
+        stub = stub_url(r.name)
+        frappe.db.set_value("File", r.name, {"file_url": stub, "content_hash": md5}, update_modified=False)
+        values = {"visit": r.attached_to_name, "url": r.file_url, "stub": stub}
+        frappe.db.sql(
+            f"update `tabVisit` set `{r.attached_to_field}` = %(stub)s where name = %(visit)s and `{r.attached_to_field}` = %(url)s",
+            values,
+        )
+        frappe.db.sql(
+            "update `tabVisit Archive` set data = replace(data, %(url)s, %(stub)s) where name = %(visit)s", values
+        )
+
+
+def _delete_local(copied: list[tuple]) -> int:
+    """Delete the local bytes of committed stubs, unless another File still uses the same file_url."""
+    urls = {r.file_url: r.path for r, _md5, _size in copied}
+    shared = set(frappe.db.sql_list(
+        "select distinct file_url from `tabFile` where file_url in %(urls)s", {"urls": tuple(urls)}
+    ))
+    freed = 0
+    for url, path in urls.items():
+        if url in shared or not os.path.exists(path):
+            continue
+        freed += os.path.getsize(path)
+        os.remove(path)
+    return freed
+
+
+def tier_visit_photos(
+    days: int | None = None,
+    workers: int = WORKERS,
+    batch_size: int = BATCH_SIZE,
+    max_batches: int = MAX_BATCHES,
+    store: ObjectStore | None = None,
+    files: list[str] | None = None,
+) -> dict:
+    """Move Visit photos older than `days` (default: the photo_tier_after_days setting; 0 disables) to
+    the object store. Each batch is uploaded by `workers` threads, stubbed and committed, then its
+    local files are deleted; Files that fail to copy or verify are left as they are and reported.
+
+    `store` overrides the configured object store and `files` limits the run to those File names.
+    """
+    days = cint(days if days is not None else get_settings().get("photo_tier_after_days"))
+    if days <= 0:
+        return {"moved": 0, "enabled": False}
+    store = store or get_object_store()
+    cutoff = add_days(now_datetime(), -days)
+    fields, limit = _photo_fields(), int(workers) * int(batch_size)
+    moved = freed = batches = 0
+    errors, after = [], None
+    with ThreadPoolExecutor(max_workers=int(workers)) as pool:
+        while batches < int(max_batches):
+            rows = _candidates(cutoff, fields, after, limit, files)
+            if not rows:
+                break
+            after = (rows[-1].creation, rows[-1].name)
+            for r in rows:
+                r.path = _local_path(r.file_url)
+                r.key = f"{frappe.local.site}/visits/{r.attached_to_name}/{r.name}-{os.path.basename(r.file_name or r.file_url)}"
+            copied = []
+            for r, (md5, size, error) in zip(rows, pool.map(lambda r: _copy(store, r), rows)):
+                if error:
+                    errors.append(error)
+                else:
+                    copied.append((r, md5, size))
+            if copied:
+                _stub(store.backend, copied)
+                frappe.db.commit()
+                freed += _delete_local(copied)
+                moved += len(copied)
+            batches += 1
+            if len(rows) < limit:
+                break
+    return {
+        "moved": moved,
+        "failed": len(errors),
+        "errors": errors[:20],
+        "freed_bytes": freed,
+        "batches": batches,
+        "backend": store.backend,
+        "enabled": True,
+    }
+
+
+# Access --------------------------------------------------------------------
+
+
+def _check_photo_access(file_doc):
+    if not cint(file_doc.is_private):
+        return
+    visit = file_doc.attached_to_name
+    archived = file_doc.attached_to_doctype == "Visit Archive"
+    if visit and (archived or file_doc.attached_to_doctype == "Visit" and not frappe.db.exists("Visit", visit)):
+        # archived Visits are read with Visit's access rule, not Visit Archive's role permissions
+        from visit_management.archive import can_read_archived_visit
+
+        if can_read_archived_visit(visit):
+            return
+        raise frappe.PermissionError
+    if not frappe.has_permission("File", "read", doc=file_doc):
+        raise frappe.PermissionError
+
+
+@whitelist()
+def get_visit_photo(file: str):
+    """Stream a tiered Visit photo back from the object store (the URL of its File stub)."""
+    from werkzeug.wrappers import Response
+
+    from visit_management.utils import _request_etags
+
+    file_doc = frappe.get_doc("File", file)
+    _check_photo_access(file_doc)
+    obj = frappe.db.get_value(OBJECT_DOCTYPE, file, ["backend", "object_key", "md5"], as_dict=True)
+    if not obj:
+        raise frappe.DoesNotExistError(f"File {file} is not in the object store")
+    headers = {"ETag": f'"{obj.md5}"', "Cache-Control": "private, max-age=86400"}
+    if obj.md5 in _request_etags():
+        return Response(status=304, headers=headers)
+    store = get_object_store()
+    if store.backend != obj.backend:
+        frappe.throw(f"File {file} is stored in the {obj.backend} object store, but {store.backend} is configured.")
+    filename = os.path.basename(file_doc.file_name or obj.object_key)
+    headers["Content-Disposition"] = f"inline; filename*=UTF-8''{quote(filename)}"
+    return Response(
+        store.iter_chunks(obj.object_key),
+        mimetype=mimetypes.guess_type(filename)[0] or "application/octet-stream",
+        headers=headers,
+        direct_passthrough=True,
+    )
+
+
+def on_file_trash(doc, method=None):
+    """Hook: File on_trash. Delete the stored object once the File deletion is committed."""
+    key = frappe.db.get_value(OBJECT_DOCTYPE, doc.name, "object_key")
+    if not key:
+        return
+    frappe.db.delete(OBJECT_DOCTYPE, {"name": doc.name})
+    store = get_object_store()
+
+    def delete():
+        try:
+            store.delete(key)
+        except Exception:
+            frappe.log_error(title="Visit Photo Object Delete Failed", message=key)
+
+    frappe.db.after_commit.add(delete)
@@ -0,0 +1,154 @@
+"""Toggleable per-stage timing for Visit Management entry points.
+
+Enable on a site with:
+
+    bench --site <site> set-config visit_management_profiling 1
+
+When disabled, `profiled` and `stage` cost one config lookup per call. When enabled, each stage
+records (stage, wall ms, SQL queries) into a per-process ring buffer that is pushed to a redis list
+in batches; `flush_profile_samples` (scheduled) drains that list into Visit Profile Sample, and the
+"Visit Stage Timings" report shows p50/p95/p99 per stage.
+"""
+
+from __future__ import annotations
+
+import functools
+import json
+import time
+from collections import deque
+
+import frappe
+from frappe.utils import add_days, now_datetime
+
+CONFIG_KEY = "visit_management_profiling"
+SAMPLE_DOCTYPE = "Visit Profile Sample"
+REDIS_KEY = "vm_profile_samples"
+
+# Per-process ring buffer; oldest samples are dropped if a flush never happens
+BUFFER = deque(maxlen=5000)
+# Push the buffer to redis when it holds this many samples or is this old (seconds)
+PUSH_BATCH = 200
+PUSH_INTERVAL = 30
+# Cap on samples waiting in redis between scheduled flushes
+REDIS_MAX = 100_000
+# Samples older than this are deleted by the flush job
+RETENTION_DAYS = 14
+
+_last_push = time.monotonic()
+
+
+def is_enabled() -> bool:
+    try:
+        return bool(frappe.conf.get(CONFIG_KEY))
+    except Exception:
+        return False
+
+
+def _install_query_counter():
+    """Count frappe.db.sql calls for this connection (installed lazily, only while profiling)."""
+    db = getattr(frappe.local, "db", None)
+    if db is None or getattr(db, "_vm_counting", False):
+        return db
+    original = db.sql
+
+    @functools.wraps(original)
+    def counting_sql(*args, **kwargs):
+        db._vm_queries += 1
+        return original(*args, **kwargs)
+
+    db._vm_queries = 0
+    db._vm_counting = True
+    db.sql = counting_sql
+    return db
+
+
+def _query_count(db) -> int:
+    return getattr(db, "_vm_queries", 0) if db is not None else 0
+
+
+def record(stage_name: str, duration_ms: float, queries: int):
+    global _last_push
+    BUFFER.append((stage_name, round(duration_ms, 3), queries, str(now_datetime()), frappe.session.user))
+    if len(BUFFER) >= PUSH_BATCH or time.monotonic() - _last_push >= PUSH_INTERVAL:
+        push_buffer()
+
+
+def push_buffer():
+    """Move buffered samples from this process to the shared redis list."""
+    global _last_push
+    _last_push = time.monotonic()
+    samples = []
+    while BUFFER:
+        samples.append(BUFFER.popleft())
+    if not samples:
+        return
+    try:
+        cache = frappe.cache()
+        cache.rpush(REDIS_KEY, frappe.as_json(samples, indent=None))
+        cache.ltrim(REDIS_KEY, -(REDIS_MAX // PUSH_BATCH), -1)
+    except Exception:
+        pass
+
+
+class stage:
+    """Context manager timing a named stage: `with stage("check_in.attendance"): ...`"""
+
+    __slots__ = ("name", "active", "db", "start", "queries")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.active = False
+
+    def __enter__(self):
+        if is_enabled():
+            self.active = True
+            self.db = _install_query_counter()
+            self.queries = _query_count(self.db)
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.active:
+            elapsed = (time.perf_counter() - self.start) * 1000
+            record(self.name, elapsed, _query_count(self.db) - self.queries)
+        return False
+
+
+def profiled(stage_name: str):
+    """Decorator form of `stage` for whole entry points."""
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not is_enabled():
+                return fn(*args, **kwargs)
+            with stage(stage_name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def flush_profile_samples() -> int:
+    """Scheduled: drain the redis list into Visit Profile Sample and purge old samples."""
+    push_buffer()
+    cache = frappe.cache()
+    values = []
+    while True:
+        batch = cache.lpop(REDIS_KEY)
+        if batch is None:
+            break
+        for stage_name, duration_ms, queries, recorded_at, user in json.loads(batch):
+            values.append((frappe.generate_hash(length=12), recorded_at, recorded_at, user, user,
+                           stage_name, duration_ms, queries, recorded_at, user))
+    if values:
+        frappe.db.bulk_insert(
+            SAMPLE_DOCTYPE,
+            fields=["name", "creation", "modified", "owner", "modified_by",
+                    "stage", "duration_ms", "query_count", "recorded_at", "user"],
+            values=values,
+        )
+    frappe.db.delete(SAMPLE_DOCTYPE, {"recorded_at": ["<", add_days(now_datetime(), -RETENTION_DAYS)]})
+    frappe.db.commit()
+    return len(values)
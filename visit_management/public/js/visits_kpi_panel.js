@@ -0,0 +1,218 @@
+// Visits KPI Panel: status counters for the "Visits" workspace.
+//
+// Served as a static asset (long-lived browser cache) and mounted by the "Visits KPI Panel" Custom HTML
+// Block, whose html/script are a small stub written by visit_management.utils._kpi_panel_block_spec.
+// The stub requests this file with ?v=<content hash>, so a changed file gets a new URL after migrate.
+frappe.provide("visit_management.kpi_panel");
+
+visit_management.kpi_panel.TEMPLATE = `
+<div class="vm-kpi-panel">
+  <div class="vm-kpi-toolbar">
+    <div class="left d-flex align-items-center">
+      <div class="btn-group btn-group-sm mr-2">
+        <button type="button" class="btn btn-default vm-mode-btn active" data-mode="my">My</button>
+        <button type="button" class="btn btn-default vm-mode-btn" data-mode="team">Team</button>
+      </div>
+      <div class="vm-agent d-none">
+        <label class="mr-2 text-muted">Agent</label>
+        <select class="form-control input-sm vm-agent-select"><option value="">All</option></select>
+      </div>
+    </div>
+    <div class="right d-flex align-items-center">
+      <div class="vm-period mr-2">
+        <label class="mr-2 text-muted">Period</label>
+        <select class="form-control input-sm vm-period-select">
+          <option value="today">Today</option>
+          <option value="week">This Week</option>
+          <option value="month" selected> This Month</option>
+          <option value="quarter">This Quarter</option>
+          <option value="year">This Year</option>
+        </select>
+      </div>
+      <div class="form-check form-check-inline">
+        <input class="form-check-input vm-overdue-scope" type="checkbox" id="vmOverdueScope">
+        <label class="form-check-label" for="vmOverdueScope">Overdue within period</label>
+      </div>
+      <span class="vm-role-hint badge badge-warning ml-2 d-none">Limited to My</span>
+    </div>
+  </div>
+  <div class="vm-kpis row">
+    <div class="col-md-3 col-sm-6 vm-kpi">
+      <div class="kpi-card planned">
+        <div class="kpi-label">Planned</div>
+        <div class="kpi-value" data-key="planned">–</div>
+      </div>
+    </div>
+    <div class="col-md-3 col-sm-6 vm-kpi">
+      <div class="kpi-card in-progress">
+        <div class="kpi-label">In Progress</div>
+        <div class="kpi-value" data-key="in_progress">–</div>
+      </div>
+    </div>
+    <div class="col-md-3 col-sm-6 vm-kpi">
+      <div class="kpi-card completed">
+        <div class="kpi-label">Completed</div>
+        <div class="kpi-value" data-key="completed">–</div>
+      </div>
+    </div>
+    <div class="col-md-3 col-sm-6 vm-kpi">
+      <div class="kpi-card overdue">
+        <div class="kpi-label">Overdue</div>
+        <div class="kpi-value" data-key="overdue">–</div>
+      </div>
+    </div>
+  </div>
+</div>
+`;
+
+visit_management.kpi_panel.mount = function (root_element) {
+    var $ = window.jQuery;
+    var panel = root_element;
+    $(panel).find('.vm-kpi-mount').html(visit_management.kpi_panel.TEMPLATE);
+    var state = { mode: 'my', period: 'month', user: '', overdue_within_period: false, is_manager: false, etag: null, agents_key: null, timer: null, kpis: null, window: null };
+
+    function setMode(mode, showHint) {
+        state.mode = mode;
+        $(panel).find('.vm-mode-btn').removeClass('active');
+        $(panel).find('.vm-mode-btn[data-mode="' + mode + '"]').addClass('active');
+        $(panel).find('.vm-role-hint').toggleClass('d-none', !showHint);
+        $(panel).find('.vm-agent').toggleClass('d-none', !(mode === 'team' && state.is_manager));
+    }
+
+    function setPeriod(period) {
+        state.period = period;
+        $(panel).find('.vm-period-select').val(period);
+    }
+
+    function setUser(user){
+        state.user = user || '';
+    }
+
+    function renderValues(data){
+        var keys = ['planned','in_progress','completed','overdue'];
+        for (var i=0;i<keys.length;i++){
+            var k = keys[i];
+            // Avoid HTML-returning formatters; show plain, locale-safe numbers
+            var val = data[k] || 0;
+            $(panel).find('.kpi-value[data-key="' + k + '"]').text(String(val));
+        }
+        // role awareness
+        state.is_manager = !!data.is_manager;
+        if (data.effective_mode && data.effective_mode !== state.mode) {
+            setMode(data.effective_mode, true);
+        } else {
+            $(panel).find('.vm-role-hint').toggleClass('d-none', !!state.is_manager);
+        }
+        $(panel).find('.vm-agent').toggleClass('d-none', !(state.mode === 'team' && state.is_manager));
+    }
+
+    function fetchPayload(){
+        var args = {
+            mode: state.mode, period: state.period, user: state.user,
+            overdue_within_period: state.overdue_within_period ? 1 : 0
+        };
+        var headers = { 'Accept': 'application/json', 'X-Frappe-CSRF-Token': frappe.csrf_token };
+        // conditional GET: the server answers 304 without running any count when nothing changed
+        if (state.etag) { headers['If-None-Match'] = '"' + state.etag + '"'; }
+        return fetch('/api/method/visit_management.utils.get_visit_kpi_payload?' + $.param(args), {
+            method: 'GET', headers: headers, credentials: 'same-origin'
+        }).then(function(r){
+            if (r.status === 304 || !r.ok) { return null; }
+            return r.json().then(function(body){ return body && body.message; });
+        });
+    }
+
+    function renderAgents(list){
+        var key = (list || []).join('|');
+        if (key === state.agents_key) { return; }
+        state.agents_key = key;
+        var $sel = $(panel).find('.vm-agent-select');
+        $sel.empty();
+        $sel.append('<option value="">All</option>');
+        (list || []).filter(Boolean).forEach(function(u){
+            $sel.append($('<option>').attr('value', u).text(u));
+        });
+        $sel.val(state.user);
+    }
+
+    function refresh(){
+        return fetchPayload().then(function(data){
+            if (!data || data.not_modified) { return false; }
+            state.etag = data.etag;
+            renderAgents(data.assignees);
+            state.kpis = data.kpis || {};
+            state.window = state.kpis.window || null;
+            renderValues(state.kpis);
+            return true;
+        });
+    }
+
+    var STATUS_KEYS = { 'Planned': 'planned', 'In Progress': 'in_progress', 'Completed': 'completed' };
+
+    function inScope(row){
+        if (!row || !row.status) { return false; }
+        if (state.mode === 'my') { return row.assigned_to === frappe.session.user; }
+        return !state.user || row.assigned_to === state.user;
+    }
+
+    function inWindow(ts){
+        var w = state.window;
+        return !w || !w.start || (ts >= w.start && ts <= w.end);
+    }
+
+    function applyRow(row, sign){
+        if (!inScope(row)) { return; }
+        var ts = row.scheduled_time || '';
+        var key = STATUS_KEYS[row.status];
+        if (key && inWindow(ts)) {
+            state.kpis[key] = Math.max(0, (state.kpis[key] || 0) + sign);
+        }
+        var open = row.status === 'Planned' || row.status === 'In Progress';
+        if (open && ts && ts < frappe.datetime.now_datetime() && (!state.overdue_within_period || inWindow(ts))) {
+            state.kpis.overdue = Math.max(0, (state.kpis.overdue || 0) + sign);
+        }
+    }
+
+    function onVisitEvent(msg){
+        if (!panel.isConnected) { frappe.realtime.off('visit_kpi_update', onVisitEvent); return; }
+        if (!state.kpis || !msg) { return; }
+        // move the Visit out of its old counter and into its new one; no server round-trip
+        applyRow(msg.before, -1);
+        applyRow(msg.after, 1);
+        renderValues(state.kpis);
+    }
+
+    function poll(){
+        // stop once the panel is gone; skip while the tab is hidden
+        if (!panel.isConnected) { clearInterval(state.timer); frappe.realtime.off('visit_kpi_update', onVisitEvent); return; }
+        if (!document.hidden) { refresh(); }
+    }
+
+    // events
+    $(panel).find('.vm-mode-btn').on('click', function(){
+        var mode = $(this).data('mode');
+        setMode(mode, false);
+        refresh();
+    });
+    $(panel).find('.vm-period-select').on('change', function(){
+        var period = $(this).val();
+        setPeriod(period);
+        refresh();
+    });
+    $(panel).find('.vm-agent-select').on('change', function(){
+        setUser($(this).val());
+        refresh();
+    });
+    $(panel).find('.vm-overdue-scope').on('change', function(){
+        state.overdue_within_period = $(this).is(':checked');
+        refresh();
+    });
+
+    // init
+    setMode('my', false);
+    setPeriod('month');
+    refresh();
+    // counters follow realtime deltas; the slow poll only resyncs (e.g. after a socket drop)
+    frappe.realtime.on('visit_kpi_update', onVisitEvent);
+    state.timer = setInterval(poll, 300000);
+};
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import frappe
+
+# Socket event consumed by the Visits KPI Panel
+KPI_EVENT = "visit_kpi_update"
+
+MANAGER_ROLES = ("Sales Manager", "System Manager")
+MANAGERS_CACHE_KEY = "vm_kpi_managers"
+
+# Visit fields that decide which KPI counter a Visit lands in
+KPI_FIELDS = ("assigned_to", "status", "scheduled_time")
+
+
+def kpi_snapshot(row) -> dict | None:
+    """The KPI-relevant fields of a Visit; take it before changing the Visit to publish as `before`."""
+    if not row:
+        return None
+    return {
+        "assigned_to": row.get("assigned_to"),
+        "status": row.get("status"),
+        "scheduled_time": str(row.get("scheduled_time") or ""),
+        "check_in_time": str(row.get("check_in_time") or ""),
+        "check_out_time": str(row.get("check_out_time") or ""),
+    }
+
+
+def _team_managers() -> list[str]:
+    """Enabled users holding a manager role (they see the team view); cached for five minutes."""
+    cache = frappe.cache()
+    users = cache.get_value(MANAGERS_CACHE_KEY)
+    if users is None:
+        holders = frappe.get_all(
+            "Has Role",
+            filters={"role": ["in", MANAGER_ROLES], "parenttype": "User"},
+            pluck="parent",
+            distinct=True,
+        )
+        users = frappe.get_all("User", filters={"name": ["in", holders or [""]], "enabled": 1}, pluck="name")
+        cache.set_value(MANAGERS_CACHE_KEY, users, expires_in_sec=300)
+    return users
+
+
+def publish_visit_event(doc, kind: str, before=None):
+    """Publish a compact KPI delta for a Visit to its old and new assignee and the team managers.
+
+    `before`/`after` carry only assignee, status, scheduled and check-in/out times, so the panel can
+    move one count between its counters without asking the server. Each recipient gets it once, in
+    their own user room, so no one else's Visits reach the browser. Sent after commit.
+    """
+    message = {
+        "name": doc.name,
+        "kind": kind,
+        "before": kpi_snapshot(before),
+        "after": None if kind == "trash" else kpi_snapshot(doc),
+    }
+    recipients = set(_team_managers())
+    recipients.update(u for u in (doc.get("assigned_to"), before and before.get("assigned_to")) if u)
+    for user in recipients:
+        frappe.publish_realtime(KPI_EVENT, message, user=user, after_commit=True)
+
+
+def on_visit_update(doc, method=None):
+    """Hook: on_update. Publishes inserts and changes of status, schedule or assignee."""
+    try:
+        before = doc.get_doc_before_save()
+        if before is None:
+            publish_visit_event(doc, "insert")
+        elif any(before.get(f) != doc.get(f) for f in KPI_FIELDS):
+            publish_visit_event(doc, "update", before=before)
+    except Exception:
+        frappe.log_error(title="Visit Realtime Publish Failed", message=f"Visit {doc.name}")
+
+
+def on_visit_trash(doc, method=None):
+    """Hook: on_trash"""
+    try:
+        publish_visit_event(doc, "trash", before=doc)
+    except Exception:
+        frappe.log_error(title="Visit Realtime Publish Failed", message=f"Visit {doc.name}")
@@ -3,18 +3,24 @@ from __future__ import annotations
 import frappe
 from frappe.utils import add_days, now_datetime, nowdate
 
+from visit_management.profiling import profiled
+
 
 def update_overdue_status():
     """Deprecated: Overdue status removed. Kept for backward compatibility (no-op)."""
     return
 
 
+@profiled("task.cleanup_old_drafts")
 def cleanup_old_drafts(days: int = 90):
-    """Daily: delete Draft Visits older than N days to keep db tidy."""
+    """Daily: delete Draft Visits older than N days to keep db tidy.
+
+    Completed and Cancelled Visits are history, not drafts; old ones go to Visit Archive instead.
+    """
     cutoff = add_days(nowdate(), -days)
     old_drafts = frappe.get_all(
         "Visit",
-        filters={"docstatus": 0, "modified": ["<", cutoff]},
+        filters={"docstatus": 0, "modified": ["<", cutoff], "status": ["not in", ["Completed", "Cancelled"]]},
         pluck="name",
     )
     for name in old_drafts:
@@ -24,6 +30,7 @@ def cleanup_old_drafts(days: int = 90):
             frappe.log_error(title="Visit Cleanup Failed", message=f"Could not delete Visit {name}")
 
 
+@profiled("task.send_visit_reminders")
 def send_visit_reminders(lookahead_days: int = 1):
     """Daily: email Assigned To users about upcoming visits in next N days."""
     from_date = nowdate()
@@ -50,3 +57,80 @@ def send_visit_reminders(lookahead_days: int = 1):
                 title="Visit Reminder Failed",
                 message=f"Could not send reminder for Visit {v.name} to {v.assigned_to}",
             )
+
+
+@profiled("task.repair_visit_daily_stats")
+def repair_visit_daily_stats():
+    """Daily: recompute the Visit Daily Stat rollup and fix any drift from missed events."""
+    from visit_management.visit_stats import rebuild_visit_daily_stats
+
+    try:
+        rebuild_visit_daily_stats()
+    except Exception:
+        frappe.log_error(title="Visit Daily Stat Repair Failed")
+
+
+@profiled("task.repair_visit_client_due")
+def repair_visit_client_due():
+    """Daily: recompute Visit Client Due and fix any drift from missed or skipped refresh jobs."""
+    from visit_management.visit_due import rebuild_visit_client_due
+
+    try:
+        rebuild_visit_client_due()
+    except Exception:
+        frappe.log_error(title="Visit Client Due Repair Failed")
+
+
+@profiled("task.prune_visit_assignees")
+def prune_visit_assignees():
+    """Daily: rebuild the cached Visit assignee set, dropping users no longer assigned any Visit."""
+    from visit_management.utils import rebuild_visit_assignees
+
+    try:
+        rebuild_visit_assignees()
+    except Exception:
+        frappe.log_error(title="Visit Assignee Cache Rebuild Failed")
+
+
+def flush_profile_samples():
+    """Every 5 minutes: move profiling samples from redis into Visit Profile Sample."""
+    from visit_management.profiling import flush_profile_samples as _flush
+
+    try:
+        _flush()
+    except Exception:
+        frappe.log_error(title="Visit Profile Flush Failed")
+
+
+def reconcile_hr_events():
+    """Every 10 minutes: re-enqueue stuck/failed Visit HR Events and queue check-ins missing from HRMS."""
+    from visit_management.hr_sync import reconcile_hr_events as _reconcile
+
+    try:
+        _reconcile()
+    except Exception:
+        frappe.log_error(title="Visit HR Reconciliation Failed")
+
+
+@profiled("task.archive_old_visits")
+def archive_old_visits():
+    """Daily (long queue): move old Completed/Cancelled Visits to Visit Archive (if archive_after_days is set)."""
+    from visit_management.archive import archive_visits
+
+    try:
+        archive_visits()
+    except Exception:
+        frappe.log_error(title="Visit Archive Failed")
+
+
+@profiled("task.tier_visit_photos")
+def tier_visit_photos():
+    """Daily (long queue): move old Visit photos to the object store (if photo_tier_after_days is set)."""
+    from visit_management.photo_storage import tier_visit_photos as tier
+
+    try:
+        result = tier()
+        if result.get("failed"):
+            frappe.log_error(title="Visit Photo Tiering Incomplete", message=frappe.as_json(result))
+    except Exception:
+        frappe.log_error(title="Visit Photo Tiering Failed")
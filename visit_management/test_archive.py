@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import add_days, now_datetime
+
+from visit_management import archive
+from visit_management.tests.utils import make_visits
+from visit_management.visit_management.doctype.weekly_schedule.weekly_schedule import (
+    create_visits_for_approved_rows,
+)
+
+
+class TestArchiveVisits(FrappeTestCase):
+    def tearDown(self):
+        frappe.db.rollback()
+
+    def test_schedule_generated_visit_is_archived_and_readable(self):
+        user = frappe.session.user
+        old = add_days(now_datetime(), -400)
+        visit = make_visits([(user, user)], status="Completed", scheduled_time=old)[0]
+        frappe.db.set_value("Visit", visit, "modified", old, update_modified=False)
+        schedule = frappe.get_doc({
+            "doctype": "Weekly Schedule",
+            "user": user,
+            "week_start": old.date(),
+            "status": "Draft",
+            "details": [{"day": "Monday", "time": "09:00:00", "purpose": "Sales Call"}],
+        }).insert(ignore_permissions=True)
+        row = schedule.details[0].name
+        frappe.db.set_value("Weekly Schedule Detail", row, {"approved": 1, "visit": visit})
+
+        # archive_visits commits per chunk; keep this run inside the test transaction
+        with patch.object(frappe.db, "commit"):
+            result = archive.archive_visits(days=30)
+
+        self.assertGreaterEqual(result["archived"], 1)
+        self.assertFalse(frappe.db.exists("Visit", visit))
+        self.assertEqual(
+            frappe.db.get_value("Weekly Schedule Detail", row, ["visit", "archived_visit"]), (None, visit)
+        )
+
+        archived = archive.get_archived_visit(visit)
+        self.assertEqual(archived["name"], visit)
+        self.assertEqual(archived["status"], "Completed")
+        self.assertTrue(archived["archived"])
+
+        # the row saves without a dangling link and does not create the Visit again
+        self.assertEqual(create_visits_for_approved_rows(schedule.name), {"created": [], "skipped": [row]})
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import datetime
+import random
+import unittest
+from unittest.mock import patch
+
+from frappe.tests.utils import FrappeTestCase
+
+from visit_management import due_dates
+from visit_management.due_dates import (
+    ALL_DAYS,
+    DEFAULT_WEEKMASK,
+    FREQUENCY_DAYS,
+    FREQUENCY_MONTHS,
+    compute_due_dates,
+    due_date,
+)
+
+D = datetime.date
+
+
+class TestDueDates(FrappeTestCase):
+    def assertDue(self, last_visits, frequencies, expected, weekmask=None, holidays=()):
+        """Check compute_due_dates on both backends and the scalar due_date against `expected`."""
+        backends = {"python": None}
+        if due_dates.np is not None:
+            backends["numpy"] = due_dates.np
+        for backend, np in backends.items():
+            with self.subTest(backend=backend), patch.object(due_dates, "np", np):
+                self.assertEqual(compute_due_dates(last_visits, frequencies, weekmask, holidays), expected)
+        rolling = (weekmask, list(holidays)) if weekmask else (None, [])
+        with patch.object(due_dates, "_rolling", return_value=rolling):
+            self.assertEqual([due_date(v, f) for v, f in zip(last_visits, frequencies)], expected)
+
+    def test_month_end_is_clamped(self):
+        self.assertDue(
+            [D(2025, 1, 31), D(2024, 1, 31), D(2024, 2, 29), D(2024, 11, 30), D(2024, 8, 31), D(2025, 1, 15)],
+            ["Monthly", "Monthly", "Annual", "Quarterly", "Semiannual", "Monthly"],
+            [D(2025, 2, 28), D(2024, 2, 29), D(2025, 2, 28), D(2025, 2, 28), D(2025, 2, 28), D(2025, 2, 15)],
+        )
+
+    def test_days_and_datetimes(self):
+        self.assertDue(
+            [datetime.datetime(2024, 12, 28, 17, 30), "2024-12-28"],
+            ["Weekly", "Biweekly"],
+            [D(2025, 1, 4), D(2025, 1, 11)],
+        )
+
+    def test_weekend_rolls_to_monday(self):
+        # 2025-01-04 and its Weekly due date 2025-01-11 are Saturdays
+        self.assertDue([D(2025, 1, 4)], ["Weekly"], [D(2025, 1, 13)], weekmask=DEFAULT_WEEKMASK)
+
+    def test_holidays_roll_forward(self):
+        # Monday 13th is a holiday too, so the Saturday due date lands on Tuesday
+        self.assertDue(
+            [D(2025, 1, 4), D(2025, 1, 7)],
+            ["Weekly", "Weekly"],
+            [D(2025, 1, 14), D(2025, 1, 14)],
+            weekmask=DEFAULT_WEEKMASK,
+            holidays=[D(2025, 1, 13)],
+        )
+        # a Holiday List already lists its weekly offs: every day counts unless it is a holiday
+        self.assertDue(
+            [D(2025, 1, 4), D(2025, 1, 5)],
+            ["Weekly", "Weekly"],
+            [D(2025, 1, 12), D(2025, 1, 12)],
+            weekmask=ALL_DAYS,
+            holidays=[D(2025, 1, 11)],
+        )
+
+    def test_unknown_inputs_have_no_due_date(self):
+        self.assertDue(
+            [None, D(2025, 1, 4), D(2025, 1, 4), D(2025, 1, 4), "", "not a date"],
+            ["Weekly", None, "", "Fortnightly", "Monthly", "Monthly"],
+            [None] * 6,
+            weekmask=DEFAULT_WEEKMASK,
+        )
+
+    @unittest.skipIf(due_dates.np is None, "needs NumPy")
+    def test_numpy_matches_python(self):
+        rnd = random.Random(7)
+        frequencies = [*FREQUENCY_DAYS, *FREQUENCY_MONTHS, None, "Fortnightly"]
+        start = datetime.datetime(2023, 1, 1)
+        last_visits = [
+            None if rnd.random() < 0.05 else start + datetime.timedelta(minutes=rnd.randrange(3 * 365 * 24 * 60))
+            for _ in range(2000)
+        ]
+        freqs = [rnd.choice(frequencies) for _ in last_visits]
+        holidays = [D(year, month, day) for year in range(2023, 2028) for month, day in ((1, 1), (5, 1), (12, 25))]
+        for weekmask in (None, DEFAULT_WEEKMASK, ALL_DAYS):
+            with self.subTest(weekmask=weekmask):
+                self.assertEqual(
+                    due_dates._compute_numpy(last_visits, freqs, weekmask, holidays).astype(object).tolist(),
+                    due_dates._compute_python(last_visits, freqs, weekmask, holidays),
+                )
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import threading
+import unittest
+from datetime import date
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import get_datetime
+
+from visit_management.hr_sync import ensure_attendance
+
+# Past day for the concurrent check-ins (HRMS refuses Attendance in the future)
+ATTENDANCE_DAY = date(2024, 1, 8)
+
+
+class TestEnsureAttendanceConcurrency(FrappeTestCase):
+    WORKERS = 50
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        if "hrms" not in frappe.get_installed_apps():
+            raise unittest.SkipTest("Attendance needs HRMS")
+        company = frappe.get_all("Company", pluck="name", limit=1)
+        gender = frappe.get_all("Gender", pluck="name", limit=1)
+        if not company or not gender:
+            raise unittest.SkipTest("needs a Company and a Gender")
+        cls.employee = frappe.get_doc({
+            "doctype": "Employee",
+            "first_name": "VM Attendance Race",
+            "gender": gender[0],
+            "date_of_birth": "1990-01-01",
+            "date_of_joining": "2020-01-01",
+            "company": company[0],
+        }).insert(ignore_permissions=True).name
+        # the workers use their own connections, so the Employee must be committed
+        frappe.db.commit()
+
+    @classmethod
+    def tearDownClass(cls):
+        frappe.db.rollback()
+        frappe.db.delete("Attendance", {"employee": cls.employee})
+        frappe.delete_doc("Employee", cls.employee, force=True, ignore_permissions=True)
+        frappe.db.commit()
+        super().tearDownClass()
+
+    def test_one_attendance_for_simultaneous_check_ins(self):
+        site, user = frappe.local.site, frappe.session.user
+        when = get_datetime(f"{ATTENDANCE_DAY} 09:00:00")
+        barrier = threading.Barrier(self.WORKERS)
+        resolved, errors = [], []
+
+        def worker():
+            # one connection per thread and a commit each, as parallel check-in requests would
+            frappe.init(site=site)
+            frappe.connect()
+            frappe.set_user(user)
+            try:
+                barrier.wait()
+                att = ensure_attendance(self.employee, when)
+                frappe.db.commit()
+                resolved.append(att.name)
+            except Exception as e:
+                frappe.db.rollback()
+                errors.append(repr(e))
+            finally:
+                frappe.destroy()
+
+        threads = [threading.Thread(target=worker) for _ in range(self.WORKERS)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        frappe.db.rollback()  # fresh snapshot that sees the workers' commits
+        created = frappe.get_all(
+            "Attendance", filters={"employee": self.employee, "attendance_date": ATTENDANCE_DAY}, pluck="name"
+        )
+        self.assertEqual(errors, [])
+        self.assertEqual(len(created), 1)
+        self.assertEqual(set(resolved), set(created))
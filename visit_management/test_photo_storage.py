@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import add_to_date, now_datetime
+
+from visit_management.photo_storage import OBJECT_DOCTYPE, LocalObjectStore, _local_path, stub_url, tier_visit_photos
+from visit_management.tests.utils import make_visits
+
+
+class TestPhotoTiering(FrappeTestCase):
+    PHOTOS = 20
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix="vm-test-store-")
+        self.store = LocalObjectStore(self.root, "test")
+        self.paths = []
+
+    def tearDown(self):
+        frappe.db.rollback()
+        for path in self.paths:
+            if os.path.exists(path):
+                os.remove(path)
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def make_photos(self, visits: list[str]) -> dict[str, tuple[str, str, bytes]]:
+        """One local check-in photo File per Visit, created 10 days ago; the first has a wrong content_hash.
+        Returns {file name: (visit, file_url, bytes)}."""
+        created = add_to_date(now_datetime(), days=-10)
+        photos, values = {}, []
+        for i, visit in enumerate(visits):
+            name = frappe.generate_hash(length=10)
+            url = f"/private/files/vm-test-{name}.jpg"
+            data = os.urandom(4096 + i)
+            path = _local_path(url)
+            with open(path, "wb") as fh:
+                fh.write(data)
+            self.paths.append(path)
+            md5 = hashlib.md5(data).hexdigest() if i else "0" * 32
+            values.append((name, created, created, "Administrator", "Administrator", os.path.basename(url), url, 1,
+                           "Visit", visit, "check_in_photo", len(data), md5))
+            frappe.db.set_value("Visit", visit, "check_in_photo", url, update_modified=False)
+            photos[name] = (visit, url, data)
+        frappe.db.bulk_insert(
+            "File",
+            fields=["name", "creation", "modified", "owner", "modified_by", "file_name", "file_url", "is_private",
+                    "attached_to_doctype", "attached_to_name", "attached_to_field", "file_size", "content_hash"],
+            values=values,
+        )
+        return photos
+
+    def test_tier_round_trip(self):
+        user = frappe.session.user
+        photos = self.make_photos(make_visits([(user, user)] * (self.PHOTOS + 1), status="Completed"))
+        corrupt = next(iter(photos))
+
+        # tiering commits per batch; keep the run inside the test transaction
+        with patch.object(frappe.db, "commit"):
+            result = tier_visit_photos(days=1, workers=4, batch_size=5, store=self.store, files=list(photos))
+
+        self.assertEqual(result["moved"], self.PHOTOS)
+        self.assertEqual(result["failed"], 1)
+        for name, (visit, url, data) in photos.items():
+            with self.subTest(file=name):
+                file_url = frappe.db.get_value("File", name, "file_url")
+                if name == corrupt:
+                    self.assertEqual(file_url, url)
+                    self.assertTrue(os.path.exists(_local_path(url)))
+                    continue
+                self.assertEqual(file_url, stub_url(name))
+                self.assertEqual(frappe.db.get_value("Visit", visit, "check_in_photo"), file_url)
+                self.assertFalse(os.path.exists(_local_path(url)))
+                key = frappe.db.get_value(OBJECT_DOCTYPE, name, "object_key")
+                self.assertEqual(b"".join(self.store.iter_chunks(key)), data)
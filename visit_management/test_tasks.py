@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+import frappe
+from frappe.utils import add_to_date, now_datetime
+
+from visit_management import tasks
+from visit_management.tests.utils import BUDGET_SIZES, QueryBudgetTestCase, make_visits
+
+
+class TestTaskQueryBudgets(QueryBudgetTestCase):
+    def tearDown(self):
+        frappe.db.rollback()
+
+    def test_send_visit_reminders(self):
+        # one scan; each due Visit queues one email
+        user = frappe.session.user
+        due = add_to_date(now_datetime(), hours=1)
+        for n in BUDGET_SIZES:
+            with self.subTest(n=n):
+                frappe.db.savepoint("vm_budget_data")
+                make_visits([(user, user)] * n, scheduled_time=due)
+                self.assertQueryBudget(tasks.send_visit_reminders, 2 + 10 * n, 2 + 40 * n)
+                frappe.db.rollback(save_point="vm_budget_data")
+
+    def test_cleanup_old_drafts(self):
+        # nothing is a century old: one scan, no deletes
+        make_visits([(frappe.session.user, frappe.session.user)] * max(BUDGET_SIZES))
+        self.assertQueryBudget(lambda: tasks.cleanup_old_drafts(days=36500), 2)
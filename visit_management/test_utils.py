@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from visit_management import utils
+from visit_management.tests.utils import (
+    BUDGET_SIZES,
+    QueryBudgetTestCase,
+    make_customers,
+    make_visits,
+    skip_without_client_fields,
+)
+from visit_management.visit_management.report.visit_frequency_due.visit_frequency_due import execute
+
+
+def _broken_upsert(spec):
+    frappe.throw("cannot apply")
+
+
+class TestWorkspaceSetup(FrappeTestCase):
+    def tearDown(self):
+        frappe.db.rollback()
+
+    def test_failed_artifact_keeps_previous_fingerprint(self):
+        artifacts = [
+            ("good", {"value": 1}, lambda spec: None),
+            ("broken", {"value": 2}, _broken_upsert),
+        ]
+        frappe.db.set_global(utils.SETUP_FINGERPRINTS_KEY, "{}")
+        with patch.object(utils, "_setup_artifacts", return_value=artifacts):
+            result = utils.setup_visit_workspace_and_metrics()
+            self.assertEqual(result["applied"], ["good"])
+            self.assertEqual(result["failed"], ["broken"])
+            stored = utils._stored_setup_fingerprints()
+            self.assertIn("good", stored)
+            self.assertNotIn("broken", stored)
+
+            # the failed artifact is retried on the next run, the applied one is skipped
+            result = utils.setup_visit_workspace_and_metrics()
+            self.assertEqual(result["unchanged"], ["good"])
+            self.assertEqual(result["failed"], ["broken"])
+
+
+class TestVisitAssignees(FrappeTestCase):
+    def tearDown(self):
+        frappe.db.rollback()
+        frappe.cache().delete_value(utils.VISIT_ASSIGNEES_KEY)
+
+    def test_lost_set_is_rebuilt_not_regrown(self):
+        user = frappe.session.user
+        make_visits([(user, user)])
+        frappe.cache().delete_value(utils.VISIT_ASSIGNEES_KEY)
+
+        # a save while the set is gone must not start a partial set
+        utils.track_visit_assignee(frappe._dict(assigned_to="vm-test-late@example.com"))
+        self.assertEqual(frappe.cache().smembers(utils.VISIT_ASSIGNEES_KEY), set())
+
+        self.assertIn(user, utils.get_visit_assignees())
+        self.assertIn("", utils._assignee_members())
+
+
+class TestUtilsQueryBudgets(QueryBudgetTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        skip_without_client_fields()
+
+    def tearDown(self):
+        frappe.db.rollback()
+
+    def assertBudgetAtEachSize(self, fn, reads: int):
+        """n clients requiring visits and n Visits, half of them Completed for one client."""
+        user = frappe.session.user
+        for n in BUDGET_SIZES:
+            with self.subTest(n=n):
+                frappe.db.savepoint("vm_budget_data")
+                customers = make_customers(n)
+                make_visits([(user, user)] * (n - n // 2))
+                make_visits([(user, user)] * (n // 2), status="Completed", client=customers[0])
+                self.assertQueryBudget(fn, reads)
+                frappe.db.rollback(save_point="vm_budget_data")
+
+    # one count / one count + one page over Visit Client Due, whatever the number of clients
+    def test_get_frequency_overdue_count(self):
+        self.assertBudgetAtEachSize(utils.get_frequency_overdue_count, 1)
+
+    def test_visit_frequency_due_report(self):
+        self.assertBudgetAtEachSize(lambda: execute({}), 2)
+
+    def test_get_visit_kpis(self):
+        self.assertBudgetAtEachSize(lambda: utils.get_visit_kpis(mode="team", period="year"), 8)
+
+    def test_get_visit_assignees(self):
+        self.assertBudgetAtEachSize(utils.get_visit_assignees, 2)
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import add_days, get_datetime, now_datetime
+
+from visit_management import visit_due
+from visit_management.due_dates import due_date
+from visit_management.tests.utils import make_customers, make_visits, skip_without_client_fields
+from visit_management.visit_due import DUE_DOCTYPE, MAX_PAGE_LENGTH, _due_name, refresh_clients
+from visit_management.visit_management.report.visit_frequency_due.visit_frequency_due import execute
+
+
+class TestVisitClientDue(FrappeTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        skip_without_client_fields()
+
+    def setUp(self):
+        user = frappe.session.user
+        self.customer = make_customers(1)[0]
+        frappe.db.set_value("Customer", self.customer, "visit_frequency", "Weekly", update_modified=False)
+        self.visit = make_visits([(user, user)], client=self.customer)[0]
+
+    def tearDown(self):
+        frappe.db.rollback()
+
+    def due_row(self, customer: str):
+        return frappe.db.get_value(DUE_DOCTYPE, _due_name("Customer", customer), ["last_visit", "due_date"])
+
+    def complete_visit(self):
+        """Complete the Visit a day ago and refresh its client, as the Visit hook's job would."""
+        checked_out = add_days(now_datetime(), -1).replace(microsecond=0)
+        frappe.db.set_value("Visit", self.visit, {"status": "Completed", "check_out_time": checked_out})
+        refresh_clients("Customer", [self.customer])
+        return checked_out
+
+    def run_hook_jobs(self, enqueue):
+        """Run the refresh jobs the hooks enqueued, as the worker would after commit."""
+        for client_type, client in {c.args for c in enqueue.call_args_list}:
+            refresh_clients(client_type, [client])
+
+    def test_completed_visit_sets_last_visit_and_due_date(self):
+        refresh_clients("Customer", [self.customer])
+        self.assertEqual(self.due_row(self.customer), (None, None))
+
+        checked_out = self.complete_visit()
+        last_visit, due = self.due_row(self.customer)
+        self.assertEqual(get_datetime(last_visit), checked_out)
+        self.assertEqual(due, due_date(checked_out, "Weekly"))
+
+    def test_rename_moves_the_row(self):
+        checked_out = self.complete_visit()
+        new = f"{self.customer}-renamed"
+        with patch.object(visit_due, "enqueue_client_refresh") as enqueue:
+            frappe.rename_doc("Customer", self.customer, new, force=True)
+        self.run_hook_jobs(enqueue)
+
+        self.assertIsNone(self.due_row(self.customer))
+        self.assertEqual(get_datetime(self.due_row(new)[0]), checked_out)
+
+    def test_trash_paths(self):
+        self.complete_visit()
+
+        # deleting the only completed Visit leaves the client never visited
+        with patch.object(visit_due, "enqueue_client_refresh") as enqueue:
+            frappe.delete_doc("Visit", self.visit, force=True, ignore_permissions=True)
+        self.run_hook_jobs(enqueue)
+        self.assertEqual(self.due_row(self.customer), (None, None))
+
+        # deleting the client drops its row
+        with patch.object(visit_due, "enqueue_client_refresh") as enqueue:
+            frappe.delete_doc("Customer", self.customer, force=True, ignore_permissions=True)
+        self.run_hook_jobs(enqueue)
+        self.assertIsNone(self.due_row(self.customer))
+
+    def test_report_page_length_is_clamped(self):
+        refresh_clients("Customer", [self.customer])
+        _cols, rows, message = execute({"page_length": MAX_PAGE_LENGTH * 10, "page": 2})
+        self.assertLessEqual(len(rows), MAX_PAGE_LENGTH)
+        if rows:
+            self.assertIn(f"Clients {MAX_PAGE_LENGTH + 1}–", message)
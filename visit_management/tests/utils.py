@@ -0,0 +1,145 @@
+"""Helpers shared by the Visit Management test cases: query budgets and bulk-inserted fixtures."""
+
+from __future__ import annotations
+
+import random
+import unittest
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import now_datetime
+
+# Input sizes every query budget is checked at; a budget that holds at both does not grow with n
+BUDGET_SIZES = (10, 200)
+
+
+class QueryRecorder:
+    """Record every frappe.db.sql statement issued inside the block.
+
+        with QueryRecorder() as rec:
+            get_frequency_overdue_count()
+        rec.count, rec.reads, rec.writes, rec.queries
+    """
+
+    WRITE_PREFIXES = ("insert", "update", "delete", "replace")
+
+    def __init__(self):
+        self.queries: list[str] = []
+
+    def __enter__(self):
+        db = self._db = frappe.db
+        # another wrapper (e.g. the profiling query counter) may already sit on the instance
+        self._previous = db.__dict__.get("sql")
+        original = db.sql
+
+        def recording_sql(query, *args, **kwargs):
+            self.queries.append(str(query).strip())
+            return original(query, *args, **kwargs)
+
+        db.sql = recording_sql
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._previous is None:
+            del self._db.sql
+        else:
+            self._db.sql = self._previous
+        return False
+
+    @property
+    def count(self) -> int:
+        return len(self.queries)
+
+    @property
+    def writes(self) -> int:
+        return sum(1 for q in self.queries if q.lower().startswith(self.WRITE_PREFIXES))
+
+    @property
+    def reads(self) -> int:
+        return self.count - self.writes
+
+
+class QueryBudgetTestCase(FrappeTestCase):
+    def assertQueryBudget(self, fn, reads: int, total: int | None = None) -> QueryRecorder:
+        """Run `fn` once to warm metadata caches, then again under QueryRecorder, and fail when it
+        issues more than `reads` reads or `total` (default: `reads`) statements. Both runs are rolled back.
+        """
+        total = reads if total is None else total
+        frappe.db.savepoint("vm_budget")
+        fn()
+        frappe.db.rollback(save_point="vm_budget")
+        with QueryRecorder() as rec:
+            fn()
+        frappe.db.rollback(save_point="vm_budget")
+        sample = "\n    ".join(q[:160] for q in rec.queries[:15])
+        self.assertLessEqual(rec.reads, reads, f"reads over budget:\n    {sample}")
+        self.assertLessEqual(rec.count, total, f"statements over budget:\n    {sample}")
+        return rec
+
+
+def make_visits(
+    rows: list[tuple[str, str]],
+    status: str = "Planned",
+    scheduled_time=None,
+    client_type: str = "Customer",
+    client: str = "vm-test-client",
+) -> list[str]:
+    """bulk_insert one Visit per (owner, assigned_to); returns their names in order."""
+    now = now_datetime()
+    names = [f"VM-TEST-{frappe.generate_hash(length=8)}-{i}" for i in range(len(rows))]
+    frappe.db.bulk_insert(
+        "Visit",
+        fields=["name", "creation", "modified", "owner", "modified_by", "status", "scheduled_time",
+                "assigned_to", "client_type", "client"],
+        values=[
+            (name, now, now, owner, owner, status, scheduled_time or now, assigned_to, client_type, client)
+            for name, (owner, assigned_to) in zip(names, rows)
+        ],
+    )
+    return names
+
+
+def make_customers(count: int, seed: int = 41) -> list[str]:
+    """bulk_insert `count` Customers that require regular visits, with a random visit_frequency."""
+    rnd = random.Random(seed)
+    now = now_datetime()
+    names = [f"VM-TEST-CUST-{frappe.generate_hash(length=6)}-{i}" for i in range(count)]
+    frappe.db.bulk_insert(
+        "Customer",
+        fields=["name", "creation", "modified", "owner", "modified_by", "customer_name", "customer_type",
+                "requires_regular_visits", "visit_frequency"],
+        values=[(n, now, now, "Administrator", "Administrator", n, "Company", 1,
+                 rnd.choice(["Weekly", "Monthly", "Quarterly"])) for n in names],
+    )
+    return names
+
+
+def make_bulk_schedule(rows: int, clients: list[str]) -> str:
+    """bulk_insert a Draft Weekly Schedule with `rows` unapproved Monday rows (no validation)."""
+    now = now_datetime()
+    parent = f"VM-TEST-WS-{frappe.generate_hash(length=8)}"
+    frappe.db.bulk_insert(
+        "Weekly Schedule",
+        fields=["name", "creation", "modified", "owner", "modified_by", "user", "week_start", "status"],
+        values=[(parent, now, now, "Administrator", "Administrator", "Administrator", now.date(), "Draft")],
+    )
+    frappe.db.bulk_insert(
+        "Weekly Schedule Detail",
+        fields=["name", "creation", "modified", "owner", "modified_by", "parent", "parenttype", "parentfield",
+                "idx", "day", "time", "client_type", "client", "purpose", "approved"],
+        values=[
+            (f"{parent}-{i}", now, now, "Administrator", "Administrator", parent, "Weekly Schedule", "details",
+             i + 1, "Monday", "09:00:00", "Customer", clients[i % len(clients)], "Sales Call", 0)
+            for i in range(rows)
+        ],
+    )
+    return parent
+
+
+def skip_without_client_fields():
+    """Skip the test class when Customer lacks the visit-frequency custom fields (ERPNext missing or
+    setup not run)."""
+    if not frappe.db.exists("DocType", "Customer") or not frappe.get_meta("Customer").has_field(
+        "requires_regular_visits"
+    ):
+        raise unittest.SkipTest("needs Customer with the visit-frequency custom fields")
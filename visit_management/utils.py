@@ -3,6 +3,9 @@ from __future__ import annotations
 import frappe
 from frappe import whitelist
 from frappe.modules.import_file import import_file_by_path
+
+from visit_management.due_dates import FREQUENCY_DAYS, FREQUENCY_MONTHS, due_date
+from visit_management.profiling import profiled
 from frappe.utils import (
     now_datetime,
     getdate,
@@ -22,7 +25,7 @@ def debug_doctypes_presence():
     names = [
         "Visit",
         "Weekly Schedule",
-        "Visit Log",
+        "Visit Activity",
         "Visit Photo",
         "Weekly Schedule Detail",
     ]
@@ -39,7 +42,7 @@ def sync_all_visit_doctypes(force: int = 1):
     doctypes = [
         ("visit", "visit.json"),
         ("weekly_schedule", "weekly_schedule.json"),
-        ("visit_log", "visit_log.json"),
+        ("visit_activity", "visit_activity.json"),
         ("visit_photo", "visit_photo.json"),
         ("weekly_schedule_detail", "weekly_schedule_detail.json"),
     ]
@@ -70,7 +73,7 @@ def check_imports():
         "visit_management",
         "visit_management.visit_management",
         "visit_management.visit_management.doctype",
-        "visit_management.visit_management.doctype.visit_log",
+        "visit_management.visit_management.doctype.visit_activity",
         "visit_management.visit_management.doctype.visit_photo",
         "visit_management.visit_management.doctype.weekly_schedule_detail",
         "visit_management.visit_management.doctype.weekly_schedule",
@@ -103,7 +106,7 @@ def check_imports():
         inits = {}
         for name in [
             "visit",
-            "visit_log",
+            "visit_activity",
             "visit_photo",
             # "visit_report",
             "weekly_schedule",
@@ -117,10 +120,15 @@ def check_imports():
     return out
 
 
-@whitelist()
-def setup_visit_workspace_and_metrics():
-    """Create Workspace, Number Cards, Dashboard, and Chart for Visits if missing."""
-    # Number Cards
+SETUP_FINGERPRINTS_KEY = "visit_management_setup_fingerprints"
+
+
+# Number Card (type Custom) method answering Visit counts from the Visit Daily Stat rollup
+STAT_COUNT_METHOD = "visit_management.visit_stats.get_visit_stat_count"
+
+
+def _number_card_specs() -> list[dict]:
+    """Desired state of the four Visit status Number Cards (counted from the daily rollup)."""
     cards = [
         {
             "name": "Planned Visits",
@@ -159,402 +167,178 @@ def setup_visit_workspace_and_metrics():
     ]
 
     for c in cards:
+        c.update({
+            "document_type": "Visit",
+            # the widget passes filters_json + evaluated dynamic filters to the method
+            "type": "Custom",
+            "method": STAT_COUNT_METHOD,
+            "show_percentage_stats": 0,
+        })
+        c["dynamic_filters_json"] = frappe.as_json(
+            overdue_dynamic_filters if c["name"] == "Overdue Visits" else common_dynamic_filters
+        )
+    return cards
+
+
+def _update_artifact(doc, values: dict):
+    """Apply `values` to an existing card or chart that a site created (is_standard = 0).
+
+    Standard ones are left alone: they are synced from the app's number_card / dashboard_chart JSON,
+    which already carries the same definition.
+    """
+    if frappe.utils.cint(doc.get("is_standard")):
+        return
+    doc.update(values)
+    doc.save(ignore_permissions=True)
+
+
+def _upsert_number_cards(cards: list[dict]):
+    for c in cards:
+        values = {k: v for k, v in c.items() if k != "name"}
         if not frappe.db.exists("Number Card", c["name"]):
             doc = frappe.get_doc({
                 "doctype": "Number Card",
                 "name": c["name"],
-                "label": c["label"],
                 "module": "Visit Management",
-                "document_type": "Visit",
-                "type": "Document Type",
-                "function": "Count",
-                "filters_json": c["filters_json"],
-                "dynamic_filters_json": frappe.as_json(
-                    overdue_dynamic_filters if c["name"] == "Overdue Visits" else common_dynamic_filters
-                ),
                 "is_standard": 1,
                 "is_public": 1,
-                "show_percentage_stats": 1,
-                "stats_time_interval": "Daily",
+                **values,
             })
             doc.insert(ignore_permissions=True)
         else:
-            # If a standard doc already exists, don't edit it to avoid validation errors.
-            try:
-                doc = frappe.get_doc("Number Card", c["name"])
-                if int(doc.get("is_standard") or 0) != 1:
-                    doc.update({
-                        "label": c["label"],
-                        "module": "Visit Management",
-                        "document_type": "Visit",
-                        "type": "Document Type",
-                        "function": "Count",
-                        "filters_json": c["filters_json"],
-                        "dynamic_filters_json": frappe.as_json(
-                            overdue_dynamic_filters if c["name"] == "Overdue Visits" else common_dynamic_filters
-                        ),
-                        "show_percentage_stats": 1,
-                        "stats_time_interval": "Daily",
-                    })
-                    doc.save(ignore_permissions=True)
-            except Exception:
-                # best-effort; skip on validation issues
-                pass
-
-    # Dashboard Chart: Visits Created
-    chart_name = "Visits Created"
+            _update_artifact(frappe.get_doc("Number Card", c["name"]), dict(values, module="Visit Management"))
+
+
+def _chart_spec() -> dict:
+    """Desired state of the "Visits Created" Dashboard Chart, read from the Visit Daily Stats source."""
+    return {
+        "chart_name": "Visits Created",
+        "chart_type": "Custom",
+        "source": "Visit Daily Stats",
+        # cleared on charts created before the rollup, which counted tabVisit directly
+        "document_type": None,
+        "based_on": None,
+        "type": "Bar",
+        "timeseries": 1,
+        "timespan": "Last Month",
+        "time_interval": "Daily",
+        "filters_json": frappe.as_json({"measure": "Created"}),
+        "dynamic_filters_json": frappe.as_json({"assigned_to": "frappe.session.user"}),
+        # important: ensure values are treated as plain numbers, not currency
+        "currency": "",
+    }
+
+
+def _upsert_chart(spec: dict):
+    chart_name = spec["chart_name"]
     if not frappe.db.exists("Dashboard Chart", chart_name):
-        chart = frappe.get_doc({
-            "doctype": "Dashboard Chart",
-            "chart_name": chart_name,
-            "module": "Visit Management",
-            "document_type": "Visit",
-            "based_on": "creation",
-            "chart_type": "Count",
-            "type": "Bar",
-            "timeseries": 1,
-            "timespan": "Last Month",
-            "time_interval": "Daily",
-            "is_standard": 1,
-            "is_public": 1,
-            "filters_json": "[]",
-            "dynamic_filters_json": frappe.as_json([["Visit", "assigned_to", "=", "frappe.session.user"]]),
-            # important: ensure values are treated as plain numbers, not currency
-            "currency": "",
-        })
+        chart = frappe.get_doc(dict(spec, doctype="Dashboard Chart", module="Visit Management", is_standard=1, is_public=1))
         chart.insert(ignore_permissions=True)
     else:
-        # Avoid editing standard charts; only update if not marked standard
-        try:
-            chart = frappe.get_doc("Dashboard Chart", chart_name)
-            if int(chart.get("is_standard") or 0) != 1:
-                chart.update({
-                    "document_type": "Visit",
-                    "based_on": "creation",
-                    "chart_type": "Count",
-                    "type": "Bar",
-                    "timeseries": 1,
-                    "timespan": "Last Month",
-                    "time_interval": "Daily",
-                    "filters_json": "[]",
-                    "dynamic_filters_json": frappe.as_json([["Visit", "assigned_to", "=", "frappe.session.user"]]),
-                    # remove any accidental currency so tooltip shows numbers
-                    "currency": "",
-                })
-                chart.save(ignore_permissions=True)
-        except Exception:
-            pass
+        # also removes any accidental currency so tooltip shows numbers
+        _update_artifact(
+            frappe.get_doc("Dashboard Chart", chart_name), {k: v for k, v in spec.items() if k != "chart_name"}
+        )
 
-    # Dashboard
-    dash_name = "Visit Overview"
-    if not frappe.db.exists("Dashboard", dash_name):
-        dash = frappe.get_doc({
-            "doctype": "Dashboard",
-            "dashboard_name": dash_name,
-            "module": "Visit Management",
-            "is_standard": 1,
-            "cards": [
-                {"card": "Planned Visits"},
-                {"card": "In Progress Visits"},
-                {"card": "Completed Visits"},
-            ],
-            "charts": [
-                {"chart": "Visits Created", "width": "Full"},
-            ],
-        })
+
+def _dashboard_spec() -> dict:
+    """Desired state of the "Visit Overview" Dashboard (created once, never rewritten)."""
+    return {
+        "dashboard_name": "Visit Overview",
+        "cards": [
+            {"card": "Planned Visits"},
+            {"card": "In Progress Visits"},
+            {"card": "Completed Visits"},
+        ],
+        "charts": [
+            {"chart": "Visits Created", "width": "Full"},
+        ],
+    }
+
+
+def _upsert_dashboard(spec: dict):
+    if not frappe.db.exists("Dashboard", spec["dashboard_name"]):
+        dash = frappe.get_doc(dict(spec, doctype="Dashboard", module="Visit Management", is_standard=1))
         dash.insert(ignore_permissions=True)
 
-    # Ensure client custom fields and frequency-overdue number card exist early
-    try:
-        _upsert_custom_fields_for_clients()
-        _upsert_frequency_overdue_number_card()
-    except Exception:
-        pass
 
-    # Workspace
-    ws_name = "Visits"
-    # Remove the older number-card widgets in the workspace content; keep panel + chart + a single frequency-overdue card + shortcuts
-    workspace_content = (
-        "[{\"id\":\"hdr1\",\"type\":\"header\",\"data\":{\"text\":\"<span class=\\\"h5\\\"><b>VISITS</b></span>\",\"col\":12}},{\"id\":\"sp1\",\"type\":\"spacer\",\"data\":{\"col\":12}},{\"id\":\"cb1\",\"type\":\"custom_block\",\"data\":{\"custom_block_name\":\"Visits KPI Panel\",\"col\":12}},{\"id\":\"sp1a\",\"type\":\"spacer\",\"data\":{\"col\":12}},{\"id\":\"ch1\",\"type\":\"chart\",\"data\":{\"chart_name\":\"Visits Created\",\"col\":12}},{\"id\":\"sp1b\",\"type\":\"spacer\",\"data\":{\"col\":12}},{\"id\":\"ncF\",\"type\":\"number_card\",\"data\":{\"number_card_name\":\"Overdue Routine Visits\",\"col\":3}},{\"id\":\"sp2\",\"type\":\"spacer\",\"data\":{\"col\":12}},{\"id\":\"p1\",\"type\":\"paragraph\",\"data\":{\"text\":\"<b>SHORTCUTS</b>\",\"col\":12}},{\"id\":\"sh1\",\"type\":\"shortcut\",\"data\":{\"shortcut_name\":\"Visit\",\"col\":3}},{\"id\":\"sh3\",\"type\":\"shortcut\",\"data\":{\"shortcut_name\":\"Weekly Schedule\",\"col\":3}},{\"id\":\"sh4\",\"type\":\"shortcut\",\"data\":{\"shortcut_name\":\"Visit Overview\",\"col\":3}}]"
-    )
-    workspace_shortcuts = [
-        {"type": "DocType", "label": "Visit", "link_to": "Visit", "doc_view": "List", "color": "Grey", "stats_filter": "[]"},
-        {"type": "DocType", "label": "Weekly Schedule", "link_to": "Weekly Schedule", "doc_view": "List", "color": "Grey", "stats_filter": "[]"},
-        {"type": "Dashboard", "label": "Visit Overview", "link_to": "Visit Overview", "color": "Grey"},
-    ]
-    # Replace older number cards with a single frequency-overdue card (created above)
-    workspace_cards = [{"label": "Overdue Routine Visits", "number_card_name": "Overdue Routine Visits"}]
-    # Ensure Custom HTML Block exists for dynamic KPIs
-    chb_name = "Visits KPI Panel"
-    try:
-        # Prefer importing from bundled JSON; if that fails, upsert programmatically
-        import os, json
-        from frappe import get_app_path
-        chb_path = os.path.join(
-            get_app_path("visit_management"),
-            "visit_management",
-            "custom_html_block",
-            "visits_kpi_panel",
-            "visits_kpi_panel.json",
-        )
-        html = script = style = None
-        if os.path.exists(chb_path):
-            try:
-                with open(chb_path, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                    html = data.get("html")
-                    script = data.get("script")
-                    style = data.get("style")
-            except Exception:
-                # fallback to import_file_by_path if json.load fails
-                import_file_by_path(chb_path, force=True)
-        # If JSON parsing failed or fields missing, fall back to embedded defaults
-        if not (html and script is not None and style is not None):
-            html = html or (
-                """
-<div class="vm-kpi-panel">
-    <div class="vm-kpi-toolbar">
-        <div class="left d-flex align-items-center">
-            <div class="btn-group btn-group-sm mr-2">
-                <button type="button" class="btn btn-default vm-mode-btn active" data-mode="my">My</button>
-                <button type="button" class="btn btn-default vm-mode-btn" data-mode="team">Team</button>
-            </div>
-            <div class="vm-agent d-none">
-                <label class="mr-2 text-muted">Agent</label>
-                <select class="form-control input-sm vm-agent-select"><option value="">All</option></select>
-            </div>
-        </div>
-        <div class="right d-flex align-items-center">
-            <div class="vm-period mr-2">
-                <label class="mr-2 text-muted">Period</label>
-                <select class="form-control input-sm vm-period-select">
-                    <option value="today">Today</option>
-                    <option value="week">This Week</option>
-                    <option value="month" selected> This Month</option>
-                    <option value="quarter">This Quarter</option>
-                    <option value="year">This Year</option>
-                </select>
-            </div>
-            <div class="form-check form-check-inline">
-                <input class="form-check-input vm-overdue-scope" type="checkbox" id="vmOverdueScope">
-                <label class="form-check-label" for="vmOverdueScope">Overdue within period</label>
-            </div>
-            <span class="vm-role-hint badge badge-warning ml-2 d-none">Limited to My</span>
-        </div>
-    </div>
-    <div class="vm-kpis row">
-        <div class="col-md-3 col-sm-6 vm-kpi">
-            <div class="kpi-card planned">
-                <div class="kpi-label">Planned</div>
-                <div class="kpi-value" data-key="planned">–</div>
-            </div>
-        </div>
-        <div class="col-md-3 col-sm-6 vm-kpi">
-            <div class="kpi-card in-progress">
-                <div class="kpi-label">In Progress</div>
-                <div class="kpi-value" data-key="in_progress">–</div>
-            </div>
-        </div>
-        <div class="col-md-3 col-sm-6 vm-kpi">
-            <div class="kpi-card completed">
-                <div class="kpi-label">Completed</div>
-                <div class="kpi-value" data-key="completed">–</div>
-            </div>
-        </div>
-        <div class="col-md-3 col-sm-6 vm-kpi">
-            <div class="kpi-card overdue">
-                <div class="kpi-label">Overdue</div>
-                <div class="kpi-value" data-key="overdue">–</div>
-            </div>
-        </div>
-    </div>
-</div>
-"""
-            ).strip()
-            script = script or (
-                """
-(function(){
-    var $ = window.jQuery;
-    var panel = root_element;
-    var state = { mode: 'my', period: 'month', user: '', overdue_within_period: false, is_manager: false };
-
-    function computeRange(period){
-        var now = frappe.datetime.now_datetime();
-        var start, end;
-        if (period === 'today'){
-            var d = frappe.datetime.get_today();
-            start = d + ' 00:00:00'; end = d + ' 23:59:59';
-        } else if (period === 'week'){
-            // approx: last 7 days
-            start = frappe.datetime.add_days(frappe.datetime.nowdate(), -6) + ' 00:00:00';
-            end = frappe.datetime.now_datetime();
-        } else if (period === 'month'){
-            start = frappe.datetime.month_start() + ' 00:00:00';
-            end = frappe.datetime.now_datetime();
-        } else if (period === 'quarter'){
-            // approx quarter start: 3 months ago month_start
-            var md = frappe.datetime.add_months(frappe.datetime.nowdate(), -2);
-            start = frappe.datetime.month_start(md) + ' 00:00:00';
-            end = frappe.datetime.now_datetime();
-        } else if (period === 'year'){
-            var y = (new Date()).getFullYear() + '-01-01';
-            start = y + ' 00:00:00'; end = frappe.datetime.now_datetime();
-        }
-        return {start:start, end:end};
-    }
+# Panel script and stylesheet under public/, served as /assets/visit_management/...
+KPI_PANEL_ASSETS = ("js/visits_kpi_panel.js", "css/visits_kpi_panel.css")
 
-    function updateChartFromPanel(){
-        var range = computeRange(state.period) || {};
-        var filters = [];
-        if (state.mode === 'my'){
-            filters.push(["Visit","assigned_to","=",frappe.session.user]);
-        } else if (state.user){
-            filters.push(["Visit","assigned_to","=",state.user]);
-        }
-        if (range.start and range.end){
-            filters.push(["Visit","scheduled_time",">=",range.start]);
-            filters.push(["Visit","scheduled_time","<=",range.end]);
-        }
-        // map period to chart timespan/time_interval when possible
-        var timespan = null, interval = null;
-        if (state.period === 'week') { timespan = 'Last Week'; interval = 'Daily'; }
-        else if (state.period === 'month') { timespan = 'Last Month'; interval = 'Daily'; }
-        else if (state.period === 'quarter') { timespan = 'Last Quarter'; interval = 'Weekly'; }
-        else if (state.period === 'year') { timespan = 'Last Year'; interval = 'Monthly'; }
-        // save to user's dashboard settings so workspace reload/refresh uses it
-        return frappe.xcall("frappe.desk.doctype.dashboard_settings.dashboard_settings.save_chart_config", {
-            reset: 0,
-            config: { filters: filters, timespan: timespan, time_interval: interval },
-            chart_name: 'Visits Created'
-        }).then(function(){
-            // trigger that chart's refresh action if present, else reload workspace
-            var $chart = $(document).find('.dashboard-widget-box .widget-head .widget-title').filter(function(){
-                return $(this).text().trim() === 'Visits Created';
-            }).closest('.dashboard-widget-box');
-            var $refresh = $chart.find('.dropdown-menu a[data-action="action-refresh"]').first();
-            if ($refresh.length){
-                $refresh.trigger('click');
-            } else if (frappe.workspace && frappe.workspace.reload) {
-                frappe.workspace.reload();
-            }
-        });
-    }
 
-    function setMode(mode, showHint) {
-        state.mode = mode;
-        $(panel).find('.vm-mode-btn').removeClass('active');
-        $(panel).find('.vm-mode-btn[data-mode="' + mode + '"]').addClass('active');
-        $(panel).find('.vm-role-hint').toggleClass('d-none', !showHint);
-        $(panel).find('.vm-agent').toggleClass('d-none', !(mode === 'team' && state.is_manager));
-    }
+def _asset_url(path: str) -> str:
+    """/assets URL of a file under public/, versioned by a hash of its content."""
+    import hashlib, os
+    from frappe import get_app_path
+    with open(os.path.join(get_app_path("visit_management"), "public", path), "rb") as f:
+        version = hashlib.sha1(f.read()).hexdigest()[:10]
+    return f"/assets/visit_management/{path}?v={version}"
 
-    function setPeriod(period) {
-        state.period = period;
-        $(panel).find('.vm-period-select').val(period);
-    }
 
-    function setUser(user){
-        state.user = user || '';
-    }
+def _kpi_panel_block_spec() -> dict:
+    """Stub html/script of the "Visits KPI Panel" block; the panel itself is public/js/visits_kpi_panel.js.
 
-    function renderValues(data){
-        var keys = ['planned','in_progress','completed','overdue'];
-        for (var i=0;i<keys.length;i++){
-            var k = keys[i];
-            // Avoid HTML-returning formatters; show plain, locale-safe numbers
-            var val = data[k] || 0;
-            $(panel).find('.kpi-value[data-key="' + k + '"]').text(String(val));
-        }
-        // role awareness
-        state.is_manager = !!data.is_manager;
-        if (data.effective_mode && data.effective_mode !== state.mode) {
-            setMode(data.effective_mode, true);
-        } else {
-            $(panel).find('.vm-role-hint').toggleClass('d-none', !!state.is_manager);
-        }
-        $(panel).find('.vm-agent').toggleClass('d-none', !(state.mode === 'team' && state.is_manager));
+    The stylesheet is linked inside the block (it renders in a shadow root) and the script is loaded once
+    per page by frappe.require. Both URLs carry a content hash, so editing an asset changes this spec and
+    the next migrate rewrites the stub.
+    """
+    js_url, css_url = (_asset_url(path) for path in KPI_PANEL_ASSETS)
+    return {
+        "name": "Visits KPI Panel",
+        "html": f'<link rel="stylesheet" href="{css_url}"><div class="vm-kpi-mount"></div>',
+        "script": f'frappe.require("{js_url}", () => visit_management.kpi_panel.mount(root_element));',
+        "style": "",
     }
 
-    function refresh(){
-        return frappe.call({
-            method: 'visit_management.utils.get_visit_kpis',
-            args: { mode: state.mode, period: state.period, user: state.user, overdue_within_period: state.overdue_within_period },
-        }).then(function(res){
-            renderValues((res && res.message) || {});
-            // also persist matching filters into user's chart settings and refresh chart
-            try { updateChartFromPanel(); } catch (e) { /* no-op */ }
-        });
-    }
 
-    function loadAgents(){
-        return frappe.call({
-            method: 'visit_management.utils.get_visit_assignees'
-        }).then(function(res){
-            var list = ((res && res.message) || []).filter(Boolean);
-            var $sel = $(panel).find('.vm-agent-select');
-            $sel.empty();
-            $sel.append('<option value="">All</option>');
-            list.forEach(function(u){ $sel.append('<option value="'+u+'">'+frappe.utils.escape_html(u)+'</option>'); });
-        });
+def _upsert_kpi_panel_block(spec: dict):
+    chb_name = spec["name"]
+    html, script, style = spec["html"], spec["script"], spec["style"]
+    if frappe.db.exists("Custom HTML Block", chb_name):
+        chb = frappe.get_doc("Custom HTML Block", chb_name)
+        if html is not None:
+            chb.html = html
+        if script is not None:
+            chb.script = script
+        if style is not None:
+            chb.style = style
+        chb.flags.ignore_permissions = True
+        chb.save()
+    else:
+        chb = frappe.get_doc({
+            "doctype": "Custom HTML Block",
+            "name": chb_name,
+            "html": html or "<div class=\"text-muted\">Visits KPI Panel</div>",
+            "script": script or "",
+            "style": style or "",
+        })
+        chb.insert(ignore_permissions=True)
+
+
+def _workspace_spec() -> dict:
+    """Desired state of the "Visits" Workspace: KPI panel, chart, frequency-overdue card and shortcuts."""
+    # Remove the older number-card widgets in the workspace content; keep panel + chart + a single frequency-overdue card + shortcuts
+    workspace_content = (
+        "[{\"id\":\"hdr1\",\"type\":\"header\",\"data\":{\"text\":\"<span class=\\\"h5\\\"><b>VISITS</b></span>\",\"col\":12}},{\"id\":\"sp1\",\"type\":\"spacer\",\"data\":{\"col\":12}},{\"id\":\"cb1\",\"type\":\"custom_block\",\"data\":{\"custom_block_name\":\"Visits KPI Panel\",\"col\":12}},{\"id\":\"sp1a\",\"type\":\"spacer\",\"data\":{\"col\":12}},{\"id\":\"ch1\",\"type\":\"chart\",\"data\":{\"chart_name\":\"Visits Created\",\"col\":12}},{\"id\":\"sp1b\",\"type\":\"spacer\",\"data\":{\"col\":12}},{\"id\":\"ncF\",\"type\":\"number_card\",\"data\":{\"number_card_name\":\"Overdue Routine Visits\",\"col\":3}},{\"id\":\"sp2\",\"type\":\"spacer\",\"data\":{\"col\":12}},{\"id\":\"p1\",\"type\":\"paragraph\",\"data\":{\"text\":\"<b>SHORTCUTS</b>\",\"col\":12}},{\"id\":\"sh1\",\"type\":\"shortcut\",\"data\":{\"shortcut_name\":\"Visit\",\"col\":3}},{\"id\":\"sh3\",\"type\":\"shortcut\",\"data\":{\"shortcut_name\":\"Weekly Schedule\",\"col\":3}},{\"id\":\"sh4\",\"type\":\"shortcut\",\"data\":{\"shortcut_name\":\"Visit Overview\",\"col\":3}}]"
+    )
+    return {
+        "name": "Visits",
+        "content": workspace_content,
+        "shortcuts": [
+            {"type": "DocType", "label": "Visit", "link_to": "Visit", "doc_view": "List", "color": "Grey", "stats_filter": "[]"},
+            {"type": "DocType", "label": "Weekly Schedule", "link_to": "Weekly Schedule", "doc_view": "List", "color": "Grey", "stats_filter": "[]"},
+            {"type": "Dashboard", "label": "Visit Overview", "link_to": "Visit Overview", "color": "Grey"},
+        ],
+        # Replace older number cards with a single frequency-overdue card
+        "number_cards": [{"label": "Overdue Routine Visits", "number_card_name": "Overdue Routine Visits"}],
+        "charts": [{"chart_name": "Visits Created", "label": "Visits Created"}],
+        "custom_blocks": [{"custom_block_name": "Visits KPI Panel", "label": "Visits KPI Panel"}],
     }
 
-    // events
-    $(panel).find('.vm-mode-btn').on('click', function(){
-        var mode = $(this).data('mode');
-        setMode(mode, false);
-        refresh();
-    });
-    $(panel).find('.vm-period-select').on('change', function(){
-        var period = $(this).val();
-        setPeriod(period);
-        refresh();
-    });
-    $(panel).find('.vm-agent-select').on('change', function(){
-        setUser($(this).val());
-        refresh();
-    });
-    $(panel).find('.vm-overdue-scope').on('change', function(){
-        state.overdue_within_period = $(this).is(':checked');
-        refresh();
-    });
-
-    // init
-    setMode('my', false);
-    setPeriod('month');
-    loadAgents().then(refresh);
-})();
-"""
-            ).strip()
-            style = style or (
-                """
-.vm-kpi-panel{padding:8px 0} .vm-kpi-toolbar{display:flex;justify-content:space-between;align-items:center;margin-bottom:8px} .vm-kpi .kpi-card{background:#fff;border:1px solid var(--border-color, #d1d8dd);border-radius:6px;padding:12px;box-shadow:0 1px 2px rgba(0,0,0,0.03)} .kpi-label{font-size:12px;color:#6c757d;text-transform:uppercase;letter-spacing:.04em} .kpi-value{font-size:24px;font-weight:700;margin-top:4px} .kpi-card.planned{border-left:4px solid #6c757d} .kpi-card.in-progress{border-left:4px solid #17a2b8} .kpi-card.completed{border-left:4px solid #28a745} .kpi-card.overdue{border-left:4px solid #dc3545}
-"""
-            ).strip()
-
-        # Upsert doc to ensure fields are present
-        if frappe.db.exists("Custom HTML Block", chb_name):
-            chb = frappe.get_doc("Custom HTML Block", chb_name)
-            if html is not None:
-                chb.html = html
-            if script is not None:
-                chb.script = script
-            if style is not None:
-                chb.style = style
-            chb.flags.ignore_permissions = True
-            chb.save()
-        else:
-            chb = frappe.get_doc({
-                "doctype": "Custom HTML Block",
-                "name": chb_name,
-                "html": html or "<div class=\"text-muted\">Visits KPI Panel</div>",
-                "script": script or "",
-                "style": style or "",
-            })
-            chb.insert(ignore_permissions=True)
-    except Exception:
-        # non-fatal
-        pass
 
+def _upsert_workspace(spec: dict):
+    ws_name = spec["name"]
+    children = {k: spec[k] for k in ("shortcuts", "number_cards", "charts", "custom_blocks")}
     if not frappe.db.exists("Workspace", ws_name):
         ws = frappe.get_doc({
             "doctype": "Workspace",
@@ -565,206 +349,273 @@ def setup_visit_workspace_and_metrics():
             "public": 1,
             "is_standard": 1,
             "icon": "map-pin",
-            "content": workspace_content,
-            "shortcuts": workspace_shortcuts,
-            "number_cards": workspace_cards,
-            "charts": [{"chart_name": chart_name, "label": chart_name}],
-            "custom_blocks": [{"custom_block_name": chb_name, "label": chb_name}],
+            "content": spec["content"],
+            **children,
         })
         ws.insert(ignore_permissions=True)
     else:
         # Avoid editing standard workspace on migrate; only update if non-standard
-        try:
-            ws = frappe.get_doc("Workspace", ws_name)
-            if int(ws.get("is_standard") or 0) != 1:
-                ws.update({
-                    "label": ws_name,
-                    "title": ws_name,
-                    "module": "Visit Management",
-                    "public": 1,
-                    "icon": "map-pin",
-                    "content": workspace_content,
-                })
-                # Update child tables
-                ws.set("shortcuts", workspace_shortcuts)
-                ws.set("number_cards", workspace_cards)
-                ws.set("charts", [{"chart_name": chart_name, "label": chart_name}])
-                ws.set("custom_blocks", [{"custom_block_name": chb_name, "label": chb_name}])
-                ws.save(ignore_permissions=True)
-        except Exception:
-            pass
+        ws = frappe.get_doc("Workspace", ws_name)
+        if int(ws.get("is_standard") or 0) != 1:
+            ws.update({
+                "label": ws_name,
+                "title": ws_name,
+                "module": "Visit Management",
+                "public": 1,
+                "icon": "map-pin",
+                "content": spec["content"],
+            })
+            # Update child tables
+            for fieldname, rows in children.items():
+                ws.set(fieldname, rows)
+            ws.save(ignore_permissions=True)
+
+
+def _setup_artifacts() -> list[tuple]:
+    """(key, desired spec, upsert) in apply order; the workspace links to everything before it."""
+    return [
+        ("number_cards", _number_card_specs(), _upsert_number_cards),
+        ("chart", _chart_spec(), _upsert_chart),
+        ("dashboard", _dashboard_spec(), _upsert_dashboard),
+        ("client_fields", CLIENT_VISIT_FIELDS, _upsert_custom_fields_for_clients),
+        ("frequency_card", FREQUENCY_OVERDUE_CARD, _upsert_frequency_overdue_number_card),
+        ("kpi_panel_block", _kpi_panel_block_spec(), _upsert_kpi_panel_block),
+        ("workspace", _workspace_spec(), _upsert_workspace),
+    ]
 
-    frappe.clear_cache()
-    # Upsert client custom fields and the frequency-overdue number card after workspace/chart setup
+
+def _fingerprint(value) -> str:
+    import hashlib
+
+    return hashlib.sha1(frappe.as_json(value, indent=None).encode()).hexdigest()
+
+
+def _spec_fingerprints(spec) -> dict:
+    """{"": whole spec, part: part} fingerprints; parts are top-level keys or named list entries,
+    so a dry run can say which part of an artifact changed."""
+    if isinstance(spec, dict):
+        parts = {str(k): _fingerprint(v) for k, v in spec.items()}
+    elif isinstance(spec, list) and all(isinstance(v, dict) and "name" in v for v in spec):
+        parts = {v["name"]: _fingerprint(v) for v in spec}
+    else:
+        parts = {}
+    parts[""] = _fingerprint(spec)
+    return parts
+
+
+def _stored_setup_fingerprints() -> dict:
     try:
-        _upsert_custom_fields_for_clients()
-        _upsert_frequency_overdue_number_card()
+        return frappe.parse_json(frappe.db.get_global(SETUP_FINGERPRINTS_KEY) or "{}") or {}
     except Exception:
-        pass
+        return {}
+
+
+@whitelist()
+def setup_visit_workspace_and_metrics(dry_run: int = 0, force: int = 0):
+    """Create or update the Visits workspace, number cards, chart, dashboard, client fields and KPI panel.
+
+    Each artifact's desired state is fingerprinted and the fingerprints of the last successful run are
+    stored; artifacts whose fingerprint is unchanged are skipped, so a migrate with nothing to do costs
+    a single query. `force` upserts every artifact (e.g. after one was deleted by hand); `dry_run`
+    writes nothing and returns the artifacts, and the parts of them, that would be upserted.
+    """
+    dry_run, force = frappe.utils.cint(dry_run), frappe.utils.cint(force)
+    stored = _stored_setup_fingerprints()
+    desired, diff, applied, failed = {}, {}, [], []
+    for key, spec, upsert in _setup_artifacts():
+        desired[key] = _spec_fingerprints(spec)
+        previous = stored.get(key) or {}
+        if not force and previous.get("") == desired[key][""]:
+            continue
+        diff[key] = {
+            "status": "new" if not previous else "changed",
+            "parts": sorted(
+                p for p in set(desired[key]) | set(previous) if p and previous.get(p) != desired[key].get(p)
+            ),
+        }
+        if dry_run:
+            continue
+        # upserts raise on failure, so a broken artifact is reported and retried instead of recorded
+        try:
+            upsert(spec)
+            applied.append(key)
+        except Exception:
+            failed.append(key)
+            frappe.log_error(title="Visit Workspace Setup Failed", message=f"Artifact: {key}\n{frappe.get_traceback()}")
+
+    if applied and not dry_run:
+        # keep the previous fingerprint of failed artifacts so the next migrate retries them
+        fingerprints = {k: desired[k] if k not in failed else stored.get(k) for k in desired}
+        frappe.db.set_global(SETUP_FINGERPRINTS_KEY, frappe.as_json({k: v for k, v in fingerprints.items() if v}, indent=None))
+        frappe.clear_cache()
     return {
-        "workspace": ws_name,
-        "dashboard": dash_name,
-        "chart": chart_name,
-        "cards": [c["name"] for c in cards],
+        "dry_run": bool(dry_run),
+        "diff": diff,
+        "applied": applied,
+        "failed": failed,
+        "unchanged": [k for k in desired if k not in diff],
     }
 
 
-def _upsert_frequency_overdue_number_card():
+# Desired state of the custom Number Card backed by get_frequency_overdue_count
+FREQUENCY_OVERDUE_CARD = {
+    "name": "Overdue Routine Visits",
+    "label": "Overdue Routine Visits",
+    "type": "Custom",
+    "method": "visit_management.utils.get_frequency_overdue_count",
+    "show_percentage_stats": 0,
+    "filters_json": "[]",
+    "dynamic_filters_json": "[]",
+    "currency": "",
+}
+
+
+def _upsert_frequency_overdue_number_card(spec: dict | None = None):
     """Create/Update a custom number card that shows overdue routine visits for clients.
 
     Also migrates from the previous name 'Visit Frequency Overdue'.
     """
-    new_name = "Overdue Routine Visits"
+    spec = spec or FREQUENCY_OVERDUE_CARD
+    new_name = spec["name"]
     old_name = "Visit Frequency Overdue"
     # migrate/rename if old exists and new missing
     if frappe.db.exists("Number Card", old_name) and not frappe.db.exists("Number Card", new_name):
-        try:
-            frappe.rename_doc("Number Card", old_name, new_name, force=True)
-        except Exception:
-            pass
+        frappe.rename_doc("Number Card", old_name, new_name, force=True)
 
     name = new_name
     if frappe.db.exists("Number Card", name):
-        try:
-            doc = frappe.get_doc("Number Card", name)
-            if int(doc.get("is_standard") or 0) != 1:
-                doc.update({
-                    "label": name,
-                    "type": "Custom",
-                    "method": "visit_management.utils.get_frequency_overdue_count",
-                    "show_percentage_stats": 0,
-                    "filters_json": "[]",
-                    "dynamic_filters_json": "[]",
-                    "currency": "",
-                })
-                doc.save(ignore_permissions=True)
-        except Exception:
-            pass
+        doc = frappe.get_doc("Number Card", name)
+        if int(doc.get("is_standard") or 0) != 1:
+            doc.update({k: v for k, v in spec.items() if k != "name"})
+            doc.save(ignore_permissions=True)
     else:
-        frappe.get_doc({
-            "doctype": "Number Card",
-            "name": name,
-            "label": name,
-            "type": "Custom",
-            "method": "visit_management.utils.get_frequency_overdue_count",
-            "is_standard": 1,
-            "is_public": 1,
-            "show_percentage_stats": 0,
-            "filters_json": "[]",
-            "dynamic_filters_json": "[]",
-            "currency": "",
-        }).insert(ignore_permissions=True)
-
-
-def _upsert_custom_fields_for_clients():
-    """Create/ensure visit-frequency custom fields on client doctypes (Customer and CRM Organization)."""
+        frappe.get_doc(dict(spec, doctype="Number Card", is_standard=1, is_public=1)).insert(ignore_permissions=True)
+
+
+# Visit-frequency custom fields on the client doctypes
+CLIENT_VISIT_FIELDS = {
+    # ERPNext Customer
+    "Customer": [
+        dict(fieldname="requires_regular_visits", label="Requires Regular Visits", fieldtype="Check", insert_after="customer_group"),
+        dict(
+            fieldname="visit_frequency",
+            label="Visit Frequency",
+            fieldtype="Select",
+            options="\nWeekly\nBiweekly\nMonthly\nQuarterly\nSemiannual\nAnnual",
+            depends_on="eval:doc.requires_regular_visits==1",
+            insert_after="requires_regular_visits",
+        ),
+    ],
+    # CRM Organization (from CRM app)
+    "CRM Organization": [
+        dict(fieldname="requires_regular_visits", label="Requires Regular Visits", fieldtype="Check", insert_after="organization_name"),
+        dict(
+            fieldname="visit_frequency",
+            label="Visit Frequency",
+            fieldtype="Select",
+            options="\nWeekly\nBiweekly\nMonthly\nQuarterly\nSemiannual\nAnnual",
+            depends_on="eval:doc.requires_regular_visits==1",
+            insert_after="requires_regular_visits",
+        ),
+    ],
+}
+
+
+def _upsert_custom_fields_for_clients(fields: dict | None = None):
+    """Create/ensure visit-frequency custom fields on client doctypes (Customer and CRM Organization).
+
+    Doctypes of apps that are not installed are skipped.
+    """
     from frappe.custom.doctype.custom_field.custom_field import create_custom_fields
 
-    fields = {
-        # ERPNext Customer
-        "Customer": [
-            dict(fieldname="requires_regular_visits", label="Requires Regular Visits", fieldtype="Check", insert_after="customer_group"),
-            dict(
-                fieldname="visit_frequency",
-                label="Visit Frequency",
-                fieldtype="Select",
-                options="\nWeekly\nBiweekly\nMonthly\nQuarterly\nSemiannual\nAnnual",
-                depends_on="eval:doc.requires_regular_visits==1",
-                insert_after="requires_regular_visits",
-            ),
-        ],
-        # CRM Organization (from CRM app)
-        "CRM Organization": [
-            dict(fieldname="requires_regular_visits", label="Requires Regular Visits", fieldtype="Check", insert_after="organization_name"),
-            dict(
-                fieldname="visit_frequency",
-                label="Visit Frequency",
-                fieldtype="Select",
-                options="\nWeekly\nBiweekly\nMonthly\nQuarterly\nSemiannual\nAnnual",
-                depends_on="eval:doc.requires_regular_visits==1",
-                insert_after="requires_regular_visits",
-            ),
-        ],
-    }
-    try:
+    fields = {dt: f for dt, f in (fields or CLIENT_VISIT_FIELDS).items() if frappe.db.exists("DocType", dt)}
+    if fields:
         create_custom_fields(fields, ignore_validate=True)
-    except Exception:
-        pass
 
 
-@whitelist()
-def get_frequency_overdue_count():
-    """Return count of clients (Customer + CRM Organization) that are overdue as per visit frequency."""
-    import datetime
-
-    def get_last_visit_for(client_doctype: str, client_name: str):
-        # Prefer check_out_time, fallback to scheduled_time of Completed visit
-        dt = frappe.db.sql(
-            """
-            select coalesce(max(check_out_time), max(scheduled_time))
-            from `tabVisit`
-            where status='Completed' and client_type=%s and client=%s
+def due_date_from(last_dt, freq: str):
+    """Next due date for a client last visited at `last_dt` with the given visit_frequency.
+
+    Calendar months for Monthly and longer, rolled to a working day when the setting asks for it;
+    see visit_management.due_dates (use due_dates there for many clients at once).
+    """
+    return due_date(last_dt, freq)
+
+
+def get_last_visit_map(client_type: str, clients: list[str] | None = None) -> dict:
+    """Map client -> last completed visit (latest check_out_time, else latest scheduled_time).
+
+    One grouped query for all clients of a type instead of one MAX query per client; archived Visits
+    (Visit Archive) count too, since a client's last visit may be older than the archive age.
+    """
+    conditions = ["status = 'Completed'", "client_type = %(client_type)s"]
+    values = {"client_type": client_type}
+    if clients is not None:
+        if not clients:
+            return {}
+        conditions.append("client in %(clients)s")
+        values["clients"] = tuple(clients)
+    where = " and ".join(conditions)
+    return dict(
+        frappe.db.sql(
+            f"""
+            select client, max(last_visit)
+            from (
+                select client, coalesce(max(check_out_time), max(scheduled_time)) as last_visit
+                from `tabVisit` where {where} group by client
+                union all
+                select client, coalesce(max(check_out_time), max(scheduled_time)) as last_visit
+                from `tabVisit Archive` where {where} group by client
+            ) last_visits
+            group by client
             """,
-            (client_doctype, client_name),
+            values,
         )
-        return (dt[0][0] if dt and dt[0] and dt[0][0] else None)
-
-    def due_date_from(last_dt, freq: str):
-        if not last_dt:
-            return None
-        # normalize to date
-        if isinstance(last_dt, str):
-            try:
-                last_dt = datetime.datetime.fromisoformat(last_dt)
-            except Exception:
-                last_dt = now_datetime()
-        if freq == "Weekly":
-            delta = datetime.timedelta(days=7)
-        elif freq == "Biweekly":
-            delta = datetime.timedelta(days=14)
-        elif freq == "Monthly":
-            # approximate as 30 days
-            delta = datetime.timedelta(days=30)
-        elif freq == "Quarterly":
-            delta = datetime.timedelta(days=90)
-        elif freq == "Semiannual":
-            delta = datetime.timedelta(days=182)
-        elif freq == "Annual":
-            delta = datetime.timedelta(days=365)
-        else:
-            return None
-        return (last_dt + delta).date()
-
-    today = getdate()
-    overdue = 0
-
-    # Customers
-    for row in frappe.get_all(
-        "Customer",
-        filters={"requires_regular_visits": 1},
-        fields=["name", "visit_frequency"],
-    ):
-        last = get_last_visit_for("Customer", row.name)
-        due = due_date_from(last, row.visit_frequency)
-        if not due or due < today:
-            overdue += 1
-
-    # CRM Organizations
-    if frappe.db.exists("DocType", "CRM Organization"):
-        for row in frappe.get_all(
-            "CRM Organization",
+    )
+
+
+def get_regular_visit_clients() -> list[dict]:
+    """Clients flagged for regular visits (Customer, and CRM Organization when installed) with their
+    frequency and last completed visit: two queries per client doctype, plus one to detect CRM.
+
+    Computed live; the reports and the overdue card read the maintained copy in Visit Client Due.
+    """
+    from visit_management.visit_due import client_doctypes
+
+    out = []
+    for doctype in client_doctypes():
+        rows = frappe.get_all(
+            doctype,
             filters={"requires_regular_visits": 1},
             fields=["name", "visit_frequency"],
-        ):
-            last = get_last_visit_for("CRM Organization", row.name)
-            due = due_date_from(last, row.visit_frequency)
-            if not due or due < today:
-                overdue += 1
+        )
+        if not rows:
+            continue
+        last_visits = get_last_visit_map(doctype)
+        for row in rows:
+            out.append({
+                "client_type": doctype,
+                "client": row.name,
+                "visit_frequency": row.visit_frequency,
+                "last_visit": last_visits.get(row.name),
+            })
+    return out
+
+
+@whitelist()
+@profiled("kpi.frequency_overdue_count")
+def get_frequency_overdue_count():
+    """Return count of clients (Customer + CRM Organization) that are overdue as per visit frequency.
+
+    One count over Visit Client Due (never visited or due date before today).
+    """
+    from visit_management.visit_due import count_overdue
 
-    return {"value": overdue, "fieldtype": "Int"}
+    return {"value": count_overdue(), "fieldtype": "Int"}
 
 
 @whitelist()
+@profiled("kpi.get_visit_kpis")
 def get_visit_kpis(
     mode: str = "my",
     user: str | None = None,
@@ -870,27 +721,178 @@ def get_visit_kpis(
         "overdue": overdue,
         "effective_mode": effective_mode,
         "is_manager": bool(is_manager),
+        # lets the panel place realtime deltas in or out of the counted period
+        "window": {"start": start, "end": end},
     }
 
 
+# Redis set of every user that has been assigned a Visit; "" marks the set as built
+VISIT_ASSIGNEES_KEY = "vm_visit_assignees"
+ENABLED_USERS_KEY = "vm_enabled_users"
+
+
+def rebuild_visit_assignees() -> int:
+    """Recompute the assignee set from Visit (drops users no longer assigned anything)."""
+    users = frappe.get_all(
+        "Visit", filters={"assigned_to": ["is", "set"]}, pluck="assigned_to", distinct=True
+    )
+    cache = frappe.cache()
+    cache.delete_value(VISIT_ASSIGNEES_KEY)
+    cache.sadd(VISIT_ASSIGNEES_KEY, "", *users)
+    return len(users)
+
+
+def track_visit_assignee(doc, method=None):
+    """Hook: Visit on_update. Add a newly seen assignee to the cached set.
+
+    Only a built set (one holding the "" marker) is grown; a missing one is left for
+    get_visit_assignees to rebuild, so one save cannot pass itself off as the whole set.
+    """
+    if doc.get("assigned_to"):
+        try:
+            cache = frappe.cache()
+            if cache.sismember(VISIT_ASSIGNEES_KEY, ""):
+                cache.sadd(VISIT_ASSIGNEES_KEY, doc.assigned_to)
+        except Exception:
+            pass
+
+
+def _enabled_users() -> set[str]:
+    cache = frappe.cache()
+    users = cache.get_value(ENABLED_USERS_KEY)
+    if users is None:
+        users = frappe.get_all("User", filters={"enabled": 1}, pluck="name")
+        cache.set_value(ENABLED_USERS_KEY, users)
+    return set(users)
+
+
+def clear_user_caches(doc=None, method=None):
+    """Hook: User on_update / after_insert / on_trash / after_rename. Enabled flag or roles may have changed."""
+    from visit_management.realtime import MANAGERS_CACHE_KEY
+
+    frappe.cache().delete_value([ENABLED_USERS_KEY, MANAGERS_CACHE_KEY])
+
+
+def _assignee_members() -> set[str]:
+    return {m.decode() if isinstance(m, bytes) else m for m in frappe.cache().smembers(VISIT_ASSIGNEES_KEY)}
+
+
 @whitelist()
 def get_visit_assignees():
-    """Return distinct users assigned on Visit (enabled users only)."""
-    # distinct assigned_to from Visit
-    rows = frappe.db.get_all(
-        "Visit",
-        fields=["distinct assigned_to as user"],
-        filters={"assigned_to": ["is", "set"]},
-        as_list=False,
-    )
-    users = [r.get("user") for r in rows if r.get("user")]
-    if not users:
-        return []
-    enabled = set(
-        x.name
-        for x in frappe.get_all("User", filters={"name": ["in", users], "enabled": 1}, fields=["name"])
-    )
-    return [u for u in users if u in enabled]
+    """Return distinct users assigned on Visit (enabled users only).
+
+    Served from a cached assignee set (grown on Visit save, rebuilt nightly) and a cached list of
+    enabled users, so the cost does not grow with the Visit table.
+    """
+    users = _assignee_members()
+    if "" not in users:
+        # never built, or lost to a redis restart, eviction or clear_cache
+        rebuild_visit_assignees()
+        users = _assignee_members()
+    enabled = _enabled_users()
+    return sorted(u for u in users if u and u in enabled)
+
+
+# Redis counter bumped on every Visit change; part of the KPI payload ETag
+VISIT_DATA_VERSION_KEY = "vm_visit_data_version"
+# Overdue counts depend on "now", so ETags also roll over every bucket (seconds)
+KPI_ETAG_BUCKET_SECONDS = 300
+
+
+def bump_visit_data_version(doc=None, method=None):
+    """Hook: Visit on_update / on_trash. Invalidates every KPI payload ETag."""
+    try:
+        cache = frappe.cache()
+        cache.incrby(cache.make_key(VISIT_DATA_VERSION_KEY), 1)
+    except Exception:
+        pass
+
+
+def _visit_data_version() -> int:
+    try:
+        cache = frappe.cache()
+        return int(cache.get(cache.make_key(VISIT_DATA_VERSION_KEY)) or 0)
+    except Exception:
+        return 0
+
+
+def _kpi_payload_etag(args: dict) -> str:
+    import hashlib
+    import json
+
+    user = frappe.session.user
+    key = {
+        "v": _visit_data_version(),
+        "t": int(now_datetime().timestamp()) // KPI_ETAG_BUCKET_SECONDS,
+        "user": user,
+        "roles": sorted(set(frappe.get_roles(user)) & {"Sales Manager", "System Manager"}),
+        "args": args,
+    }
+    return hashlib.sha1(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def _request_etags() -> set[str]:
+    """Entity tags sent by the client in If-None-Match (quotes and weak prefix stripped)."""
+    request = getattr(frappe.local, "request", None)
+    header = request.headers.get("If-None-Match") if request else None
+    if not header:
+        return set()
+    return {t.strip().removeprefix("W/").strip('"') for t in header.split(",") if t.strip()}
+
+
+@whitelist(methods=["GET", "POST"])
+def get_visit_kpi_payload(
+    mode: str = "my",
+    user: str | None = None,
+    period: str = "month",
+    from_date: str | None = None,
+    to_date: str | None = None,
+    overdue_within_period: int | bool | None = None,
+    etag: str | None = None,
+):
+    """KPI counts and the assignee list in one response, with an ETag for conditional polling.
+
+    The ETag is derived from the Visit data version, the arguments, the caller and a five-minute
+    time bucket, so it can be checked without running any count. When it matches the
+    If-None-Match header the response is a bodiless 304; when it matches `etag` the reply is
+    {"not_modified": True, "etag": ...}.
+    """
+    args = {
+        "mode": mode or "my",
+        "user": user or "",
+        "period": period or "month",
+        "from_date": from_date or "",
+        "to_date": to_date or "",
+        "overdue_within_period": 1 if frappe.utils.cint(overdue_within_period) else 0,
+    }
+    current = _kpi_payload_etag(args)
+    headers = getattr(frappe.local, "response_headers", None)
+    if headers is not None:
+        headers["ETag"] = f'"{current}"'
+        headers["Cache-Control"] = "private, no-cache"
+    if current in _request_etags():
+        frappe.local.response["http_status_code"] = 304
+        return None
+    if etag and etag.strip('"') == current:
+        return {"not_modified": True, "etag": current}
+
+    cache_key = f"vm_kpi_payload::{current}"
+    payload = frappe.cache().get_value(cache_key)
+    if payload is None:
+        payload = {
+            "etag": current,
+            "kpis": get_visit_kpis(
+                mode=args["mode"],
+                user=args["user"] or None,
+                period=args["period"],
+                from_date=args["from_date"] or None,
+                to_date=args["to_date"] or None,
+                overdue_within_period=args["overdue_within_period"],
+            ),
+            "assignees": get_visit_assignees(),
+        }
+        frappe.cache().set_value(cache_key, payload, expires_in_sec=KPI_ETAG_BUCKET_SECONDS * 2)
+    return payload
 
 
 @whitelist()
@@ -938,177 +940,7 @@ def debug_custom_block_info(name: str = "Visits KPI Panel"):
 
 @whitelist()
 def upsert_visits_kpi_panel_block():
-        """Force-update the 'Visits KPI Panel' Custom HTML Block with embedded HTML/JS/CSS."""
-        name = "Visits KPI Panel"
-        html = (
-                """
-<div class="vm-kpi-panel">
-    <div class="vm-kpi-toolbar">
-        <div class="left d-flex align-items-center">
-            <div class="btn-group btn-group-sm mr-2">
-                <button type="button" class="btn btn-default vm-mode-btn active" data-mode="my">My</button>
-                <button type="button" class="btn btn-default vm-mode-btn" data-mode="team">Team</button>
-            </div>
-            <div class="vm-agent d-none">
-                <label class="mr-2 text-muted">Agent</label>
-                <select class="form-control input-sm vm-agent-select"><option value="">All</option></select>
-            </div>
-        </div>
-        <div class="right d-flex align-items-center">
-            <div class="vm-period mr-2">
-                <label class="mr-2 text-muted">Period</label>
-                <select class="form-control input-sm vm-period-select">
-                    <option value="today">Today</option>
-                    <option value="week">This Week</option>
-                    <option value="month" selected> This Month</option>
-                    <option value="quarter">This Quarter</option>
-                    <option value="year">This Year</option>
-                </select>
-            </div>
-            <div class="form-check form-check-inline">
-                <input class="form-check-input vm-overdue-scope" type="checkbox" id="vmOverdueScope">
-                <label class="form-check-label" for="vmOverdueScope">Overdue within period</label>
-            </div>
-            <span class="vm-role-hint badge badge-warning ml-2 d-none">Limited to My</span>
-        </div>
-    </div>
-    <div class="vm-kpis row">
-        <div class="col-md-3 col-sm-6 vm-kpi">
-            <div class="kpi-card planned">
-                <div class="kpi-label">Planned</div>
-                <div class="kpi-value" data-key="planned">–</div>
-            </div>
-        </div>
-        <div class="col-md-3 col-sm-6 vm-kpi">
-            <div class="kpi-card in-progress">
-                <div class="kpi-label">In Progress</div>
-                <div class="kpi-value" data-key="in_progress">–</div>
-            </div>
-        </div>
-        <div class="col-md-3 col-sm-6 vm-kpi">
-            <div class="kpi-card completed">
-                <div class="kpi-label">Completed</div>
-                <div class="kpi-value" data-key="completed">–</div>
-            </div>
-        </div>
-        <div class="col-md-3 col-sm-6 vm-kpi">
-            <div class="kpi-card overdue">
-                <div class="kpi-label">Overdue</div>
-                <div class="kpi-value" data-key="overdue">–</div>
-            </div>
-        </div>
-    </div>
-</div>
-"""
-        ).strip()
-        script = (
-                """
-(function(){
-    var $ = window.jQuery;
-    var panel = root_element;
-    var state = { mode: 'my', period: 'month', user: '', overdue_within_period: false, is_manager: false };
-
-    function setMode(mode, showHint) {
-        state.mode = mode;
-        $(panel).find('.vm-mode-btn').removeClass('active');
-        $(panel).find('.vm-mode-btn[data-mode="' + mode + '"]').addClass('active');
-        $(panel).find('.vm-role-hint').toggleClass('d-none', !showHint);
-        $(panel).find('.vm-agent').toggleClass('d-none', !(mode === 'team' && state.is_manager));
-    }
-
-    function setPeriod(period) {
-        state.period = period;
-        $(panel).find('.vm-period-select').val(period);
-    }
-
-    function setUser(user){
-        state.user = user || '';
-    }
-
-    function renderValues(data){
-        var keys = ['planned','in_progress','completed','overdue'];
-        for (var i=0;i<keys.length;i++){
-            var k = keys[i];
-            // Avoid HTML-returning formatters; show plain, locale-safe numbers
-            var val = data[k] || 0;
-            $(panel).find('.kpi-value[data-key="' + k + '"]').text(String(val));
-        }
-        // role awareness
-        state.is_manager = !!data.is_manager;
-        if (data.effective_mode && data.effective_mode !== state.mode) {
-            setMode(data.effective_mode, true);
-        } else {
-            $(panel).find('.vm-role-hint').toggleClass('d-none', !!state.is_manager);
-        }
-        $(panel).find('.vm-agent').toggleClass('d-none', !(state.mode === 'team' && state.is_manager));
-    }
-
-    function refresh(){
-        return frappe.call({
-            method: 'visit_management.utils.get_visit_kpis',
-            args: { mode: state.mode, period: state.period, user: state.user, overdue_within_period: state.overdue_within_period },
-        }).then(function(res){
-            renderValues((res && res.message) || {});
-        });
-    }
-
-    function loadAgents(){
-        return frappe.call({
-            method: 'visit_management.utils.get_visit_assignees'
-        }).then(function(res){
-            var list = ((res && res.message) || []).filter(Boolean);
-            var $sel = $(panel).find('.vm-agent-select');
-            $sel.empty();
-            $sel.append('<option value="">All</option>');
-            list.forEach(function(u){ $sel.append('<option value="'+u+'">'+frappe.utils.escape_html(u)+'</option>'); });
-        });
-    }
-
-    // events
-    $(panel).find('.vm-mode-btn').on('click', function(){
-        var mode = $(this).data('mode');
-        setMode(mode, false);
-        refresh();
-    });
-    $(panel).find('.vm-period-select').on('change', function(){
-        var period = $(this).val();
-        setPeriod(period);
-        refresh();
-    });
-    $(panel).find('.vm-agent-select').on('change', function(){
-        setUser($(this).val());
-        refresh();
-    });
-    $(panel).find('.vm-overdue-scope').on('change', function(){
-        state.overdue_within_period = $(this).is(':checked');
-        refresh();
-    });
-
-    // init
-    setMode('my', false);
-    setPeriod('month');
-    loadAgents().then(refresh);
-})();
-"""
-        ).strip()
-        style = (
-                """
-.vm-kpi-panel{padding:8px 0} .vm-kpi-toolbar{display:flex;justify-content:space-between;align-items:center;margin-bottom:8px} .vm-kpi .kpi-card{background:#fff;border:1px solid var(--border-color, #d1d8dd);border-radius:6px;padding:12px;box-shadow:0 1px 2px rgba(0,0,0,0.03)} .kpi-label{font-size:12px;color:#6c757d;text-transform:uppercase;letter-spacing:.04em} .kpi-value{font-size:24px;font-weight:700;margin-top:4px} .kpi-card.planned{border-left:4px solid #6c757d} .kpi-card.in-progress{border-left:4px solid #17a2b8} .kpi-card.completed{border-left:4px solid #28a745} .kpi-card.overdue{border-left:4px solid #dc3545}
-"""
-        ).strip()
-
-        if frappe.db.exists("Custom HTML Block", name):
-                doc = frappe.get_doc("Custom HTML Block", name)
-                doc.update({"html": html, "script": script, "style": style})
-                doc.save(ignore_permissions=True)
-        else:
-                doc = frappe.get_doc({
-                        "doctype": "Custom HTML Block",
-                        "name": name,
-                        "html": html,
-                        "script": script,
-                        "style": style,
-                })
-                doc.insert(ignore_permissions=True)
-        frappe.clear_cache(doctype="Custom HTML Block")
-        return {"ok": True}
+    """Force-update the 'Visits KPI Panel' Custom HTML Block with the stub that loads the panel asset."""
+    _upsert_kpi_panel_block(_kpi_panel_block_spec())
+    frappe.clear_cache(doctype="Custom HTML Block")
+    return {"ok": True}
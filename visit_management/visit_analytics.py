@@ -0,0 +1,262 @@
+from __future__ import annotations
+
+from array import array
+
+import frappe
+from frappe import whitelist
+from frappe.utils import getdate
+
+from visit_management.visit_management.doctype.visit.visit import get_permission_query_conditions
+
+try:
+    import numpy as np
+except ImportError:  # optional: fall back to pure-Python aggregation
+    np = None
+
+METRICS = ("conversion", "duration_by_subject", "outcomes", "heatmap")
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+# Metrics served by the (assigned_to, status, subject, visit_outcome) grouping
+GROUPED_METRICS = ("conversion", "duration_by_subject", "outcomes")
+
+
+class VisitColumns:
+    """Dictionary-encoded, columnar store of Visit groups used by analytics.
+
+    Each entry is one (assigned_to, status, subject, visit_outcome) group counted in SQL, with its
+    number of Visits, how many recorded a duration and their summed minutes. Categorical values are
+    mapped to integer codes, so aggregation works on compact integer arrays (NumPy when available).
+    The weekday/hour heatmap is grouped separately and kept as a 7 x 24 grid.
+    """
+
+    CATEGORICAL = ("assigned_to", "status", "subject", "visit_outcome")
+
+    def __init__(self):
+        self.labels = {c: {} for c in self.CATEGORICAL}
+        self.codes = {c: array("i") for c in self.CATEGORICAL}
+        self.visits = array("q")
+        self.timed = array("q")  # Visits of the group with a recorded duration
+        self.duration = array("q")  # summed minutes of those Visits
+        self.heatmap = [[0] * 24 for _ in range(7)]  # [weekday (0 = Monday)][hour]
+
+    def __len__(self):
+        return len(self.visits)
+
+    @property
+    def total(self) -> int:
+        return sum(self.visits) if len(self.visits) else sum(map(sum, self.heatmap))
+
+    def extend(self, rows):
+        """Append groups of (assigned_to, status, subject, visit_outcome, visits, timed, duration)."""
+        for row in rows:
+            for i, field in enumerate(self.CATEGORICAL):
+                labels = self.labels[field]
+                self.codes[field].append(labels.setdefault(row[i] or "", len(labels)))
+            self.visits.append(int(row[4]))
+            self.timed.append(int(row[5] or 0))
+            self.duration.append(int(row[6] or 0))
+
+    def label_list(self, field: str) -> list[str]:
+        labels = self.labels[field]
+        out = [""] * len(labels)
+        for label, code in labels.items():
+            out[code] = label
+        return out
+
+    def code_of(self, field: str, label: str) -> int:
+        return self.labels[field].get(label, -1)
+
+
+def _weekday_hour_sql() -> tuple[str, str]:
+    """(weekday with 0 = Monday, hour) of scheduled_time for the site's database."""
+    if frappe.db.db_type == "postgres":
+        return (
+            "cast(extract(isodow from scheduled_time) as integer) - 1",
+            "cast(extract(hour from scheduled_time) as integer)",
+        )
+    return "weekday(scheduled_time)", "hour(scheduled_time)"
+
+
+def fetch_visit_columns(from_date, to_date, assigned_to: str | None = None, metrics=None) -> VisitColumns:
+    """Group the Visits scheduled in [from_date, to_date] in SQL.
+
+    One grouped query feeds conversion, duration and outcomes, one more the heatmap (each only when
+    requested); both return at most a few thousand groups whatever the number of Visits.
+    """
+    metrics = [m for m in (metrics or METRICS) if m in METRICS]
+    conditions = ["scheduled_time >= %(start)s", "scheduled_time <= %(end)s"]
+    values = {"start": f"{getdate(from_date)} 00:00:00", "end": f"{getdate(to_date)} 23:59:59"}
+    if assigned_to:
+        conditions.append("assigned_to = %(assigned_to)s")
+        values["assigned_to"] = assigned_to
+    permission = get_permission_query_conditions(frappe.session.user)
+    if permission:
+        conditions.append(permission)
+    where = " and ".join(conditions)
+
+    cols = VisitColumns()
+    if any(m in GROUPED_METRICS for m in metrics):
+        cols.extend(frappe.db.sql(
+            f"""
+            select coalesce(assigned_to, ''), coalesce(status, ''), coalesce(subject, ''),
+                coalesce(visit_outcome, ''), count(*), count(visit_duration_minutes),
+                coalesce(sum(visit_duration_minutes), 0)
+            from `tabVisit`
+            where {where}
+            group by 1, 2, 3, 4
+            """,
+            values,
+        ))
+    if "heatmap" in metrics:
+        weekday, hour = _weekday_hour_sql()
+        for wd, hr, count in frappe.db.sql(
+            f"select {weekday}, {hour}, count(*) from `tabVisit` where {where} group by 1, 2", values
+        ):
+            cols.heatmap[int(wd)][int(hr)] = int(count)
+    return cols
+
+
+def aggregate_visit_columns(cols: VisitColumns, metrics=None) -> dict:
+    """Compute the requested metrics over a VisitColumns store."""
+    metrics = [m for m in (metrics or METRICS) if m in METRICS]
+    agg = _aggregate_numpy if np is not None else _aggregate_python
+    out = {"total": cols.total}
+    out.update(agg(cols, metrics))
+    if "heatmap" in metrics:
+        out["heatmap"] = _heatmap(cols.heatmap)
+    return out
+
+
+def _as_np(col, dtype):
+    if isinstance(col, np.ndarray):
+        return col
+    if not len(col):
+        return np.zeros(0, dtype=dtype)
+    return np.frombuffer(col, dtype=dtype)
+
+
+def _aggregate_numpy(cols: VisitColumns, metrics: list[str]) -> dict:
+    out = {}
+    status = _as_np(cols.codes["status"], np.int32)
+    outcome = _as_np(cols.codes["visit_outcome"], np.int32)
+    visits = _as_np(cols.visits, np.int64)
+
+    if "conversion" in metrics:
+        reps = cols.label_list("assigned_to")
+        rep = _as_np(cols.codes["assigned_to"], np.int32)
+        completed_mask = status == cols.code_of("status", "Completed")
+        success_mask = completed_mask & (outcome == cols.code_of("visit_outcome", "Successful"))
+        total = np.bincount(rep, weights=visits, minlength=len(reps))
+        completed = np.bincount(rep[completed_mask], weights=visits[completed_mask], minlength=len(reps))
+        successful = np.bincount(rep[success_mask], weights=visits[success_mask], minlength=len(reps))
+        out["conversion"] = _conversion_rows(reps, total.tolist(), completed.tolist(), successful.tolist())
+
+    if "duration_by_subject" in metrics:
+        subjects = cols.label_list("subject")
+        subject = _as_np(cols.codes["subject"], np.int32)
+        counts = np.bincount(subject, weights=_as_np(cols.timed, np.int64), minlength=len(subjects))
+        sums = np.bincount(subject, weights=_as_np(cols.duration, np.int64), minlength=len(subjects))
+        per_subject = np.bincount(subject, weights=visits, minlength=len(subjects))
+        out["duration_by_subject"] = _duration_rows(subjects, per_subject.tolist(), counts.tolist(), sums.tolist())
+
+    if "outcomes" in metrics:
+        outcomes = cols.label_list("visit_outcome")
+        counts = np.bincount(outcome, weights=visits, minlength=len(outcomes))
+        out["outcomes"] = _outcome_rows(outcomes, counts.tolist())
+    return out
+
+
+def _aggregate_python(cols: VisitColumns, metrics: list[str]) -> dict:
+    out = {}
+    status = cols.codes["status"]
+    outcome = cols.codes["visit_outcome"]
+
+    if "conversion" in metrics:
+        reps = cols.label_list("assigned_to")
+        completed_code = cols.code_of("status", "Completed")
+        success_code = cols.code_of("visit_outcome", "Successful")
+        total, completed, successful = [0] * len(reps), [0] * len(reps), [0] * len(reps)
+        for r, s, o, n in zip(cols.codes["assigned_to"], status, outcome, cols.visits):
+            total[r] += n
+            if s == completed_code:
+                completed[r] += n
+                if o == success_code:
+                    successful[r] += n
+        out["conversion"] = _conversion_rows(reps, total, completed, successful)
+
+    if "duration_by_subject" in metrics:
+        subjects = cols.label_list("subject")
+        visits, counts, sums = [0] * len(subjects), [0] * len(subjects), [0] * len(subjects)
+        for u, n, t, d in zip(cols.codes["subject"], cols.visits, cols.timed, cols.duration):
+            visits[u] += n
+            counts[u] += t
+            sums[u] += d
+        out["duration_by_subject"] = _duration_rows(subjects, visits, counts, sums)
+
+    if "outcomes" in metrics:
+        outcomes = cols.label_list("visit_outcome")
+        counts = [0] * len(outcomes)
+        for o, n in zip(outcome, cols.visits):
+            counts[o] += n
+        out["outcomes"] = _outcome_rows(outcomes, counts)
+    return out
+
+
+def _conversion_rows(reps, total, completed, successful) -> list[dict]:
+    rows = [
+        {
+            "assigned_to": reps[i],
+            "visits": int(total[i]),
+            "completed": int(completed[i]),
+            "successful": int(successful[i]),
+            "conversion_rate": round(successful[i] / completed[i], 4) if completed[i] else 0.0,
+        }
+        for i in range(len(reps))
+        if reps[i]
+    ]
+    return sorted(rows, key=lambda r: r["assigned_to"])
+
+
+def _duration_rows(subjects, visits, counts, sums) -> list[dict]:
+    rows = [
+        {
+            "subject": subjects[i] or "Not Set",
+            "visits": int(visits[i]),
+            "with_duration": int(counts[i]),
+            "avg_duration_minutes": round(sums[i] / counts[i], 1) if counts[i] else None,
+        }
+        for i in range(len(subjects))
+    ]
+    return sorted(rows, key=lambda r: r["subject"])
+
+
+def _outcome_rows(outcomes, counts) -> list[dict]:
+    rows = [{"visit_outcome": outcomes[i] or "Not Set", "count": int(counts[i])} for i in range(len(outcomes))]
+    return sorted(rows, key=lambda r: -r["count"])
+
+
+def _heatmap(grid) -> dict:
+    return {"weekdays": WEEKDAYS, "hours": list(range(24)), "values": [[int(v) for v in row] for row in grid]}
+
+
+@whitelist()
+def get_visit_analytics(
+    from_date: str,
+    to_date: str,
+    assigned_to: str | None = None,
+    metrics: str | list | None = None,
+) -> dict:
+    """Return several Visit metrics for a date range in one response.
+
+    Args:
+        from_date, to_date: scheduled_time window (inclusive dates).
+        assigned_to: optional user to restrict to.
+        metrics: subset of conversion|duration_by_subject|outcomes|heatmap (list or JSON); default all.
+    """
+    frappe.has_permission("Visit", "read", throw=True)
+    if isinstance(metrics, str):
+        metrics = frappe.parse_json(metrics) if metrics.startswith("[") else metrics.split(",")
+    cols = fetch_visit_columns(from_date, to_date, assigned_to=assigned_to, metrics=metrics)
+    out = aggregate_visit_columns(cols, metrics)
+    out.update({"from_date": str(getdate(from_date)), "to_date": str(getdate(to_date))})
+    return out
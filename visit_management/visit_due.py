@@ -0,0 +1,210 @@
+"""Per-client visit due dates (Visit Client Due).
+
+Clients flagged "Requires Regular Visits" get one row with their frequency, territory, last completed
+Visit (live or archived) and next due date. Visit and client changes enqueue a refresh of just the
+affected client after commit; `rebuild_visit_client_due` recomputes everything (backfill patch and
+nightly repair). The frequency-due reports and the overdue card read the table with SQL filters and
+paging, so opening them does not depend on the size of the client base.
+"""
+
+from __future__ import annotations
+
+import hashlib
+
+import frappe
+from frappe.utils import cint, getdate, now_datetime
+
+from visit_management.due_dates import due_dates
+from visit_management.utils import get_last_visit_map
+
+DUE_DOCTYPE = "Visit Client Due"
+# Visit fields that can move a client's last completed visit
+SOURCE_FIELDS = ("status", "client_type", "client", "check_out_time", "scheduled_time")
+# Client fields copied into (or deciding membership of) the table
+CLIENT_FIELDS = ("requires_regular_visits", "visit_frequency", "territory")
+# Columns of a row besides its name, in write order
+COLUMNS = ("client_type", "client", "visit_frequency", "territory", "last_visit", "due_date")
+MAX_PAGE_LENGTH = 5000
+
+
+def _due_name(client_type: str, client: str) -> str:
+    """Deterministic row name, so a refresh and a rebuild converge on one row per client."""
+    return hashlib.sha1(f"{client_type}|{client}".encode()).hexdigest()[:20]
+
+
+def client_doctypes() -> list[str]:
+    """Client doctypes carrying the visit-frequency fields: Customer, and CRM Organization when installed."""
+    doctypes = ["Customer"]
+    if frappe.db.exists("DocType", "CRM Organization"):
+        doctypes.append("CRM Organization")
+    return doctypes
+
+
+def _compute(client_type: str, clients: list[str] | None = None) -> dict:
+    """{row name: column values} for the regular-visit clients of a doctype (all, or only `clients`)."""
+    fields = ["name", "visit_frequency"]
+    if frappe.get_meta(client_type).has_field("territory"):
+        fields.append("territory")
+    filters = {"requires_regular_visits": 1}
+    if clients is not None:
+        filters["name"] = ["in", clients]
+    rows = frappe.get_all(client_type, filters=filters, fields=fields)
+    if not rows:
+        return {}
+    last_visits = get_last_visit_map(client_type, [r.name for r in rows] if clients is not None else None)
+    lasts = [last_visits.get(r.name) for r in rows]
+    # every client's due date in one vectorised pass
+    dues = due_dates(lasts, [r.visit_frequency for r in rows])
+    return {
+        _due_name(client_type, r.name): (
+            client_type, r.name, r.visit_frequency or None, r.get("territory") or None, last, due,
+        )
+        for r, last, due in zip(rows, lasts, dues)
+    }
+
+
+def _existing(condition: str = "", values: dict | None = None) -> dict:
+    return {
+        r[0]: (r[1], r[2], r[3] or None, r[4] or None, r[5], getdate(r[6]) if r[6] else None)
+        for r in frappe.db.sql(f"select name, {', '.join(COLUMNS)} from `tab{DUE_DOCTYPE}` {condition}", values)
+    }
+
+
+def _write(fresh: dict, existing: dict) -> dict:
+    """Make the table match `fresh` for every row in fresh or existing, writing only what differs."""
+    now, user = now_datetime(), frappe.session.user
+    to_insert, updated = [], 0
+    for name, row in fresh.items():
+        current = existing.pop(name, None)
+        if current is None:
+            to_insert.append((name, now, now, user, user, *row))
+        elif current != row:
+            frappe.db.sql(
+                f"""
+                update `tab{DUE_DOCTYPE}`
+                set visit_frequency = %s, territory = %s, last_visit = %s, due_date = %s, modified = %s
+                where name = %s
+                """,
+                (*row[2:], now, name),
+            )
+            updated += 1
+    if to_insert:
+        frappe.db.bulk_insert(
+            DUE_DOCTYPE, fields=["name", "creation", "modified", "owner", "modified_by", *COLUMNS], values=to_insert
+        )
+    if existing:
+        frappe.db.delete(DUE_DOCTYPE, {"name": ["in", list(existing)]})
+    return {"inserted": len(to_insert), "updated": updated, "deleted": len(existing)}
+
+
+def refresh_clients(client_type: str, clients: list[str]) -> dict:
+    """Recompute the rows of some clients of one doctype (background job; the worker commits)."""
+    clients = list(clients)
+    if not clients or client_type not in client_doctypes():
+        return {}
+    existing = _existing("where client_type = %(client_type)s and client in %(clients)s",
+                         {"client_type": client_type, "clients": tuple(clients)})
+    return _write(_compute(client_type, clients), existing)
+
+
+def rebuild_visit_client_due() -> dict:
+    """Recompute every row from the clients and Visits; writes only rows that differ. Commits."""
+    fresh = {}
+    for doctype in client_doctypes():
+        fresh.update(_compute(doctype))
+    result = _write(fresh, _existing())
+    frappe.db.commit()
+    return result
+
+
+def enqueue_client_refresh(client_type: str, client: str):
+    # one pending job per client; it reads the committed state when it runs
+    frappe.enqueue(
+        "visit_management.visit_due.refresh_clients",
+        queue="short",
+        job_id=f"vm_client_due::{client_type}::{client}",
+        deduplicate=True,
+        enqueue_after_commit=True,
+        client_type=client_type,
+        clients=[client],
+    )
+
+
+# Hooks ---------------------------------------------------------------------
+
+
+def on_visit_change(doc, method=None):
+    """Hook: Visit on_update / on_trash. Refresh clients whose last completed Visit may have moved."""
+    try:
+        before = doc.get_doc_before_save() if method == "on_update" else None
+        if before and all(before.get(f) == doc.get(f) for f in SOURCE_FIELDS):
+            return
+        clients = {
+            (row.get("client_type"), row.get("client"))
+            for row in (before, doc)
+            if row and row.get("status") == "Completed" and row.get("client")
+        }
+        for client_type, client in clients:
+            if client_type in ("Customer", "CRM Organization"):
+                enqueue_client_refresh(client_type, client)
+    except Exception:
+        frappe.log_error(title="Visit Client Due Refresh Failed", message=f"Visit {doc.name}")
+
+
+def on_client_change(doc, method=None):
+    """Hook: Customer / CRM Organization on_update and on_trash."""
+    before = doc.get_doc_before_save() if method == "on_update" else None
+    if before is not None and all(before.get(f) == doc.get(f) for f in CLIENT_FIELDS):
+        return
+    if not (cint(doc.get("requires_regular_visits")) or (before and cint(before.get("requires_regular_visits")))):
+        return
+    enqueue_client_refresh(doc.doctype, doc.name)
+
+
+def on_client_rename(doc, method=None, old=None, new=None, merge=False):
+    """Hook: Customer / CRM Organization after_rename."""
+    frappe.db.delete(DUE_DOCTYPE, {"name": _due_name(doc.doctype, old)})
+    enqueue_client_refresh(doc.doctype, new)
+
+
+# Readers -------------------------------------------------------------------
+
+
+def _conditions(filters: dict) -> tuple[list[str], dict]:
+    conditions, values = [], {"today": getdate()}
+    for field in ("client_type", "visit_frequency", "territory"):
+        if filters.get(field):
+            conditions.append(f"{field} = %({field})s")
+            values[field] = filters.get(field)
+    if cint(filters.get("overdue_only")):
+        conditions.append("(due_date is null or due_date < %(today)s)")
+    return conditions, values
+
+
+def get_client_due_page(filters: dict | None = None, start: int = 0, page_length: int = 500) -> tuple[list, int]:
+    """(rows, total) for the filters: client_type, visit_frequency, territory, overdue_only.
+
+    Never-visited clients come first, then by due date; `is_overdue` is evaluated against today.
+    """
+    conditions, values = _conditions(frappe._dict(filters or {}))
+    where = f"where {' and '.join(conditions)}" if conditions else ""
+    total = cint(frappe.db.sql(f"select count(*) from `tab{DUE_DOCTYPE}` {where}", values)[0][0])
+    values.update(start=max(cint(start), 0), limit=min(max(cint(page_length), 1), MAX_PAGE_LENGTH))
+    rows = frappe.db.sql(
+        f"""
+        select client_type, client, visit_frequency, territory, last_visit, due_date,
+            case when due_date is null or due_date < %(today)s then 1 else 0 end as is_overdue
+        from `tab{DUE_DOCTYPE}`
+        {where}
+        order by due_date is not null, due_date, client
+        limit %(limit)s offset %(start)s
+        """,
+        values,
+        as_dict=True,
+    )
+    return rows, total
+
+
+def count_overdue(filters: dict | None = None) -> int:
+    conditions, values = _conditions(frappe._dict(filters or {}, overdue_only=1))
+    return cint(frappe.db.sql(f"select count(*) from `tab{DUE_DOCTYPE}` where {' and '.join(conditions)}", values)[0][0])
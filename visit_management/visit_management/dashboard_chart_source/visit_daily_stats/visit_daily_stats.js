@@ -0,0 +1,27 @@
+frappe.provide('frappe.dashboards.chart_sources');
+
+frappe.dashboards.chart_sources['Visit Daily Stats'] = {
+  method: 'visit_management.visit_management.dashboard_chart_source.visit_daily_stats.visit_daily_stats.get',
+  filters: [
+    {
+      fieldname: 'measure',
+      label: __('Measure'),
+      fieldtype: 'Select',
+      options: 'Created\nScheduled\nDuration',
+      default: 'Created',
+    },
+    {
+      fieldname: 'assigned_to',
+      label: __('Assigned To'),
+      fieldtype: 'Link',
+      options: 'User',
+      default: frappe.session.user,
+    },
+    {
+      fieldname: 'status',
+      label: __('Status'),
+      fieldtype: 'Select',
+      options: '\nPlanned\nIn Progress\nCompleted\nCancelled',
+    },
+  ],
+};
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import frappe
+from frappe.utils import add_days, cint, formatdate, getdate, nowdate
+from frappe.utils.dashboard import cache_source
+from frappe.utils.dateutils import get_from_date_from_timespan, get_period_ending
+
+MEASURES = {
+    "Created": "created_count",
+    "Scheduled": "scheduled_count",
+    "Duration": "duration_minutes",
+}
+
+
+@frappe.whitelist()
+@cache_source
+def get(
+    chart_name=None,
+    chart=None,
+    no_cache=None,
+    filters=None,
+    from_date=None,
+    to_date=None,
+    timespan=None,
+    time_interval=None,
+    heatmap_year=None,
+):
+    """Timeseries of Visit counts read from Visit Daily Stat; cost depends on the date range only.
+
+    The rollup has no row-level scope, so users whose Visit access is limited (see
+    visit._visit_access_scope) only get their own assigned Visits, whatever `assigned_to` they pass.
+    """
+    from visit_management.visit_management.doctype.visit.visit import _visit_access_scope
+
+    frappe.has_permission("Visit", "read", throw=True)
+    if chart_name:
+        chart = frappe.get_doc("Dashboard Chart", chart_name)
+    else:
+        chart = frappe._dict(frappe.parse_json(chart))
+
+    filters = frappe.parse_json(filters) or frappe.parse_json(chart.filters_json) or {}
+    if isinstance(filters, list):
+        filters = {f[1]: f[3] for f in filters if len(f) == 4 and f[2] == "="}
+
+    timespan = chart.timespan
+    if timespan == "Select Date Range":
+        from_date = chart.from_date
+        to_date = chart.to_date
+    to_date = getdate(to_date or nowdate())
+    from_date = getdate(from_date) if from_date else get_from_date_from_timespan(to_date, timespan)
+    timegrain = chart.time_interval or "Daily"
+    measure = MEASURES.get(filters.get("measure") or "Created", "created_count")
+
+    if _visit_access_scope(frappe.session.user) != "all":
+        filters["assigned_to"] = frappe.session.user
+
+    stat_filters = [["stat_date", "between", [from_date, to_date]]]
+    for field in ("assigned_to", "status", "subject", "client_type"):
+        if filters.get(field):
+            stat_filters.append([field, "=", filters.get(field)])
+
+    rows = frappe.get_all(
+        "Visit Daily Stat",
+        filters=stat_filters,
+        fields=["stat_date", f"sum({measure}) as value"],
+        group_by="stat_date",
+        order_by="stat_date asc",
+    )
+
+    buckets = {}
+    period = get_period_ending(from_date, timegrain)
+    last = get_period_ending(to_date, timegrain)
+    while period <= last:
+        buckets[period] = 0
+        period = get_period_ending(add_days(period, 1), timegrain)
+    for r in rows:
+        key = get_period_ending(r.stat_date, timegrain)
+        if key in buckets:
+            buckets[key] += cint(r.value)
+
+    return {
+        "labels": [formatdate(d) for d in buckets],
+        "datasets": [{"name": "Visits", "values": list(buckets.values())}],
+        "type": "bar",
+    }
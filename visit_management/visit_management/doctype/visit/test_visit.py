@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import frappe
+from frappe.permissions import add_permission, update_permission_property
+from frappe.tests.utils import FrappeTestCase
+
+from visit_management import activity, visit_search
+from visit_management.tests.utils import BUDGET_SIZES, QueryBudgetTestCase, make_visits
+from visit_management.visit_management.doctype.visit import visit
+
+# Role whose Visit read permission is limited to documents the user created ("If Owner")
+OWNER_ROLE = "Visit Owner Test"
+
+
+def make_user(email: str, roles: list[str]) -> str:
+	if not frappe.db.exists("User", email):
+		frappe.get_doc({
+			"doctype": "User",
+			"email": email,
+			"first_name": email.split("@")[0],
+			"send_welcome_email": 0,
+			"roles": [{"role": role} for role in roles],
+		}).insert(ignore_permissions=True)
+	return email
+
+
+class TestVisitPermissions(FrappeTestCase):
+	@classmethod
+	def setUpClass(cls):
+		super().setUpClass()
+		if not frappe.db.exists("Role", OWNER_ROLE):
+			frappe.get_doc({"doctype": "Role", "role_name": OWNER_ROLE, "desk_access": 1}).insert(ignore_permissions=True)
+		add_permission("Visit", OWNER_ROLE, 0, "read")
+		update_permission_property("Visit", OWNER_ROLE, 0, "if_owner", 1)
+
+		# role scope -> user; "none" has no Visit role permission, "unshared" neither and no shares
+		cls.users = {
+			"all": make_user("vm-test-all@example.com", ["Sales User"]),
+			"owner": make_user("vm-test-owner@example.com", [OWNER_ROLE]),
+			"none": make_user("vm-test-none@example.com", []),
+			"unshared": make_user("vm-test-unshared@example.com", []),
+		}
+		admin = "Administrator"
+		rows = [(admin, admin)]  # unrelated to every test user
+		for user in cls.users.values():
+			rows += [(user, admin), (admin, user), (admin, admin)]
+		cls.visits = make_visits(rows)
+		cls.unrelated = cls.visits[0]
+		for i, user in enumerate(cls.users.values()):
+			if user != cls.users["unshared"]:
+				frappe.share.add_docshare(
+					"Visit", cls.visits[3 + 3 * i], user, read=1, flags={"ignore_share_permission": True}
+				)
+
+	@classmethod
+	def tearDownClass(cls):
+		frappe.db.rollback()
+		frappe.clear_cache(doctype="Visit")
+		super().tearDownClass()
+
+	def _listed_and_allowed(self, user: str) -> tuple[set, set]:
+		with self.set_user(user):
+			try:
+				listed = set(frappe.get_list(
+					"Visit", filters={"name": ["in", self.visits]}, pluck="name", limit_page_length=0
+				))
+			except frappe.PermissionError:
+				# no role permission and nothing shared: Frappe refuses the list outright
+				listed = set()
+			allowed = {n for n in self.visits if frappe.has_permission("Visit", "read", doc=n, user=user)}
+		return listed, allowed
+
+	def test_get_list_matches_has_permission(self):
+		for scope, user in self.users.items():
+			with self.subTest(scope=scope):
+				listed, allowed = self._listed_and_allowed(user)
+				self.assertEqual(listed, allowed)
+				if scope == "all":
+					self.assertEqual(allowed, set(self.visits))
+				else:
+					self.assertNotIn(self.unrelated, allowed)
+
+	def test_shared_visit_is_listed(self):
+		for i, scope in enumerate(("all", "owner", "none")):
+			with self.subTest(scope=scope):
+				listed, _allowed = self._listed_and_allowed(self.users[scope])
+				self.assertIn(self.visits[3 + 3 * i], listed)
+
+
+class TestVisitQueryBudgets(QueryBudgetTestCase):
+	@classmethod
+	def setUpClass(cls):
+		super().setUpClass()
+		user = frappe.session.user
+		cls.visits = make_visits([(user, user)] * max(BUDGET_SIZES))
+
+	@classmethod
+	def tearDownClass(cls):
+		frappe.db.rollback()
+		super().tearDownClass()
+
+	def test_has_permission_batch(self):
+		for n in BUDGET_SIZES:
+			with self.subTest(n=n):
+				self.assertQueryBudget(lambda: visit.has_permission_batch(self.visits[:n], "read"), 3)
+
+	def test_get_form_bootstrap(self):
+		# the default address comes from the client address cache; the employee costs one read
+		self.assertQueryBudget(lambda: visit.get_form_bootstrap(self.visits[0]), 13)
+
+	def test_get_visit_timeline(self):
+		self.assertQueryBudget(lambda: activity.get_visit_timeline(self.visits[0]), 6)
+
+	def test_search_visits(self):
+		# permission scope + shares + one full-text query, whatever the page size
+		for n in BUDGET_SIZES:
+			with self.subTest(n=n):
+				self.assertQueryBudget(lambda: visit_search.search_visits("leaking compressor", limit=n), 4)
@@ -21,9 +21,14 @@ frappe.ui.form.on('Visit', {
   },
 
   refresh(frm) {
+    // Derived UI state arrives with the document load (Visit.onload -> __onload.vm_state)
+    const state = get_state(frm);
+
     // Show a convenient button to create MV when eligible
     const isMaintenance = (frm.doc.subject || '').toLowerCase() === 'maintenance';
-    const canCreateMV = isMaintenance && frm.doc.client_type === 'Customer' && frm.doc.status === 'Completed' && !frm.doc.maintenance_visit;
+    const canCreateMV = state.actions
+      ? state.actions.create_maintenance_visit
+      : isMaintenance && frm.doc.client_type === 'Customer' && frm.doc.status === 'Completed' && !frm.doc.maintenance_visit;
     if (canCreateMV) {
       frm.add_custom_button(__('Create Maintenance Visit'), async () => {
         try {
@@ -44,6 +49,19 @@ frappe.ui.form.on('Visit', {
         }
       }, __('Actions'));
     }
+
+    if (state.actions) {
+      frm.toggle_display('check_in', state.actions.check_in);
+      frm.toggle_display('check_out', state.actions.check_out);
+    }
+    if (state.checkin_mandatory && state.actions && state.actions.check_in && frm.doc.status !== 'Cancelled') {
+      // validate() refuses to complete this Visit without a check-in for the current user
+      frm.set_intro(__('Check in before completing this Visit.'), 'orange');
+    }
+    if (state.maintenance_visit_status && state.maintenance_visit_status.completion_status) {
+      frm.set_intro(__('Maintenance Visit: {0}', [__(state.maintenance_visit_status.completion_status)]), 'blue');
+    }
+    render_activity(frm);
   },
 
   client_type(frm) {
@@ -70,18 +88,64 @@ frappe.ui.form.on('Visit', {
 
   async check_in(frm) {
     await ensure_saved(frm);
-    await capture_and_attach(frm, 'check_in_photo');
+    if (get_state(frm).require_photo_for_checkin !== false) {
+      await capture_and_attach(frm, 'check_in_photo');
+    }
     await frm.call('check_in');
     await frm.reload_doc();
   },
   async check_out(frm) {
     await ensure_saved(frm);
-    await capture_and_attach(frm, 'check_out_photo');
+    if (get_state(frm).require_photo_for_checkout !== false) {
+      await capture_and_attach(frm, 'check_out_photo');
+    }
     await frm.call('check_out');
     await frm.reload_doc();
   },
 });
 
+// Activity lives in Visit Activity (not in the document). The first page arrives with the document
+// load (vm_state.timeline); only "Load more" asks the server for the next one.
+async function render_activity(frm, before) {
+  const field = frm.get_field('activity_html');
+  if (!field) return;
+  const $wrapper = field.$wrapper;
+  if (frm.is_new()) {
+    $wrapper.empty();
+    return;
+  }
+  let page = !before && get_state(frm).timeline;
+  if (!page) {
+    const r = await frappe.call({
+      method: 'visit_management.activity.get_visit_timeline',
+      args: { visit: frm.doc.name, limit: 20, before: before || null },
+    });
+    page = (r && r.message) || { items: [] };
+  }
+  if (!before) {
+    $wrapper.html('<div class="vm-activity"><ul class="list-unstyled vm-activity-items"></ul></div>');
+  }
+  const $items = $wrapper.find('.vm-activity-items');
+  $wrapper.find('.vm-activity-more').remove();
+  page.items.forEach((row) => {
+    $('<li class="text-muted small">')
+      .text(`${frappe.datetime.str_to_user(row.timestamp)} · ${row.activity} · ${row.user}`)
+      .appendTo($items);
+  });
+  if (!before && !page.items.length) {
+    $items.append(`<li class="text-muted small">${__('No activity yet')}</li>`);
+  }
+  if (page.next) {
+    $(`<a class="vm-activity-more small">${__('Load more')}</a>`)
+      .on('click', () => render_activity(frm, page.next))
+      .appendTo($wrapper.find('.vm-activity'));
+  }
+}
+
+function get_state(frm) {
+  return (frm.doc.__onload && frm.doc.__onload.vm_state) || {};
+}
+
 async function ensure_saved(frm) {
   if (frm.is_new() || frm.is_dirty()) {
     await frm.save();
@@ -5,10 +5,23 @@ from frappe import whitelist
 from frappe.model.document import Document
 from frappe.utils import now_datetime
 from visit_management.visit_management.settings_utils import (
+	get_settings,
 	is_photo_required,
 	require_geolocation_on_completion,
 	is_checkin_mandatory_for_user,
 )
+from visit_management.activity import log_visit_activity, timeline_page
+from visit_management.client_address import get_default_address
+from visit_management.hr_sync import (
+	ensure_attendance,
+	hr_mode,
+	insert_employee_checkin,
+	queue_hr_event,
+	stamp_attendance,
+)
+from visit_management.profiling import profiled, stage
+from visit_management.realtime import kpi_snapshot, publish_visit_event
+from visit_management.visit_stats import apply_visit_delta, snapshot
 
 
 class Visit(Document):
@@ -128,6 +141,7 @@ class Visit(Document):
 		except Exception:
 			return None
 
+	@profiled("visit.validate")
 	def validate(self):
 		# ensure a client is linked (dynamic)
 		if not self.client:
@@ -182,118 +196,94 @@ class Visit(Document):
 			frappe.throw("Report Summary is required upon completion of a Visit.")
 	
 	# Attendance integration: Check-in/Check-out
-	def _get_employee(self) -> str:
+	def _get_employee(self, throw: bool = True) -> str | None:
 		"""Resolve Employee for the visit: prefer assigned_to's employee, else session user.
 
-		Returns Employee name or throws if not found.
+		Returns Employee name; throws if not found (returns None with throw=False).
 		"""
 		user = self.assigned_to or frappe.session.user
 		emp = frappe.db.get_value("Employee", {"user_id": user}, "name")
-		if not emp:
+		if not emp and throw:
 			frappe.throw("No Employee linked to user {0}. Please link an Employee to proceed.".format(user))
 		return emp
 
 	def _ensure_attendance(self, emp: str, when=None):
-		from frappe.utils import getdate
-		when = when or now_datetime()
-		att_name = frappe.db.get_value(
-			"Attendance",
-			{"employee": emp, "attendance_date": getdate(when)},
-			"name",
-		)
-		if att_name:
-			return frappe.get_doc("Attendance", att_name)
-		# Create a basic attendance if not exists
-		att = frappe.get_doc({
-			"doctype": "Attendance",
-			"employee": emp,
-			"attendance_date": getdate(when),
-			"status": "Present",
-		})
-		att.insert(ignore_permissions=True)
-		return att
+		return ensure_attendance(emp, when)
+
+	def _write_hr_event(self, mode: str, emp: str | None, when, log_type: str) -> dict:
+		"""Write a check-in/out to HRMS according to the HR integration mode (see hr_sync)."""
+		if mode == "Off":
+			return {}
+		if mode == "Queued":
+			# committed with the Visit; Employee Checkin and Attendance follow from the employee's queue
+			return {"hr_event": queue_hr_event(self.name, emp, when, log_type)}
+		prefix = "visit.check_in" if log_type == "IN" else "visit.check_out"
+		with stage(f"{prefix}.employee_checkin"):
+			checkin = insert_employee_checkin(emp, when, log_type)
+		with stage(f"{prefix}.attendance"):
+			stamp_attendance(emp, when, log_type)
+		return {"employee_checkin": checkin}
 
 	@whitelist()
+	@profiled("visit.check_in")
 	def check_in(self):
-		"""Create Employee Checkin (IN) and set check_in_time; ensure Attendance."""
+		"""Set check_in_time and record the IN with HRMS (Employee Checkin + Attendance, inline or queued)."""
 		if self.check_in_time:
 			frappe.throw("Already checked in.")
 		if is_photo_required(checkout=False) and not self.get("check_in_photo"):
 			frappe.throw("Attendance photo is required for Check-in.")
-		emp = self._get_employee()
+		mode = hr_mode()
+		emp = self._get_employee() if mode != "Off" else None
 		when = now_datetime()
-		# Employee Checkin (HRMS)
-		ecin = frappe.get_doc({
-			"doctype": "Employee Checkin",
-			"employee": emp,
-			"time": when,
-			"log_type": "IN",
-			"device_id": "Visit",
-			"skip_auto_attendance": 0,
-		})
-		ecin.insert(ignore_permissions=True)
-		# Update visit and attendance
+		hr = self._write_hr_event(mode, emp, when, "IN")
+		kpi_before = kpi_snapshot(self)
 		self.db_set("check_in_time", when)
-		att = self._ensure_attendance(emp, when)
-		meta = frappe.get_meta("Attendance")
-		if meta.has_field("in_time") and not att.get("in_time"):
-			att.db_set("in_time", when)
-		# Log entry
-		try:
-			self.append("visit_logs", {"timestamp": when, "activity": "Check-in", "user": frappe.session.user})
-			self.save(ignore_permissions=True)
-		except Exception:
-			pass
+		with stage("visit.check_in.log"):
+			log_visit_activity(self.name, "Check-in", when)
+		publish_visit_event(self, "check_in", before=kpi_before)
 		return {
 			"employee": emp,
 			"check_in_time": when,
-			"employee_checkin": ecin.name,
+			"employee_checkin": hr.get("employee_checkin"),
+			"hr_event": hr.get("hr_event"),
 		}
 
 	@whitelist()
+	@profiled("visit.check_out")
 	def check_out(self):
-		"""Create Employee Checkin (OUT) and set check_out_time; update Attendance."""
+		"""Set check_out_time and duration and record the OUT with HRMS (inline or queued)."""
 		if not self.check_in_time:
 			frappe.throw("Check-in first before checking out.")
 		if self.check_out_time:
 			frappe.throw("Already checked out.")
 		if is_photo_required(checkout=True) and not self.get("check_out_photo"):
 			frappe.throw("Attendance photo is required for Check-out.")
-		emp = self._get_employee()
+		mode = hr_mode()
+		emp = self._get_employee() if mode != "Off" else None
 		when = now_datetime()
-		ecout = frappe.get_doc({
-			"doctype": "Employee Checkin",
-			"employee": emp,
-			"time": when,
-			"log_type": "OUT",
-			"device_id": "Visit",
-			"skip_auto_attendance": 0,
-		})
-		ecout.insert(ignore_permissions=True)
+		hr = self._write_hr_event(mode, emp, when, "OUT")
+		kpi_before = kpi_snapshot(self)
 		self.db_set("check_out_time", when)
-		att = self._ensure_attendance(emp, when)
-		meta = frappe.get_meta("Attendance")
-		if meta.has_field("out_time"):
-			att.db_set("out_time", when)
 		# compute and persist duration
 		try:
 			if self.get("check_in_time") and self.get("check_out_time"):
 				start = self.get("check_in_time")
 				end = self.get("check_out_time")
 				mins = max(0, int((end - start).total_seconds() // 60))
+				# db_set bypasses on_update, so move the duration in the daily rollup explicitly
+				before = snapshot(self)
 				self.db_set("visit_duration_minutes", mins)
+				apply_visit_delta(before, self)
 		except Exception:
 			pass
-		# Log entry
-		try:
-			self.append("visit_logs", {"timestamp": when, "activity": "Check-out", "user": frappe.session.user})
-			self.save(ignore_permissions=True)
-		except Exception:
-			pass
+		with stage("visit.check_out.log"):
+			log_visit_activity(self.name, "Check-out", when)
+		publish_visit_event(self, "check_out", before=kpi_before)
 		return {
 			"employee": emp,
 			"check_out_time": when,
-			"employee_checkin": ecout.name,
+			"employee_checkin": hr.get("employee_checkin"),
+			"hr_event": hr.get("hr_event"),
 		}
 
 	@whitelist()
@@ -313,6 +303,50 @@ class Visit(Document):
 			pass
 		return mv
 
+	def onload(self):
+		# ship the derived UI state with the document load so the form needs no follow-up calls
+		self.set_onload("vm_state", self.get_ui_state())
+
+	def get_ui_state(self) -> dict:
+		"""Derived form state computed in one server pass: settings flags, address, employee,
+		linked Maintenance Visit status, the actions available to the current user and the first
+		activity page."""
+		user = frappe.session.user
+		settings = get_settings()
+
+		mv_status = None
+		if self.get("maintenance_visit"):
+			mv_status = frappe.db.get_value(
+				"Maintenance Visit", self.maintenance_visit, ["completion_status", "docstatus"], as_dict=True
+			)
+
+		can_write = self.is_new() or self.has_permission("write")
+		is_maintenance = (self.get("subject") or "").strip().lower() == "maintenance"
+		actions = {
+			"check_in": bool(can_write and not self.is_new() and not self.get("check_in_time")),
+			"check_out": bool(can_write and self.get("check_in_time") and not self.get("check_out_time")),
+			"create_maintenance_visit": bool(
+				can_write
+				and is_maintenance
+				and self.get("client_type") == "Customer"
+				and self.get("status") == "Completed"
+				and not self.get("maintenance_visit")
+			),
+		}
+		return {
+			"require_photo_for_checkin": bool(settings.get("require_photo_for_checkin")),
+			"require_photo_for_checkout": bool(settings.get("require_photo_for_checkout")),
+			"require_geolocation": bool(settings.get("require_geolocation")),
+			"checkin_mandatory": is_checkin_mandatory_for_user(user),
+			# cached per client (client_address), so only a missing address costs a lookup
+			"default_address": self.get("address") or get_default_address(self.get("client_type"), self.get("client")),
+			"employee": self._get_employee(throw=False),
+			"maintenance_visit_status": mv_status,
+			"can_write": bool(can_write),
+			"actions": actions,
+			"timeline": None if self.is_new() else timeline_page(self.name),
+		}
+
 	# Expose address fetch as a doc method for run_doc_method compatibility
 	@whitelist()
 	def get_client_default_address(self, client_type: str | None = None, client: str | None = None):
@@ -320,6 +354,51 @@ class Visit(Document):
 		return _fetch(client_type or self.client_type, client or self.client)
 
 
+def on_doctype_update():
+	# last-visit lookups group completed Visits per client
+	frappe.db.add_index("Visit", ["client_type", "client", "status"])
+	# the archive job picks old Completed/Cancelled Visits in schedule order
+	frappe.db.add_index("Visit", ["status", "scheduled_time"])
+	# notes / report / maintenance text searched by visit_search.search_visits
+	from visit_management.visit_search import ensure_fulltext_index
+
+	ensure_fulltext_index()
+
+
+def _visit_access_scope(user: str, ptype: str | None = None) -> str:
+	"""How much of Visit the user's roles grant for ptype.
+
+	Returns "all" (role permission on every Visit), "owner" (role permission limited by "If Owner")
+	or "none" (no role permission; only assigned or shared Visits).
+	"""
+	if user == "Administrator":
+		return "all"
+	from frappe.permissions import get_role_permissions
+
+	ptype = ptype or "read"
+	perms = get_role_permissions(frappe.get_meta("Visit"), user=user)
+	if not (perms.get(ptype) or (ptype == "read" and perms.get("select"))):
+		return "none"
+	if ptype in (perms.get("if_owner") or {}):
+		return "owner"
+	return "all"
+
+
+def _is_visit_allowed(row, user: str, scope: str, shared: set | None = None) -> bool:
+	"""Row-level rule shared by has_permission and the batch/SQL variants.
+
+	`row` needs name, owner and assigned_to. Assigned user always has access; otherwise the
+	role scope decides, and documents shared with the user stay accessible.
+	"""
+	if scope == "all":
+		return True
+	if row.get("assigned_to") and row.get("assigned_to") == user:
+		return True
+	if scope == "owner" and row.get("owner") == user:
+		return True
+	return bool(shared and row.get("name") in shared)
+
+
 @whitelist()
 def has_permission(doc, ptype=None, user=None):
 	"""Custom permission: assigned user or system manager gets access in addition to role permissions.
@@ -337,54 +416,95 @@ def has_permission(doc, ptype=None, user=None):
 			return True
 	except Exception:
 		pass
-	# fallback to role-based permissions
-	return frappe.has_permission(doctype=doc.doctype, ptype=ptype, doc=doc, user=user)
+	# fallback to role-based permissions; evaluated here rather than through frappe.has_permission,
+	# which would call this hook again
+	scope = _visit_access_scope(user, ptype)
+	if scope == "all":
+		return True
+	shared = set(frappe.share.get_shared("Visit", user, rights=[ptype or "read"]))
+	return _is_visit_allowed(doc, user, scope, shared)
+
+
+def get_permission_query_conditions(user=None, doctype=None):
+	"""SQL counterpart of has_permission for list, report and count queries.
+
+	Frappe ANDs this with its own role conditions: the owner constraint of "If Owner" roles, and
+	for users without any role permission, the documents shared with them. Shared documents are
+	therefore part of the condition too, so the result is the same set has_permission allows.
+	"""
+	user = user or frappe.session.user
+	scope = _visit_access_scope(user)
+	if scope == "all":
+		return ""
+	rules = [f"`tabVisit`.`assigned_to` = {frappe.db.escape(user)}"]
+	if scope == "owner":
+		rules.append(f"`tabVisit`.`owner` = {frappe.db.escape(user)}")
+	shared = frappe.share.get_shared("Visit", user)
+	if shared:
+		rules.append(f"`tabVisit`.`name` in ({', '.join(frappe.db.escape(n) for n in shared)})")
+	return f"({' or '.join(rules)})"
+
+
+@whitelist()
+def get_form_bootstrap(name: str) -> dict:
+	"""Return a Visit and its derived UI state (see Visit.get_ui_state) in one round-trip."""
+	doc = frappe.get_doc("Visit", name)
+	doc.check_permission("read")
+	return {"doc": doc.as_dict(), "state": doc.get_ui_state()}
 
 
 @whitelist()
 def has_permission_api(name: str, ptype: str | None = None, user: str | None = None) -> bool:
 	"""RPC-friendly wrapper to check permission by document name."""
-	doc = frappe.get_doc("Visit", name)
-	return has_permission(doc, ptype=ptype, user=user)
+	return bool(has_permission_batch([name], ptype=ptype, user=user).get(name))
+
+
+# Upper bound on names per has_permission_batch call
+MAX_PERMISSION_BATCH = 5000
+
+
+@whitelist()
+def has_permission_batch(names, ptype: str | None = None, user: str | None = None) -> dict:
+	"""Check `ptype` on many Visits at once; returns {name: bool}.
+
+	Same rule as has_permission, but reads only name/owner/assigned_to in one query (plus one
+	query for shares when the role scope needs it) instead of loading each Visit.
+	Names that do not exist map to False.
+	"""
+	names = frappe.parse_json(names) if isinstance(names, str) else names
+	names = list(dict.fromkeys(n for n in (names or []) if n))
+	if len(names) > MAX_PERMISSION_BATCH:
+		frappe.throw(f"At most {MAX_PERMISSION_BATCH} Visits can be checked per call.")
+	session_user = frappe.session.user
+	user = user or session_user
+	if user != session_user and "System Manager" not in frappe.get_roles(session_user):
+		frappe.throw("Not permitted to check permissions for another user.", frappe.PermissionError)
+
+	result = dict.fromkeys(names, False)
+	if not names:
+		return result
+	rows = frappe.get_all(
+		"Visit",
+		filters={"name": ["in", names]},
+		fields=["name", "owner", "assigned_to"],
+		limit_page_length=0,
+	)
+	scope = _visit_access_scope(user, ptype)
+	shared = None
+	if scope != "all":
+		shared = set(
+			frappe.share.get_shared("Visit", user, rights=[ptype or "read"], filters=[["share_name", "in", names]])
+		)
+	for row in rows:
+		result[row.name] = _is_visit_allowed(row, user, scope, shared)
+	return result
 
 
 @whitelist()
 def get_client_default_address(client_type: str, client: str) -> str | None:
 	"""Return a default Address name for the given client, if any.
 
-	Tries to find an Address linked via Address Link child table.
-	Prefers primary addresses, falls back to first found.
+	Looks up Addresses linked via Dynamic Link, preferring primary addresses. Answers are cached
+	per client and invalidated when an Address or its links change.
 	"""
-	if not client_type or not client:
-		return None
-	# Best-effort query via child table filters
-	try:
-		# Prefer primary address
-		rows = frappe.get_all(
-			"Address",
-			filters={
-				"links.link_doctype": client_type,
-				"links.link_name": client,
-				"is_primary_address": 1,
-			},
-			fields=["name"],
-			limit=1,
-		)
-		if rows:
-			return rows[0]["name"]
-		# Any address
-		rows = frappe.get_all(
-			"Address",
-			filters={
-				"links.link_doctype": client_type,
-				"links.link_name": client,
-			},
-			fields=["name"],
-			limit=1,
-		)
-		if rows:
-			return rows[0]["name"]
-	except Exception:
-		# Some DB backends may not support child table filtering this way; ignore errors
-		pass
-	return None
+	return get_default_address(client_type, client)
@@ -0,0 +1,13 @@
+from __future__ import annotations
+
+import frappe
+from frappe.model.document import Document
+
+
+class VisitActivity(Document):
+    pass
+
+
+def on_doctype_update():
+    # the timeline reads one Visit's activity newest first
+    frappe.db.add_index("Visit Activity", ["visit", "timestamp"])
@@ -0,0 +1,15 @@
+from __future__ import annotations
+
+import frappe
+from frappe.model.document import Document
+
+
+class VisitArchive(Document):
+    pass
+
+
+def on_doctype_update():
+    # same access paths as the hot table: last visit per client, date windows, per-assignee lists
+    frappe.db.add_index("Visit Archive", ["client_type", "client", "status"])
+    frappe.db.add_index("Visit Archive", ["scheduled_time"])
+    frappe.db.add_index("Visit Archive", ["assigned_to", "scheduled_time"])
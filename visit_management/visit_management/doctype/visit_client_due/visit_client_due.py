@@ -0,0 +1,16 @@
+from __future__ import annotations
+
+import frappe
+from frappe.model.document import Document
+
+
+class VisitClientDue(Document):
+    """Rows are written by visit_management.visit_due; names are derived from (client type, client)."""
+
+    pass
+
+
+def on_doctype_update():
+    # reports filter by type/frequency/territory and page in due-date order; refreshes look up one client
+    frappe.db.add_index("Visit Client Due", ["client_type", "client"])
+    frappe.db.add_index("Visit Client Due", ["due_date"])
@@ -0,0 +1,9 @@
+from __future__ import annotations
+
+from frappe.model.document import Document
+
+
+class VisitDailyStat(Document):
+    """Rows are written by visit_management.visit_stats; names are derived from the rollup key."""
+
+    pass
@@ -0,0 +1,15 @@
+from __future__ import annotations
+
+import frappe
+from frappe.model.document import Document
+
+
+class VisitHREvent(Document):
+    pass
+
+
+def on_doctype_update():
+    # the worker reads "pending events of an employee in time order"; reconciliation reads by visit and by age
+    frappe.db.add_index("Visit HR Event", ["employee", "status", "event_time"])
+    frappe.db.add_index("Visit HR Event", ["visit", "log_type"])
+    frappe.db.add_index("Visit HR Event", ["status", "modified"])
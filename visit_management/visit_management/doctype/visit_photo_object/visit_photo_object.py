@@ -3,5 +3,5 @@ from __future__ import annotations
 from frappe.model.document import Document
 
 
-class VisitLog(Document):
+class VisitPhotoObject(Document):
     pass
@@ -0,0 +1,14 @@
+from __future__ import annotations
+
+import frappe
+from frappe.model.document import Document
+
+
+class VisitProfileSample(Document):
+    pass
+
+
+def on_doctype_update():
+    # the report reads "samples of a stage in a time window"; the purge reads by recorded_at
+    frappe.db.add_index("Visit Profile Sample", ["stage", "recorded_at"])
+    frappe.db.add_index("Visit Profile Sample", ["recorded_at"])
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import datetime
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from visit_management.tests.utils import (
+    BUDGET_SIZES,
+    QueryBudgetTestCase,
+    make_bulk_schedule,
+    make_customers,
+    skip_without_client_fields,
+)
+from visit_management.visit_management.doctype.weekly_schedule.weekly_schedule import approve_rows, detect_conflicts
+
+# A Monday far enough ahead to have no Planned Visits on a test site
+WEEK_START = datetime.date(2030, 1, 7)
+
+
+def make_schedule(rows: list[tuple[str, str]], user: str = "Administrator") -> str:
+    """Insert a Weekly Schedule with one Sales Call row per (day, time)."""
+    doc = frappe.get_doc({
+        "doctype": "Weekly Schedule",
+        "user": user,
+        "week_start": WEEK_START,
+        "status": "Draft",
+        "details": [{"day": day, "time": time, "purpose": "Sales Call"} for day, time in rows],
+    })
+    doc.insert(ignore_permissions=True)
+    return doc.name
+
+
+class TestWeeklySchedule(FrappeTestCase):
+    def test_conflicts_use_row_times(self):
+        # Time values are read back as timedelta; rows hours apart on one day must not collide
+        schedule = make_schedule([("Monday", "09:00:00"), ("Monday", "14:00:00"), ("Tuesday", "10:00:00"), ("Tuesday", "10:01:00")])
+        result = detect_conflicts(schedules=[schedule])
+
+        self.assertEqual([c["type"] for c in result["conflicts"]], ["rep_overlap"])
+        conflict = result["conflicts"][0]
+        self.assertEqual(conflict["start"], datetime.datetime(2030, 1, 8, 10, 0))
+        self.assertEqual(conflict["other"]["start"], datetime.datetime(2030, 1, 8, 10, 1))
+
+
+class TestWeeklyScheduleQueryBudgets(QueryBudgetTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        skip_without_client_fields()
+        cls.customers = make_customers(max(BUDGET_SIZES))
+
+    @classmethod
+    def tearDownClass(cls):
+        frappe.db.rollback()
+        super().tearDownClass()
+
+    def test_approve_rows(self):
+        # O(1) reads; the save updates each changed child row and logs one approval insert
+        for n in BUDGET_SIZES:
+            with self.subTest(n=n):
+                schedule = make_bulk_schedule(n, self.customers)
+                self.assertQueryBudget(lambda: approve_rows(schedule, create_visits=False), 15, 15 + 2 * n)
@@ -50,6 +50,29 @@ frappe.ui.form.on('Weekly Schedule', {
             });
         }
 
+        if (!frm.is_new()) {
+            frm.add_custom_button('Check Conflicts', () => {
+                frappe.call({
+                    method: 'visit_management.visit_management.doctype.weekly_schedule.weekly_schedule.detect_conflicts',
+                    args: { schedules: [frm.doc.name] },
+                }).then(r => {
+                    const conflicts = r?.message?.conflicts || [];
+                    if (!conflicts.length) {
+                        frappe.show_alert({message: 'No conflicts found.', indicator: 'green'});
+                        return;
+                    }
+                    const label = { rep_overlap: 'Overlaps', client_double_booked: 'Client also booked by' };
+                    const items = conflicts.map(c => {
+                        const other = c.other || {};
+                        const what = other.visit ? `Visit ${other.visit}` : `row of ${other.schedule}`;
+                        return `<li>${frappe.datetime.str_to_user(c.start)} ${frappe.utils.escape_html(c.client || '')}: `
+                            + `${label[c.type] || c.type} ${frappe.utils.escape_html(other.user || '')} (${frappe.utils.escape_html(what)})</li>`;
+                    });
+                    frappe.msgprint({title: 'Schedule Conflicts', message: `<ul>${items.join('')}</ul>`, indicator: 'orange'});
+                });
+            }, 'Actions');
+        }
+
         if (frm.doc.status === 'Draft') {
             frm.add_custom_button('Submit for Approval', () => {
                 frm.set_value('status', 'Pending Approval');
@@ -4,43 +4,135 @@ import frappe
 from frappe import _
 from frappe import whitelist
 from frappe.model.document import Document
-from frappe.utils import now_datetime
+from frappe.utils import cint, get_datetime, getdate, now_datetime
+from collections import defaultdict
 from datetime import datetime, timedelta, time as dtime, date as ddate
+from heapq import heappop, heappush
+
+from visit_management.client_address import get_default_addresses
+from visit_management.profiling import profiled, stage
 
 
 class WeeklySchedule(Document):
     def before_save(self):
         """Auto-manage parent status based on child approvals if not explicitly set."""
+        # approve_rows already reduced the rows in this request; don't walk them again
+        if self.flags.pop("status_reduced", False):
+            return
+        result = reduce_schedule_status(self)
+        self.status = result.status
+        if result.stamped:
+            _log_approval_events(self, result.stamped)
+
+
+def _is_schedule_manager(user: str | None = None) -> bool:
+    """Return True if the user is a Sales Manager or System Manager (memoized for the request)."""
+    user = user or frappe.session.user
+    cache = frappe.flags.setdefault("vm_schedule_manager", {})
+    if user not in cache:
         try:
-            # stamp approver metadata if missing and enforce role
-            is_manager = frappe.has_role("Sales Manager") or frappe.has_role("System Manager")
-            for row in (self.get("details") or []):
-                if row.get("approved") and not row.get("approved_by"):
-                    if not is_manager:
-                        frappe.throw(_("Only Sales Manager or System Manager can approve rows."), frappe.PermissionError)
-                    row.approved_by = frappe.session.user
-                    row.approved_on = now_datetime()
-
-            approved = [row for row in (self.get("details") or []) if row.get("approved")]
-            total = len(self.get("details") or [])
-            if total:
-                if len(approved) == 0 and self.status not in {"Draft", "Rejected"}:
-                    self.status = "Draft"
-                elif 0 < len(approved) < total:
-                    self.status = "Pending Approval"
-                elif len(approved) == total:
-                    self.status = "Approved"
+            roles = set(frappe.get_roles(user))
         except Exception:
-            pass
+            roles = set()
+        cache[user] = not roles.isdisjoint({"Sales Manager", "System Manager"})
+    return cache[user]
+
+
+def _status_for(current: str | None, approved: int, total: int) -> str | None:
+    if not total:
+        return current
+    if approved == 0:
+        return current if current in {"Draft", "Rejected"} else "Draft"
+    if approved < total:
+        return "Pending Approval"
+    return "Approved"
+
+
+def reduce_schedule_status(doc: Document, approve: bool | set[str] = False) -> frappe._dict:
+    """Walk the schedule rows once: approve/stamp rows, count approvals and derive the parent status.
+
+    Args:
+        doc: Weekly Schedule document; rows are updated in place, `doc.status` is not.
+        approve: True to approve every row, a set of row names to approve those rows, False for none.
+
+    Rows that are approved but not yet stamped get approved_by/approved_on; this requires the
+    Sales Manager or System Manager role, resolved at most once per request.
+
+    Returns a dict with total, approved, newly_approved, selected (rows matched by `approve`),
+    stamped (rows that received approver metadata now) and status.
+    """
+    user = frappe.session.user
+    approve_all = approve is True
+    picks = approve if isinstance(approve, (set, frozenset)) else None
+    now = None
+    total = approved = newly_approved = 0
+    selected = []
+    stamped = []
+    for row in doc.get("details") or []:
+        total += 1
+        is_approved = row.get("approved")
+        if approve_all or (picks and row.name in picks):
+            selected.append(row)
+            if not is_approved:
+                row.approved = is_approved = 1
+                newly_approved += 1
+        if not is_approved:
+            continue
+        approved += 1
+        if not row.get("approved_by"):
+            if not _is_schedule_manager(user):
+                frappe.throw(_("Only Sales Manager or System Manager can approve rows."), frappe.PermissionError)
+            now = now or now_datetime()
+            row.approved_by = user
+            row.approved_on = now
+            stamped.append(row)
+    return frappe._dict(
+        total=total,
+        approved=approved,
+        newly_approved=newly_approved,
+        selected=selected,
+        stamped=stamped,
+        status=_status_for(doc.get("status"), approved, total),
+    )
+
+
+def _log_approval_events(doc: Document, rows: list) -> int:
+    """Append one Weekly Schedule Approval event per row with a single bulk INSERT."""
+    if not rows:
+        return 0
+    now = now_datetime()
+    user = frappe.session.user
+    values = [
+        (
+            frappe.generate_hash(length=10),
+            now,
+            now,
+            user,
+            user,
+            doc.name,
+            row.name,
+            row.get("approved_by") or user,
+            row.get("approved_on") or now,
+            row.get("visit"),
+        )
+        for row in rows
+    ]
+    frappe.db.bulk_insert(
+        "Weekly Schedule Approval",
+        fields=["name", "creation", "modified", "owner", "modified_by", "schedule", "row", "approver", "approved_on", "visit"],
+        values=values,
+    )
+    return len(values)
+
+
+def _skip_version_on_approval() -> bool:
+    from visit_management.visit_management.settings_utils import get_settings
+
+    return bool(get_settings().get("skip_version_on_approval", True))
 
 
 def _ensure_manager_role(user: str | None = None):
-    user = user or frappe.session.user
-    try:
-        roles = set(frappe.get_roles(user))
-    except Exception:
-        roles = set()
-    if roles.isdisjoint({"Sales Manager", "System Manager"}):
+    if not _is_schedule_manager(user):
         frappe.throw(_("Only Sales Manager or System Manager can approve schedules."), frappe.PermissionError)
 
 
@@ -58,6 +150,9 @@ WEEKDAY_IDX = {
 def _to_time_obj(val) -> dtime:
     if isinstance(val, dtime):
         return val
+    # Time fields read with get_all / db.sql come back as the time since midnight
+    if isinstance(val, timedelta):
+        return (datetime.min + val).time()
     if isinstance(val, str) and val:
         # try HH:MM:SS then HH:MM
         for fmt in ("%H:%M:%S", "%H:%M"):
@@ -86,8 +181,16 @@ def _compute_scheduled_dt(week_start, day: str, tm) -> datetime:
     return datetime.combine(target_date, t)
 
 
-def _create_visit_from_row(schedule_doc: Document, row: Document) -> str | None:
-    """Create a Visit from the given Weekly Schedule Detail row. Returns Visit name or None."""
+def _row_addresses(rows) -> dict:
+    """Default Address per (client_type, client) for the given rows, resolved in one go."""
+    return get_default_addresses((row.get("client_type"), row.get("client")) for row in rows)
+
+
+def _create_visit_from_row(schedule_doc: Document, row: Document, addresses: dict | None = None) -> str | None:
+    """Create a Visit from the given Weekly Schedule Detail row. Returns Visit name or None.
+
+    `addresses` is an optional map from _row_addresses; the Visit's address is filled from it.
+    """
     # required fields for Visit
     if not (row.get("client_type") and row.get("client") and row.get("purpose")):
         return None
@@ -104,6 +207,10 @@ def _create_visit_from_row(schedule_doc: Document, row: Document) -> str | None:
         "subject": row.get("purpose"),
         "notes": row.get("notes") or "",
     })
+    if addresses:
+        address = addresses.get((row.get("client_type"), row.get("client")))
+        if address:
+            visit.set("address", address)
 
     # Maintenance-specific fields
     try:
@@ -121,6 +228,7 @@ def _create_visit_from_row(schedule_doc: Document, row: Document) -> str | None:
 
 
 @whitelist()
+@profiled("schedule.approve_rows")
 def approve_rows(schedule: str, rows: list[str] | None = None, create_visits: bool | None = None) -> dict:
     """Approve selected detail rows on a Weekly Schedule.
 
@@ -142,38 +250,28 @@ def approve_rows(schedule: str, rows: list[str] | None = None, create_visits: bo
         except Exception:
             auto_create = True
 
-    approved_count = 0
+    with stage("schedule.approve_rows.reduce"):
+        result = reduce_schedule_status(doc, approve=rows or True)
     created = []
-    for row in (doc.get("details") or []):
-        if rows and row.name not in rows:
-            continue
-        if not row.get("approved"):
-            row.approved = 1
-            row.approved_by = frappe.session.user
-            row.approved_on = now_datetime()
-            approved_count += 1
-        if auto_create and not row.get("visit"):
-            vname = _create_visit_from_row(doc, row)
-            if vname:
-                row.visit = vname
-                created.append(vname)
-
-    # update parent status
-    try:
-        total = len(doc.get("details") or [])
-        approved = len([r for r in (doc.get("details") or []) if r.get("approved")])
-        if total and approved == total:
-            doc.status = "Approved"
-        elif approved > 0:
-            doc.status = "Pending Approval"
-        else:
-            doc.status = "Draft"
-    except Exception:
-        pass
+    if auto_create:
+        with stage("schedule.approve_rows.create_visits"):
+            pending = [row for row in result.selected if not (row.get("visit") or row.get("archived_visit"))]
+            addresses = _row_addresses(pending)
+            for row in pending:
+                vname = _create_visit_from_row(doc, row, addresses)
+                if vname:
+                    row.visit = vname
+                    created.append(vname)
 
-    doc.save(ignore_permissions=True)
+    doc.status = result.status
+    doc.flags.status_reduced = True
+    # approvals are audited in Weekly Schedule Approval; a full Version diff of every row adds nothing
+    doc.flags.ignore_version = _skip_version_on_approval()
+    with stage("schedule.approve_rows.save"):
+        doc.save(ignore_permissions=True)
+        _log_approval_events(doc, result.stamped)
     return {
-        "approved": approved_count,
+        "approved": result.newly_approved,
         "created": created,
         "status": doc.status,
     }
@@ -186,15 +284,186 @@ def create_visits_for_approved_rows(schedule: str) -> dict:
     doc = frappe.get_doc("Weekly Schedule", schedule)
     created = []
     skipped = []
+    pending = []
     for row in (doc.get("details") or []):
         if not row.get("approved"):
             continue
-        if row.get("visit"):
+        if row.get("visit") or row.get("archived_visit"):
             skipped.append(row.get("name"))
             continue
-        vname = _create_visit_from_row(doc, row)
+        pending.append(row)
+    addresses = _row_addresses(pending)
+    for row in pending:
+        vname = _create_visit_from_row(doc, row, addresses)
         if vname:
             row.visit = vname
             created.append(vname)
+    doc.flags.ignore_version = _skip_version_on_approval()
     doc.save(ignore_permissions=True)
     return {"created": created, "skipped": skipped}
+
+
+@whitelist()
+def get_approval_history(schedule: str, start: int = 0, page_length: int = 50) -> list[dict]:
+    """Return approval events for a Weekly Schedule, newest first (paginated)."""
+    frappe.has_permission("Weekly Schedule", "read", doc=schedule, throw=True)
+    return frappe.get_all(
+        "Weekly Schedule Approval",
+        filters={"schedule": schedule},
+        fields=["row", "approver", "approved_on", "visit"],
+        order_by="approved_on desc",
+        start=cint(start),
+        page_length=min(cint(page_length) or 50, 500),
+        ignore_permissions=True,
+    )
+
+
+def _overlapping_pairs(intervals: list[dict]) -> list[tuple[dict, dict]]:
+    """Return all overlapping pairs among intervals sharing the same `key`.
+
+    Uses a sorted sweep per key with a min-heap of active end times, so the cost is
+    O(n log n + k) for n intervals and k overlaps instead of comparing every pair.
+    Intervals touching at an endpoint (one ends when the next starts) do not overlap.
+    """
+    groups = defaultdict(list)
+    for iv in intervals:
+        groups[iv["key"]].append(iv)
+
+    pairs = []
+    for items in groups.values():
+        if len(items) < 2:
+            continue
+        items.sort(key=lambda iv: (iv["start"], iv["end"]))
+        active = []  # heap of (end, index into items)
+        for idx, iv in enumerate(items):
+            while active and active[0][0] <= iv["start"]:
+                heappop(active)
+            for _end, other in active:
+                pairs.append((items[other], iv))
+            heappush(active, (iv["end"], idx))
+    return pairs
+
+
+def _interval_ref(iv: dict) -> dict:
+    return {
+        k: iv.get(k)
+        for k in ("source", "schedule", "row", "visit", "user", "client_type", "client", "start", "end")
+        if iv.get(k) is not None
+    }
+
+
+@whitelist()
+def detect_conflicts(week_start: str | None = None, schedules: list[str] | str | None = None, users: list[str] | str | None = None) -> dict:
+    """Detect overlapping bookings for a team's week in one call.
+
+    Each schedule row becomes an interval from its computed date/time to time plus the
+    `default_visit_duration` setting; existing Planned Visits get the same duration. Reports:
+
+    - rep_overlap: a row overlaps another row or a Planned Visit of the same user
+    - client_double_booked: a row overlaps a row or Planned Visit of another user for the same client
+
+    Args:
+        week_start: load every Weekly Schedule starting on this date (team view).
+        schedules: explicit Weekly Schedule names (list or JSON); used instead of week_start.
+        users: optional list of users to restrict to.
+
+    Non-managers only see their own schedules.
+    """
+    schedules = frappe.parse_json(schedules) if isinstance(schedules, str) else schedules
+    users = frappe.parse_json(users) if isinstance(users, str) else users
+    if not (week_start or schedules):
+        frappe.throw(_("Provide a Week Start or one or more Weekly Schedules."))
+
+    if not _is_schedule_manager():
+        users = [frappe.session.user]
+
+    filters = {"name": ["in", list(schedules)]} if schedules else {"week_start": getdate(week_start)}
+    if users:
+        filters["user"] = ["in", list(users)]
+    parents = {
+        p.name: p
+        for p in frappe.get_all("Weekly Schedule", filters=filters, fields=["name", "user", "week_start"])
+    }
+    if not parents:
+        return {"week_start": week_start, "conflicts": []}
+
+    from visit_management.visit_management.settings_utils import get_settings
+
+    duration = timedelta(minutes=cint(get_settings().get("default_visit_duration")) or 60)
+
+    rows = frappe.get_all(
+        "Weekly Schedule Detail",
+        filters={"parenttype": "Weekly Schedule", "parent": ["in", list(parents)]},
+        fields=["name", "parent", "day", "time", "client_type", "client", "visit"],
+    )
+
+    intervals = []
+    linked_visits = set()
+    for r in rows:
+        parent = parents[r.parent]
+        start = _compute_scheduled_dt(parent.week_start, r.day, r.time)
+        intervals.append({
+            "source": "schedule",
+            "schedule": r.parent,
+            "row": r.name,
+            "user": parent.user,
+            "client_type": r.client_type,
+            "client": r.client,
+            "start": start,
+            "end": start + duration,
+        })
+        if r.visit:
+            linked_visits.add(r.visit)
+
+    window_start = min(iv["start"] for iv in intervals) - duration if intervals else None
+    window_end = max(iv["end"] for iv in intervals) if intervals else None
+    if intervals:
+        for v in frappe.get_all(
+            "Visit",
+            filters={
+                "status": "Planned",
+                "scheduled_time": ["between", [window_start, window_end]],
+            },
+            fields=["name", "assigned_to", "client_type", "client", "scheduled_time"],
+        ):
+            if v.name in linked_visits:
+                continue
+            start = get_datetime(v.scheduled_time)
+            intervals.append({
+                "source": "visit",
+                "visit": v.name,
+                "user": v.assigned_to,
+                "client_type": v.client_type,
+                "client": v.client,
+                "start": start,
+                "end": start + duration,
+            })
+
+    team_users = {p.user for p in parents.values()}
+    conflicts = []
+
+    # Same rep booked twice
+    rep_intervals = [dict(iv, key=iv["user"]) for iv in intervals if iv["user"] in team_users]
+    for a, b in _overlapping_pairs(rep_intervals):
+        if a["source"] == "visit" and b["source"] == "visit":
+            continue
+        row, other = (a, b) if a["source"] == "schedule" else (b, a)
+        conflicts.append({"type": "rep_overlap", **_interval_ref(row), "other": _interval_ref(other)})
+
+    # Same client booked by different reps
+    client_intervals = [
+        dict(iv, key=(iv["client_type"], iv["client"])) for iv in intervals if iv.get("client_type") and iv.get("client")
+    ]
+    for a, b in _overlapping_pairs(client_intervals):
+        if a["user"] == b["user"] or (a["source"] == "visit" and b["source"] == "visit"):
+            continue
+        row, other = (a, b) if a["source"] == "schedule" else (b, a)
+        conflicts.append({"type": "client_double_booked", **_interval_ref(row), "other": _interval_ref(other)})
+
+    conflicts.sort(key=lambda c: (c["start"], c["type"]))
+    return {
+        "week_start": week_start,
+        "schedules": sorted(parents),
+        "duration_minutes": int(duration.total_seconds() // 60),
+        "conflicts": conflicts,
+    }
@@ -0,0 +1,13 @@
+from __future__ import annotations
+
+import frappe
+from frappe.model.document import Document
+
+
+class WeeklyScheduleApproval(Document):
+    pass
+
+
+def on_doctype_update():
+    # history reads are "events for a schedule, newest first"
+    frappe.db.add_index("Weekly Schedule Approval", ["schedule", "approved_on"])
@@ -1,4 +1,4 @@
 # This report reuses the same logic as the former 'Visit Frequency Due'
-# Only the report name is different.
+# Only the report name (and the default of its "Overdue Only" filter) is different.
 
-from .visit_frequency_due import execute  # type: ignore
+from visit_management.visit_management.report.visit_frequency_due.visit_frequency_due import execute  # noqa: F401
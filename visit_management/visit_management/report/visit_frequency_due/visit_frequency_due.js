@@ -0,0 +1,10 @@
+frappe.query_reports['Visit Frequency Due'] = {
+  filters: [
+    { fieldname: 'client_type', label: __('Client Type'), fieldtype: 'Select', options: '\nCustomer\nCRM Organization' },
+    { fieldname: 'visit_frequency', label: __('Frequency'), fieldtype: 'Select', options: '\nWeekly\nBiweekly\nMonthly\nQuarterly\nSemiannual\nAnnual' },
+    { fieldname: 'territory', label: __('Territory'), fieldtype: 'Data' },
+    { fieldname: 'overdue_only', label: __('Overdue Only'), fieldtype: 'Check', default: 0 },
+    { fieldname: 'page', label: __('Page'), fieldtype: 'Int', default: 1 },
+    { fieldname: 'page_length', label: __('Rows per Page'), fieldtype: 'Int', default: 500 },
+  ],
+};
@@ -0,0 +1,7 @@
+frappe.query_reports['Visit Stage Timings'] = {
+  filters: [
+    { fieldname: 'from_date', label: __('From'), fieldtype: 'Datetime', default: frappe.datetime.add_days(frappe.datetime.now_datetime(), -1) },
+    { fieldname: 'to_date', label: __('To'), fieldtype: 'Datetime', default: frappe.datetime.now_datetime() },
+    { fieldname: 'stage', label: __('Stage (prefix)'), fieldtype: 'Data' },
+  ],
+};
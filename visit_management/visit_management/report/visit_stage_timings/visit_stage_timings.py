@@ -0,0 +1,62 @@
+import math
+
+import frappe
+from frappe.utils import add_days, get_datetime, now_datetime
+
+
+def _percentile(sorted_values, pct: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def execute(filters=None):
+    filters = frappe._dict(filters or {})
+    cols = [
+        {"fieldname": "stage", "label": "Stage", "fieldtype": "Data", "width": 260},
+        {"fieldname": "samples", "label": "Samples", "fieldtype": "Int", "width": 90},
+        {"fieldname": "p50", "label": "p50 (ms)", "fieldtype": "Float", "precision": 1, "width": 100},
+        {"fieldname": "p95", "label": "p95 (ms)", "fieldtype": "Float", "precision": 1, "width": 100},
+        {"fieldname": "p99", "label": "p99 (ms)", "fieldtype": "Float", "precision": 1, "width": 100},
+        {"fieldname": "max", "label": "Max (ms)", "fieldtype": "Float", "precision": 1, "width": 100},
+        {"fieldname": "avg_queries", "label": "Avg Queries", "fieldtype": "Float", "precision": 1, "width": 110},
+    ]
+
+    conditions = ["recorded_at between %(from_date)s and %(to_date)s"]
+    values = {
+        "from_date": get_datetime(filters.from_date) if filters.from_date else add_days(now_datetime(), -1),
+        "to_date": get_datetime(filters.to_date) if filters.to_date else now_datetime(),
+    }
+    if filters.stage:
+        conditions.append("stage like %(stage)s")
+        values["stage"] = f"{filters.stage}%"
+
+    durations, queries = {}, {}
+    for stage, duration_ms, query_count in frappe.db.sql(
+        f"""
+        select stage, duration_ms, query_count
+        from `tabVisit Profile Sample`
+        where {" and ".join(conditions)}
+        """,
+        values,
+    ):
+        durations.setdefault(stage, []).append(duration_ms or 0.0)
+        queries[stage] = queries.get(stage, 0) + (query_count or 0)
+
+    data = []
+    for stage in sorted(durations):
+        ds = sorted(durations[stage])
+        data.append(
+            {
+                "stage": stage,
+                "samples": len(ds),
+                "p50": _percentile(ds, 50),
+                "p95": _percentile(ds, 95),
+                "p99": _percentile(ds, 99),
+                "max": ds[-1],
+                "avg_queries": queries[stage] / len(ds),
+            }
+        )
+    return cols, data
@@ -7,15 +7,27 @@ def get_settings() -> dict:
     """Return Visit Management Settings as a dict; safe defaults if missing."""
     defaults = {
         "enable_hr_integration": True,
+        "hr_integration_mode": "Synchronous",
         "require_photo_for_checkin": True,
         "require_photo_for_checkout": True,
         "require_geolocation": False,
         "default_visit_duration": 60,
         "auto_create_visits_from_schedule": True,
+        "skip_version_on_approval": True,
         "enable_visit_notifications": True,
         "enable_image_compression": True,
         "image_max_dimension": 1280,
         "image_quality": 80,
+        "photo_tier_after_days": 0,
+        "object_store_backend": "Local",
+        "object_store_path": "object_store",
+        "object_store_bucket": "visit-photos",
+        "object_store_endpoint": None,
+        "object_store_region": None,
+        "object_store_access_key": None,
+        "archive_after_days": 0,
+        "roll_due_dates_to_working_day": False,
+        "holiday_company": None,
     }
     try:
         if frappe.db.exists("DocType", "Visit Management Settings"):
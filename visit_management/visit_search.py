@@ -0,0 +1,155 @@
+"""Full-text search over Visit notes, report summaries and maintenance details.
+
+The text fields share one native full-text index (MariaDB FULLTEXT, PostgreSQL GIN over a tsvector),
+which the database keeps current on every Visit write. `search_visits` turns a phrase into a
+prefix/phrase query, ranks by the index's relevance score, applies the Visit permission rule
+(with shares) in SQL and returns a highlighted snippet per hit.
+"""
+
+from __future__ import annotations
+
+import html
+import re
+
+import frappe
+from frappe import whitelist
+from frappe.utils import add_days, cint, getdate
+
+from visit_management.visit_management.doctype.visit.visit import get_permission_query_conditions
+
+SEARCH_FIELDS = ("notes", "report_summary", "maintenance_details", "mv_problem_reported", "mv_work_done")
+INDEX_NAME = "vm_visit_fulltext"
+# InnoDB ignores shorter words (innodb_ft_min_token_size); requiring them would match nothing
+MIN_TERM_LENGTH = 3
+MAX_PAGE_LENGTH = 100
+# Characters of context shown around the first match
+SNIPPET_LENGTH = 160
+_TOKEN = re.compile(r'"([^"]+)"|(\w+)', re.UNICODE)
+
+
+def _pg_document() -> str:
+    return "to_tsvector('simple', concat_ws(' ', {}))".format(", ".join(f'"{f}"' for f in SEARCH_FIELDS))
+
+
+def ensure_fulltext_index() -> bool:
+    """Create the full-text index over SEARCH_FIELDS if missing; True when it was created."""
+    if frappe.db.db_type == "postgres":
+        if frappe.db.sql("select 1 from pg_indexes where tablename = 'tabVisit' and indexname = %s", INDEX_NAME):
+            return False
+        frappe.db.sql_ddl(f'create index "{INDEX_NAME}" on "tabVisit" using gin (({_pg_document()}))')
+        return True
+    if frappe.db.sql("show index from `tabVisit` where Key_name = %s", INDEX_NAME):
+        return False
+    frappe.db.sql_ddl(
+        f"alter table `tabVisit` add fulltext index `{INDEX_NAME}` ({', '.join(f'`{f}`' for f in SEARCH_FIELDS)})"
+    )
+    return True
+
+
+def parse_query(query: str) -> list[tuple[str, bool]]:
+    """(text, is_phrase) terms of a search box query: "quoted phrases" and words of MIN_TERM_LENGTH+."""
+    terms = []
+    for phrase, word in _TOKEN.findall(query or ""):
+        if phrase:
+            words = re.findall(r"\w+", phrase)
+            if words:
+                terms.append((" ".join(words), True))
+        elif len(word) >= MIN_TERM_LENGTH:
+            terms.append((word, False))
+    return terms
+
+
+def _match_sql(terms: list[tuple[str, bool]]) -> tuple[str, str, str]:
+    """(condition, score expression, bound query) requiring every term; words match as prefixes."""
+    if frappe.db.db_type == "postgres":
+        parts = [" <-> ".join(text.split()) if phrase else f"{text}:*" for text, phrase in terms]
+        document = _pg_document()
+        query = "to_tsquery('simple', %(q)s)"
+        return f"{document} @@ {query}", f"ts_rank({document}, {query})", " & ".join(f"({p})" for p in parts)
+    match = f"match({', '.join(f'`{f}`' for f in SEARCH_FIELDS)}) against (%(q)s in boolean mode)"
+    bound = " ".join(f'+"{text}"' if phrase else f"+{text}*" for text, phrase in terms)
+    return match, match, bound
+
+
+def highlight(text: str | None, terms: list[tuple[str, bool]], length: int = SNIPPET_LENGTH) -> str | None:
+    """HTML-escaped window of `text` around the first match, matches wrapped in <mark>; None if no match."""
+    if not text:
+        return None
+    patterns = [
+        r"\s+".join(re.escape(w) for w in t.split()) + r"\b" if phrase else r"\b" + re.escape(t) + r"\w*"
+        for t, phrase in terms
+    ]
+    pattern = re.compile(r"(?:" + "|".join(patterns) + r")", re.IGNORECASE | re.UNICODE)
+    first = pattern.search(text)
+    if not first:
+        return None
+    start = max(first.start() - length // 3, 0)
+    end = min(start + length, len(text))
+    window = text[start:end]
+    out, pos = [], 0
+    for m in pattern.finditer(window):
+        out.append(html.escape(window[pos:m.start()]))
+        out.append(f"<mark>{html.escape(m.group(0))}</mark>")
+        pos = m.end()
+    out.append(html.escape(window[pos:]))
+    return ("…" if start else "") + "".join(out) + ("…" if end < len(text) else "")
+
+
+@whitelist()
+def search_visits(
+    query: str,
+    limit: int = 20,
+    start: int = 0,
+    status: str | None = None,
+    client_type: str | None = None,
+    from_date: str | None = None,
+    to_date: str | None = None,
+) -> dict:
+    """Visits whose text fields match `query`, best match first, limited to Visits the user may read.
+
+    Words match as prefixes ("compress" finds "compressor"), "quoted phrases" match exactly, and
+    every term is required. Each item carries the field that matched and an HTML `snippet` with the
+    matches in <mark>. `has_more` tells whether another page follows.
+    """
+    terms = parse_query(query)
+    if not terms:
+        return {"items": [], "has_more": False, "terms": []}
+    condition, score, bound = _match_sql(terms)
+    conditions, values = [condition], {"q": bound}
+    for field, value in (("status", status), ("client_type", client_type)):
+        if value:
+            conditions.append(f"`{field}` = %({field})s")
+            values[field] = value
+    if from_date:
+        conditions.append("scheduled_time >= %(from_date)s")
+        values["from_date"] = getdate(from_date)
+    if to_date:
+        conditions.append("scheduled_time < %(to_date)s")
+        values["to_date"] = add_days(getdate(to_date), 1)
+    # assignee / owner rule plus shared Visits
+    permission = get_permission_query_conditions(frappe.session.user)
+    if permission:
+        conditions.append(permission)
+    limit = min(max(cint(limit), 1), MAX_PAGE_LENGTH)
+    values.update(limit=limit + 1, start=max(cint(start), 0))
+    rows = frappe.db.sql(
+        f"""
+        select name, status, scheduled_time, assigned_to, client_type, client, subject,
+            {", ".join(SEARCH_FIELDS)}, {score} as score
+        from `tabVisit`
+        where {" and ".join(conditions)}
+        order by score desc, scheduled_time desc
+        limit %(limit)s offset %(start)s
+        """,
+        values,
+        as_dict=True,
+    )
+    items = []
+    for row in rows[:limit]:
+        item = {k: row[k] for k in ("name", "status", "scheduled_time", "assigned_to", "client_type", "client", "subject")}
+        item["score"] = float(row.score or 0)
+        item["field"], item["snippet"] = next(
+            ((f, s) for f in SEARCH_FIELDS if (s := highlight(row[f], terms))), (None, None)
+        )
+        items.append(item)
+    return {"items": items, "has_more": len(rows) > limit, "terms": [t for t, _ in terms]}
@@ -0,0 +1,305 @@
+from __future__ import annotations
+
+import datetime
+import hashlib
+
+import frappe
+from frappe import whitelist
+from frappe.utils import cint, get_datetime, getdate, now_datetime
+
+STAT_DOCTYPE = "Visit Daily Stat"
+
+# Visit fields that make up the rollup key (besides the date)
+DIMENSIONS = ("assigned_to", "status", "subject", "client_type")
+
+# Visit fields needed to compute a Visit's contribution to the rollup
+SOURCE_FIELDS = ("scheduled_time", "creation", "visit_duration_minutes") + DIMENSIONS
+
+
+def _stat_name(key: tuple) -> str:
+    """Deterministic row name for a rollup key, so concurrent writers converge on one row."""
+    raw = "|".join(str(part or "") for part in key)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:20]
+
+
+def _contributions(row) -> dict:
+    """Return {key: [scheduled, created, duration]} for a single Visit (dict or Document).
+
+    A Visit counts once on its scheduled date (with its duration) and once on its creation date.
+    """
+    out = {}
+    if not row:
+        return out
+    dims = tuple(row.get(f) or "" for f in DIMENSIONS)
+    if row.get("scheduled_time"):
+        key = (getdate(row.get("scheduled_time")),) + dims
+        out[key] = [1, 0, cint(row.get("visit_duration_minutes"))]
+    if row.get("creation"):
+        key = (getdate(row.get("creation")),) + dims
+        out.setdefault(key, [0, 0, 0])[1] += 1
+    return out
+
+
+def _bump(key: tuple, scheduled: int, created: int, duration: int):
+    name = _stat_name(key)
+    # Insert an empty row if missing (no-op on duplicate), then apply the delta atomically
+    frappe.get_doc({
+        "doctype": STAT_DOCTYPE,
+        "name": name,
+        "stat_date": key[0],
+        "assigned_to": key[1] or None,
+        "status": key[2],
+        "subject": key[3],
+        "client_type": key[4],
+        "scheduled_count": 0,
+        "created_count": 0,
+        "duration_minutes": 0,
+    }).db_insert(ignore_if_duplicate=True)
+    frappe.db.sql(
+        """
+        update `tabVisit Daily Stat`
+        set scheduled_count = scheduled_count + %s,
+            created_count = created_count + %s,
+            duration_minutes = duration_minutes + %s,
+            modified = %s
+        where name = %s
+        """,
+        (scheduled, created, duration, now_datetime(), name),
+    )
+
+
+def apply_visit_delta(before, after):
+    """Move a Visit's contribution from its `before` state to its `after` state.
+
+    Either side may be None (insert / delete). Keys whose contribution did not change issue no queries.
+    """
+    old = _contributions(before)
+    new = _contributions(after)
+    for key in set(old) | set(new):
+        o = old.get(key, [0, 0, 0])
+        n = new.get(key, [0, 0, 0])
+        delta = [n[i] - o[i] for i in range(3)]
+        if any(delta):
+            _bump(key, *delta)
+
+
+def snapshot(doc) -> dict:
+    """Return the rollup-relevant fields of a Visit, for use as `before` in apply_visit_delta."""
+    return {f: doc.get(f) for f in SOURCE_FIELDS}
+
+
+def on_visit_update(doc, method=None):
+    """Hook: on_update (also runs after insert, when there is no previous version)."""
+    try:
+        apply_visit_delta(doc.get_doc_before_save(), doc)
+    except Exception:
+        frappe.log_error(title="Visit Daily Stat Update Failed", message=f"Visit {doc.name}")
+
+
+def on_visit_trash(doc, method=None):
+    """Hook: on_trash"""
+    try:
+        apply_visit_delta(doc, None)
+    except Exception:
+        frappe.log_error(title="Visit Daily Stat Update Failed", message=f"Visit {doc.name}")
+
+
+# Visits plus archived Visits (Visit Archive keeps the rollup's source columns)
+_ALL_VISITS = """
+    (select creation, scheduled_time, assigned_to, status, subject, client_type, visit_duration_minutes from `tabVisit`
+    union all
+    select creation, scheduled_time, assigned_to, status, subject, client_type, visit_duration_minutes from `tabVisit Archive`)
+"""
+
+
+def _aggregate_from_visits() -> dict:
+    """Recompute the full rollup from tabVisit and Visit Archive with two grouped queries."""
+    agg = {}
+    for row in frappe.db.sql(
+        f"""
+        select date(scheduled_time), ifnull(assigned_to, ''), ifnull(status, ''), ifnull(subject, ''),
+            ifnull(client_type, ''), count(*), sum(ifnull(visit_duration_minutes, 0))
+        from {_ALL_VISITS} v
+        where scheduled_time is not null
+        group by 1, 2, 3, 4, 5
+        """
+    ):
+        agg[(getdate(row[0]),) + tuple(row[1:5])] = [cint(row[5]), 0, cint(row[6])]
+    for row in frappe.db.sql(
+        f"""
+        select date(creation), ifnull(assigned_to, ''), ifnull(status, ''), ifnull(subject, ''),
+            ifnull(client_type, ''), count(*)
+        from {_ALL_VISITS} v
+        group by 1, 2, 3, 4, 5
+        """
+    ):
+        agg.setdefault((getdate(row[0]),) + tuple(row[1:5]), [0, 0, 0])[1] = cint(row[5])
+    return agg
+
+
+def rebuild_visit_daily_stats() -> dict:
+    """Repair the rollup: recompute from Visits and write only the rows that differ.
+
+    Safe to run at any time; increments that race with the rebuild are corrected on the next run.
+    """
+    fresh = {_stat_name(key): (key, counts) for key, counts in _aggregate_from_visits().items()}
+    existing = {
+        r[0]: [cint(r[1]), cint(r[2]), cint(r[3])]
+        for r in frappe.db.sql(
+            "select name, scheduled_count, created_count, duration_minutes from `tabVisit Daily Stat`"
+        )
+    }
+
+    now = now_datetime()
+    user = frappe.session.user
+    to_insert = []
+    updated = 0
+    for name, (key, counts) in fresh.items():
+        current = existing.pop(name, None)
+        if current is None:
+            to_insert.append((name, now, now, user, user, key[0], key[1] or None, key[2], key[3], key[4], *counts))
+        elif current != counts:
+            frappe.db.sql(
+                """
+                update `tabVisit Daily Stat`
+                set scheduled_count = %s, created_count = %s, duration_minutes = %s, modified = %s
+                where name = %s
+                """,
+                (*counts, now, name),
+            )
+            updated += 1
+
+    if to_insert:
+        frappe.db.bulk_insert(
+            STAT_DOCTYPE,
+            fields=[
+                "name", "creation", "modified", "owner", "modified_by", "stat_date", "assigned_to",
+                "status", "subject", "client_type", "scheduled_count", "created_count", "duration_minutes",
+            ],
+            values=to_insert,
+        )
+    if existing:
+        frappe.db.delete(STAT_DOCTYPE, {"name": ["in", list(existing)]})
+    frappe.db.commit()
+    return {"inserted": len(to_insert), "updated": updated, "deleted": len(existing)}
+
+
+# Readers -------------------------------------------------------------------
+
+
+def _parse_filters(filters) -> list:
+    """Normalize Frappe filters (JSON string, dict or list) to [field, op, value] triples."""
+    filters = frappe.parse_json(filters) if isinstance(filters, str) else filters
+    out = []
+    if isinstance(filters, dict):
+        for field, value in filters.items():
+            if isinstance(value, (list, tuple)) and len(value) == 2:
+                out.append([field, value[0], value[1]])
+            else:
+                out.append([field, "=", value])
+    else:
+        for f in filters or []:
+            f = list(f)
+            if len(f) == 4:
+                f = f[1:]
+            out.append([f[0], str(f[1]).lower(), f[2]])
+    return out
+
+
+def _day_window(lower, lower_incl, upper, upper_incl):
+    """Split a scheduled_time range into whole days (served by the rollup) and partial boundary days.
+
+    Returns (full_from, full_to, partial_days); full_from/full_to may be None for an open end.
+    """
+    one = datetime.timedelta(days=1)
+    partial = set()
+    full_from = full_to = None
+    if lower is not None:
+        full_from = lower.date()
+        if not (lower_incl and lower.time() == datetime.time.min):
+            partial.add(lower.date())
+            full_from = lower.date() + one
+    if upper is not None:
+        full_to = upper.date()
+        if upper.time() == datetime.time.min and not upper_incl:
+            full_to = upper.date() - one
+        elif not (upper_incl and upper.time() >= datetime.time(23, 59, 59)):
+            partial.add(upper.date())
+            full_to = upper.date() - one
+    return full_from, full_to, partial
+
+
+def count_from_stats(filters=None, measure: str = "scheduled_count") -> int:
+    """Answer a Visit COUNT/SUM using the rollup, touching tabVisit only for partial boundary days.
+
+    Supports filters on status, assigned_to, subject, client_type (=, !=, in, not in) and on
+    scheduled_time (>, >=, <, <=, between). Anything else falls back to a direct count on Visit.
+    """
+    triples = _parse_filters(filters)
+    dim_filters = []
+    lower = upper = None
+    lower_incl = upper_incl = True
+    for field, op, value in triples:
+        if field in DIMENSIONS and op in ("=", "!=", "in", "not in"):
+            dim_filters.append([field, op, value])
+        elif field == "scheduled_time" and op in (">", ">=", "<", "<=", "between"):
+            if op == "between":
+                lower, upper = get_datetime(value[0]), get_datetime(value[1])
+                lower_incl = upper_incl = True
+                if len(str(value[1])) <= 10:
+                    upper = datetime.datetime.combine(upper.date(), datetime.time.max)
+            elif op in (">", ">="):
+                lower, lower_incl = get_datetime(value), op == ">="
+            else:
+                upper, upper_incl = get_datetime(value), op == "<="
+        else:
+            return _count_live(triples, measure)
+
+    full_from, full_to, partial_days = _day_window(lower, lower_incl, upper, upper_incl)
+
+    total = 0
+    if not (full_from and full_to and full_from > full_to):
+        stat_filters = [[STAT_DOCTYPE, f, op, v] for f, op, v in dim_filters]
+        if full_from:
+            stat_filters.append([STAT_DOCTYPE, "stat_date", ">=", full_from])
+        if full_to:
+            stat_filters.append([STAT_DOCTYPE, "stat_date", "<=", full_to])
+        rows = frappe.get_all(STAT_DOCTYPE, filters=stat_filters, fields=[f"sum({measure}) as total"])
+        total += cint(rows[0].total if rows else 0)
+
+    for day in partial_days:
+        day_filters = list(triples) + [
+            ["scheduled_time", ">=", datetime.datetime.combine(day, datetime.time.min)],
+            ["scheduled_time", "<=", datetime.datetime.combine(day, datetime.time.max)],
+        ]
+        total += _count_live(day_filters, measure)
+    return total
+
+
+def _count_live(triples: list, measure: str, scoped: bool = False) -> int:
+    """Count (or sum durations of) Visits directly; `scoped` applies the user's Visit permissions."""
+    visit_filters = [["Visit", f, op, v] for f, op, v in triples]
+    if scoped or measure == "duration_minutes":
+        total = "sum(visit_duration_minutes)" if measure == "duration_minutes" else "count(*)"
+        reader = frappe.get_list if scoped else frappe.get_all
+        rows = reader("Visit", filters=visit_filters, fields=[f"{total} as total"])
+        return cint(rows[0].total if rows else 0)
+    return frappe.db.count("Visit", filters=visit_filters)
+
+
+@whitelist()
+def get_visit_stat_count(filters=None):
+    """Number Card (type Custom) method: count Visits matching filters using the daily rollup.
+
+    Accepts the same Visit filters as the standard "Planned/In Progress/Completed/Overdue Visits" cards.
+    The rollup has no row-level scope, so users who may not read every Visit get a live count of the
+    Visits they can see instead.
+    """
+    from visit_management.visit_management.doctype.visit.visit import _visit_access_scope
+
+    frappe.has_permission("Visit", "read", throw=True)
+    if _visit_access_scope(frappe.session.user) != "all":
+        value = _count_live(_parse_filters(filters), "scheduled_count", scoped=True)
+    else:
+        value = count_from_stats(filters)
+    return {"value": value, "fieldtype": "Int"}